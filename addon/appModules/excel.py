@@ -2,13 +2,20 @@
 # Copyright (C) 2015 - 2022 NV Access Limited.
 # this code is licensed under the GNU General Public License version 2.
 
+import hashlib
+from typing import Dict, List, Optional, Tuple
 from globalPlugins.dotPad import GlobalPlugin
+from globalPlugins.dotPad.chartCatalog import CatalogChart, ChartCatalog
+from globalPlugins.dotPad.dataUtils import Dataset, getDatasetsRange
+from globalPlugins.dotPad.profiling import profiled
+import core
 import winUser
 import api
 import ui
 from logHandler import log
 import controlTypes
 from scriptHandler import script
+from comtypes import COMError
 import NVDAObjects.window._msOfficeChart as msOfficeChart
 from NVDAObjects.window import Window
 from NVDAObjects.window.excel import Excel7Window
@@ -19,9 +26,251 @@ try:
 except ImportError:
 	import appModuleHandler as BaseAppModule
 
+# A chart in a workbook: its key in the chart catalog, the name of its sheet,
+# and the name of its chart object, which is None for a chart sheet.
+WorkbookChart = Tuple[tuple, str, Optional[str]]
+
+
+def extractChart(chart, key: tuple) -> CatalogChart:
+	""" Reads the series, scale and titles of an Excel chart."""
+	sr=chart.seriesCollection()
+	seriesObjects = []
+	for index in range(1, sr.count + 1):
+		seriesObjects.append(sr.item(index))
+	datasets = {item.name: Dataset(item.values) for item in seriesObjects}
+	yAxisLabel = None
+	xAxisLabel = None
+	if chart.HasAxis(msOfficeChart.xlValue):
+		yAxis=chart.axes(msOfficeChart.xlValue)
+		minY = yAxis.minimumScale
+		maxY = yAxis.maximumScale
+		if yAxis.HasTitle:
+			yAxisLabel = yAxis.AxisTitle.Text
+	else:
+		minY, maxY = getDatasetsRange(datasets.values())
+	if chart.HasAxis(msOfficeChart.xlCategory):
+		xAxis=chart.axes(msOfficeChart.xlCategory)
+		if xAxis.HasTitle:
+			xAxisLabel = xAxis.AxisTitle.Text
+	title = chart.ChartTitle.Text if chart.HasTitle else chart.Name
+	return CatalogChart(key, title, minY, maxY, datasets, xAxisLabel=xAxisLabel, yAxisLabel=yAxisLabel)
+
+
+def getSeriesValuesReference(formula: str) -> Optional[str]:
+	"""
+	The reference to the cells holding a series' values, from its SERIES formula.
+	E.g. Sheet1!$B$2:$B$13 from =SERIES(Sheet1!$B$1,Sheet1!$A$2:$A$13,Sheet1!$B$2:$B$13,1).
+	None if the values are not in cells, E.g. {1,2,3}.
+	"""
+	if not formula.upper().startswith("=SERIES(") or not formula.endswith(")"):
+		return None
+	args = []
+	arg = ""
+	depth = 0
+	# The quote around a sheet name or text being read, if any
+	quote = None
+	for char in formula[len("=SERIES("):-1]:
+		if quote:
+			if char == quote:
+				quote = None
+		elif char in "'\"":
+			quote = char
+		elif char in "({":
+			depth += 1
+		elif char in ")}":
+			depth -= 1
+		elif not depth and char == ",":
+			args.append(arg)
+			arg = ""
+			continue
+		arg += char
+	args.append(arg)
+	if len(args) < 3 or not args[2] or args[2].startswith("{"):
+		return None
+	reference = args[2]
+	# Several areas are given in brackets, E.g. (Sheet1!$B$2:$B$5,Sheet1!$B$8)
+	if reference.startswith("(") and reference.endswith(")"):
+		reference = reference[1:-1]
+	return reference
+
+
+def getChartSignature(chart) -> tuple:
+	"""
+	Identifies the content of a chart's series, for finding out whether it has changed since it was extracted
+	without extracting it again: the formula of each series, plus a hash of all the cells holding its values.
+	The cells of each area are read in a single call, which is much quicker than reading the series' values.
+	"""
+	sr = chart.seriesCollection()
+	signature = []
+	for index in range(1, sr.count + 1):
+		series = sr.item(index)
+		formula = series.Formula
+		reference = getSeriesValuesReference(formula)
+		if not reference:
+			# The values are written in the formula
+			signature.append((formula, None))
+			continue
+		try:
+			areas = chart.Application.Range(reference).Areas
+			values = [areas.item(areaIndex).Value2 for areaIndex in range(1, areas.Count + 1)]
+		except COMError:
+			# E.g. a reference to another workbook, which only the series itself can give the values of
+			values = series.values
+		signature.append((formula, hashlib.sha1(repr(values).encode()).hexdigest()))
+	return tuple(signature)
+
+
+def getChartKey(workbook, chart) -> tuple:
+	# The name of an embedded chart includes the name of its sheet
+	return (workbook.FullName, chart.Name)
+
+
 class AppModule(BaseAppModule.AppModule):
 
+	# Milliseconds between extracting each chart of a workbook in the background
+	prefetchInterval = 50
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._workbook = None
+		self._workbookName: Optional[str] = None
+		# The charts of the workbook, in the order they are switched between
+		self._workbookCharts: List[WorkbookChart] = []
+		self._chartIndex = -1
+		# Indexes into _workbookCharts of the charts still to be extracted
+		self._prefetchQueue: List[int] = []
+		# The signatures of the charts in the chart catalog when they were extracted
+		self._chartSignatures: Dict[tuple, tuple] = {}
+
+	def _getWorkbook(self):
+		hwndFocus = winUser.getGUIThreadInfo(0).hwndFocus
+		if winUser.getClassName(hwndFocus) != 'EXCEL7':
+			return None
+		return Excel7Window(windowHandle=hwndFocus).excelWindowObject.ActiveSheet.Parent
+
+	def _findCharts(self, workbook) -> List[WorkbookChart]:
+		""" The charts on each worksheet, starting with the active sheet, followed by any chart sheets."""
+		activeName = workbook.ActiveSheet.Name
+		worksheets = [workbook.Worksheets.item(index) for index in range(1, workbook.Worksheets.count + 1)]
+		worksheets.sort(key=lambda sheet: sheet.Name != activeName)
+		charts = []
+		for sheet in worksheets:
+			chartObjects = sheet.ChartObjects()
+			for index in range(1, chartObjects.count + 1):
+				chartObject = chartObjects.item(index)
+				charts.append((getChartKey(workbook, chartObject.Chart), sheet.Name, chartObject.Name))
+		for index in range(1, workbook.Charts.count + 1):
+			chartSheet = workbook.Charts.item(index)
+			charts.append((getChartKey(workbook, chartSheet), chartSheet.Name, None))
+		return charts
+
+	def _getChart(self, workbook, workbookChart: WorkbookChart):
+		key, sheetName, chartObjectName = workbookChart
+		if chartObjectName is None:
+			return workbook.Charts.item(sheetName)
+		return workbook.Worksheets.item(sheetName).ChartObjects(chartObjectName).Chart
+
+	def _extractChart(self, chart, key: tuple, signature: Optional[tuple] = None) -> CatalogChart:
+		""" Extracts a chart, noting its signature so that it can be checked for changes before it is shown again."""
+		catalogChart = extractChart(chart, key)
+		self._chartSignatures[key] = getChartSignature(chart) if signature is None else signature
+		return catalogChart
+
+	def _loadWorkbookCharts(self, workbook):
+		"""
+		Finds the charts of the workbook, and starts extracting them in the background if it is not the workbook they were last found in.
+		"""
+		workbookName = workbook.FullName
+		self._workbookCharts = self._findCharts(workbook)
+		if workbookName != self._workbookName:
+			self._workbookName = workbookName
+			self._chartIndex = -1
+		self._workbook = workbook
+		catalog = GlobalPlugin.curInstance.chartCatalog
+		self._chartSignatures = {key: signature for key, signature in self._chartSignatures.items() if key in catalog}
+		self._queuePrefetch()
+
+	def _queuePrefetch(self):
+		"""
+		Queues the charts nearest to the current one to be extracted and laid out,
+		as many as the chart catalog holds.
+		"""
+		count = len(self._workbookCharts)
+		current = max(self._chartIndex, 0)
+		# The next chart, then the previous one, and so on outwards
+		order = sorted(range(count), key=lambda index: min((index - current) % count, (current - index) % count))
+		wasQueued = bool(self._prefetchQueue)
+		self._prefetchQueue = order[:ChartCatalog.maxCharts]
+		if not wasQueued:
+			core.callLater(self.prefetchInterval, self._prefetchNextChart)
+
+	def _prefetchNextChart(self):
+		# Excel can only be used from NVDA's main thread,
+		# so charts are extracted one at a time in between other work, and laid out on a background thread.
+		catalog = GlobalPlugin.curInstance.chartCatalog
+		while self._prefetchQueue:
+			index = self._prefetchQueue.pop(0)
+			if index >= len(self._workbookCharts):
+				continue
+			workbookChart = self._workbookCharts[index]
+			if workbookChart[0] in catalog:
+				continue
+			try:
+				chart = self._extractChart(self._getChart(self._workbook, workbookChart), workbookChart[0])
+			except (COMError, AttributeError):
+				log.debugWarning(f"Could not extract chart {workbookChart[0]}", exc_info=True)
+				continue
+			GlobalPlugin.curInstance.prefetchCatalogCharts([chart])
+			break
+		if self._prefetchQueue:
+			core.callLater(self.prefetchInterval, self._prefetchNextChart)
+
+	def _switchChart(self, step: int):
+		try:
+			workbook = self._getWorkbook()
+			if not workbook:
+				ui.message("Not a sheet or chart")
+				return
+			if workbook.FullName != self._workbookName or not self._workbookCharts:
+				self._loadWorkbookCharts(workbook)
+		except (COMError, AttributeError):
+			ui.message("Cannot find charts")
+			return
+		count = len(self._workbookCharts)
+		if not count:
+			ui.message("No charts in workbook")
+			return
+		self._chartIndex = (self._chartIndex + step) % count
+		workbookChart = self._workbookCharts[self._chartIndex]
+		key = workbookChart[0]
+		try:
+			excelChart = self._getChart(workbook, workbookChart)
+			# Rather than extracting the chart again, check its cells for a recalculation or edit since it was extracted
+			signature = getChartSignature(excelChart)
+			chart = GlobalPlugin.curInstance.chartCatalog.get(key)
+			if not chart or self._chartSignatures.get(key) != signature:
+				chart = self._extractChart(excelChart, key, signature)
+		except (COMError, AttributeError):
+			# The chart may have been deleted or renamed
+			log.debugWarning(f"Could not extract chart {key}", exc_info=True)
+			self._workbookName = None
+			ui.message("Cannot read chart, press again to find charts again")
+			return
+		GlobalPlugin.curInstance.showCatalogChart(chart, self._chartIndex + 1, count)
+		self._queuePrefetch()
+
+	@script(gesture="kb:control+alt+NVDA+pageDown")
+	@profiled("nextChart")
+	def script_nextChart(self, gesture):
+		self._switchChart(1)
+
+	@script(gesture="kb:control+alt+NVDA+pageUp")
+	@profiled("previousChart")
+	def script_previousChart(self, gesture):
+		self._switchChart(-1)
+
 	@script(gesture="kb:NVDA+f6")
+	@profiled("embossChart")
 	def script_embossChart(self, gesture):
 		hwndFocus = winUser.getGUIThreadInfo(0).hwndFocus
 		if winUser.getClassName(hwndFocus) != 'EXCEL7':
@@ -33,25 +282,48 @@ class AppModule(BaseAppModule.AppModule):
 			ui.message("Cannot locate chart")
 			return
 		chart = selection.officeChartObject
-		valuesList=[]
-		sr=chart.seriesCollection()
-		seriesObjects = []
-		for index in range(1, sr.count + 1):
-			seriesObjects.append(sr.item(index))
-		datasets = {item.name: list(item.values) for item in seriesObjects}
-		yAxisLabel = None
-		xAxisLabel = None
-		if chart.HasAxis(msOfficeChart.xlValue):
-			yAxis=chart.axes(msOfficeChart.xlValue)
-			minY = yAxis.minimumScale
-			maxY = yAxis.maximumScale
-			if yAxis.HasTitle:
-				yAxisLabel = yAxis.AxisTitle.Text
-		else:
-			minY = min(min(dataset) for dataset in datasets)
-			maxY = max(max(dataset) for dataset in datasets)
-		if chart.HasAxis(msOfficeChart.xlCategory):
-			xAxis=chart.axes(msOfficeChart.xlCategory)
-			if xAxis.HasTitle:
-				xAxisLabel = xAxis.AxisTitle.Text
-		GlobalPlugin.curInstance.drawChart(minY, maxY, datasets, xAxisLabel=xAxisLabel, yAxisLabel=yAxisLabel)
+		try:
+			workbook = excelWindow.excelWindowObject.ActiveSheet.Parent
+			key = getChartKey(workbook, chart)
+		except (COMError, AttributeError):
+			workbook = key = None
+		catalogChart = self._extractChart(chart, key) if key else extractChart(chart, key)
+		GlobalPlugin.curInstance.drawChart(catalogChart.minVal, catalogChart.maxVal, catalogChart.datasets, xAxisLabel=catalogChart.xAxisLabel, yAxisLabel=catalogChart.yAxisLabel)
+		if not workbook:
+			return
+		# Get this and the other charts of the workbook ready to switch to
+		GlobalPlugin.curInstance.prefetchCatalogCharts([catalogChart])
+		try:
+			self._loadWorkbookCharts(workbook)
+		except (COMError, AttributeError):
+			log.debugWarning("Could not find charts in workbook", exc_info=True)
+			return
+		keys = [workbookChart[0] for workbookChart in self._workbookCharts]
+		if key in keys:
+			self._chartIndex = keys.index(key)
+			self._queuePrefetch()
+
+	@script(gesture="kb:shift+NVDA+f6")
+	@profiled("embossHeatmap")
+	def script_embossHeatmap(self, gesture):
+		hwndFocus = winUser.getGUIThreadInfo(0).hwndFocus
+		if winUser.getClassName(hwndFocus) != 'EXCEL7':
+			ui.message("Not a sheet")
+			return
+		excelWindow = Excel7Window(windowHandle=hwndFocus)
+		try:
+			selection = excelWindow.excelWindowObject.Selection
+			if selection.Areas.Count > 1:
+				ui.message("Select a single block of cells")
+				return
+			# All the values in one call, with numbers as plain floats
+			values = selection.Value2
+			firstRow = selection.Row
+			firstCol = selection.Column
+		except (COMError, AttributeError):
+			ui.message("Select a range of cells")
+			return
+		if not isinstance(values, tuple):
+			# A single cell
+			values = ((values,),)
+		GlobalPlugin.curInstance.drawHeatmap(values, firstRow=firstRow, firstCol=firstCol)
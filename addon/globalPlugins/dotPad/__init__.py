@@ -5,11 +5,16 @@
 
 
 import math
+from concurrent.futures import CancelledError
 import ctypes
+import threading
 import time
+from typing import Optional
 import wx
 import core
-from .pyDotPad import DotPad, DotPadError, DotPadErrorCode
+from .pyDotPad import DotPad, DotPadError, DotPadErrorCode, connectionLostErrorCodes
+from .connection import DotPadConnection, ConnectionState
+from .deviceManager import DeviceManager
 import core
 import globalPluginHandler
 import tones
@@ -17,11 +22,16 @@ from scriptHandler import script, getLastScriptRepeatCount
 import ui
 import config
 import api
+import textInfos
 import gui
 from gui.settingsDialogs import SettingsDialog
 from gui import guiHelper
 import hwPortUtils
-from .imageUtils import StretchMode, captureImage, getMonochromePixelUsingLocalBrightnessThreshold
+import globalVars
+import os
+from logHandler import log
+from .imageUtils import StretchMode, captureImage, imageToBrightnessRows
+from .tiledCapture import TiledReducer, captureImageTiled
 from .dataUtils import (
 	transposeValuesInDataset,
 	scaleValuesInDataset,
@@ -31,9 +41,27 @@ from .dataUtils import (
 	BarChart,
 	ScrollableChart,
 	LineChart,
+	AreaChart,
+	StackedBarChart,
+	HistogramChart,
+	DetailedHistogramChart,
+	QuantileHistogramChart,
+	SmallMultiplesChart,
+	SmallMultiplesOwnScaleChart,
+	shutdownSparklineExecutor,
 		drawBrailleCells,
 )
-from .brailleUtils import translateTextToBraille
+from .brailleUtils import translateTextToBraille, warmUpBrailleTables
+from .scene import Scene, ChartElement, ImageElement, FrameFileElement, HeatmapElement, TextElement, ZoomableImageElement
+from .heatmap import HeatmapData
+from .chartCatalog import ChartCatalog, CatalogChart
+from .frameCache import FrameCache
+from .frameFile import FrameFile, FrameFileError, writeFrameFile, convertPngDirectory
+from .pngImage import PngError
+from . import frameFile
+from .renderPipeline import RenderPipeline, RenderJob
+from .keyEvents import KeyPressCoalescer
+from .profiling import profiler, profiled
 
 
 class DotPadChartDialog(SettingsDialog):
@@ -56,11 +84,18 @@ class DotPadChartDialog(SettingsDialog):
 		self._chartTypes = [
 			(BarChart, "Bar chart: discrete data in columns which can be scrolled"),
 			(LineChart, "Line chart: A continuous trend line over a set of values"),
+			(AreaChart, "Area chart: trend lines with the area below them filled, each dataset stacked on the one before"),
+			(StackedBarChart, "Stacked bar chart: a column per value, made of a segment for each dataset, which can be scrolled"),
+			(HistogramChart, "Histogram: how the values of the first dataset are distributed, on one page"),
+			(DetailedHistogramChart, "Detailed histogram: a histogram with as many bins as fit"),
+			(QuantileHistogramChart, "Quantile histogram: a histogram whose bins hold equal numbers of values"),
+			(SmallMultiplesChart, "Small multiples: a small line chart for each dataset, all on the same scale"),
+			(SmallMultiplesOwnScaleChart, "Small multiples, own scales: a small line chart for each dataset, each scaled to its own values"),
 		]
 		self.chartTypesControl = settingsSizerHelper.addLabeledControl("Chart type", wx.Choice, choices=[x[1] for x in self._chartTypes])
 		index = 0
 		if lastChart:
-			lastChartType = type(lastChart)
+			lastChartType = lastChart.chartType
 			try:
 				index = [x[0] for x in self._chartTypes].index(lastChartType)
 			except ValueError:
@@ -83,6 +118,7 @@ class DotPadChartDialog(SettingsDialog):
 	def postInit(self):
 		self.chartTypesControl.SetFocus()
 
+	@profiled("chart")
 	def onOk(self, evt):
 		ChartType = self._chartTypes[self.chartTypesControl.GetSelection()][0]
 		showVerticalRuler = self.showVerticalRulerCheckBox.GetValue()
@@ -95,10 +131,13 @@ class DotPadChartDialog(SettingsDialog):
 		dp = self._globalPlugin.ensureDotPad()
 		if not dp:
 			return
-		self._globalPlugin.curChart = ChartType(dp.hPixelCount, dp.vPixelCount, self._minVal, self._maxVal, datasets, showVerticalRuler=showVerticalRuler, showHorizontalRuler=showHorizontalRuler)
-		dp.resetDataBuffer()
-		self._globalPlugin.curChart.draw(dp.setDotInDataBuffer)
-		self._globalPlugin._outputDataBuffer(dp)
+		seriesNames = tuple(self._datasets)
+		chart = ChartElement(ChartType, self._minVal, self._maxVal, datasets, showVerticalRuler=showVerticalRuler, showHorizontalRuler=showHorizontalRuler, seriesNames=seriesNames)
+		self._globalPlugin.curScene = Scene([chart], frameCache=self._globalPlugin._frameCache)
+		self._globalPlugin._displayScene(self._globalPlugin.curScene)
+		if issubclass(ChartType, SmallMultiplesChart):
+			# Tiles are labelled with numbers, so say which dataset each number is
+			ui.message(", ".join(f"{index} {name}" for index, name in enumerate(seriesNames, start=1) if name in datasets))
 		super().onOk(evt)
 
 
@@ -126,16 +165,38 @@ class DotPadConnectionDialog(SettingsDialog):
 				self._possiblePorts.insert(index, f"{curPort} (missing)")
 		self.portList = settingsSizerHelper.addLabeledControl("Dot Pad COM port", wx.Choice, choices=self._possiblePorts)
 		self.portList.SetSelection(index)
+		curMirrorPorts = conf['mirrorPorts']
+		self._possibleMirrorPorts = self._possiblePorts[1:]
+		for mirrorPort in curMirrorPorts:
+			if mirrorPort not in self._possibleMirrorPorts and f"{mirrorPort} (missing)" not in self._possibleMirrorPorts:
+				self._possibleMirrorPorts.append(f"{mirrorPort} (missing)")
+		self.mirrorPortList = settingsSizerHelper.addLabeledControl(
+			"Mirror to additional Dot Pads on COM ports",
+			wx.CheckListBox,
+			choices=self._possibleMirrorPorts
+		)
+		self.mirrorPortList.SetCheckedItems([
+			index for index, choice in enumerate(self._possibleMirrorPorts)
+			if choice.split(' ')[0] in curMirrorPorts
+		])
+		self.debugPreviewCheckBox = wx.CheckBox(self, label="Log a braille preview of each frame (for debugging)")
+		self.debugPreviewCheckBox.SetValue(conf['debugPreview'])
+		settingsSizerHelper.addItem(self.debugPreviewCheckBox)
 
 	def postInit(self):
 		self.portList.SetFocus()
 
 	def onOk(self, evt):
 		index = self.portList.GetSelection()
+		mirrorPorts = [
+			self._possibleMirrorPorts[checkedIndex].split(' ')[0]
+			for checkedIndex in self.mirrorPortList.GetCheckedItems()
+		]
 		if index != 0:
 			port = self._possiblePorts[index].split(' ')[0]
+			mirrorPorts = [mirrorPort for mirrorPort in mirrorPorts if mirrorPort != port]
 			try:
-				self._globalPlugin.initDotPad(port)
+				self._globalPlugin.initDotPad(port, mirrorPorts=mirrorPorts)
 			except (DotPadError, RuntimeError) as e:
 				gui.messageBox(f"{e}", "Error")
 				self.portList.SetFocus()
@@ -145,67 +206,185 @@ class DotPadConnectionDialog(SettingsDialog):
 			port = ""
 		conf = config.conf[self._globalPlugin._configName]
 		conf['port'] = port
+		conf['mirrorPorts'] = mirrorPorts
+		conf['debugPreview'] = self.debugPreviewCheckBox.GetValue()
 		super().onOk(evt)
 
 
 class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 
 	curInstance = None
-	curChart = None
+	_curScene: Optional[Scene] = None
+	# The number of operations profiled after pressing the profiler gesture
+	profiledOperationCount = 10
 
 	_configName = 'addon_dotPad'
 	_configSpec = {
 		'port': 'string(default="")',
+		'mirrorPorts': 'string_list(default=list())',
+		'debugPreview': 'boolean(default=False)',
 	}
 
 	def __init__(self):
 		super().__init__()
 		config.conf.spec[self._configName] = self._configSpec
-		self._dp = None
+		self._devices = DeviceManager(self.dpCallback, self.dpStateChangeCallback)
+		self._renderPipeline = RenderPipeline(self._devices)
+		self._keyPresses = KeyPressCoalescer(self._handleKeyPresses)
+		try:
+			self._frameCache = FrameCache(os.path.join(globalVars.appArgs.configPath, "dotPad", "frameCache"))
+		except OSError:
+			log.error("Could not create DotPad frame cache", exc_info=True)
+			self._frameCache = None
+		self.chartCatalog = ChartCatalog(frameCache=self._frameCache)
+		# Compiling braille tables takes long enough to delay the first chart, so do it now in the background
+		threading.Thread(target=self._warmUpBraille, name="DotPad braille warm-up", daemon=True).start()
+		profiler.outputDir = os.path.join(globalVars.appArgs.configPath, "dotPad", "profiles")
+		profiler.onSaved = self._onProfileSaved
 		self.__class__.curInstance = self
 
+	@property
+	def curScene(self) -> Optional[Scene]:
+		return self._curScene
+
+	@curScene.setter
+	def curScene(self, scene: Optional[Scene]):
+		# The scene being replaced will not be shown again, so stop its background work, E.g. prefetching zoomed views
+		oldScene = self._curScene
+		self._curScene = scene
+		if oldScene and oldScene is not scene:
+			oldScene.terminate()
+
+	def _warmUpBraille(self):
+		startTime = time.perf_counter()
+		try:
+			warmUpBrailleTables(
+				os.path.join(globalVars.appArgs.configPath, "dotPad", "rulerCells.json"),
+				brailleTables=(config.conf["braille"]["translationTable"],)
+			)
+		except Exception:
+			log.error("Error warming up braille tables for DotPad", exc_info=True)
+			return
+		log.debug(f"Warmed up braille tables for DotPad in {time.perf_counter() - startTime:.3f} s")
+
+	def terminate(self):
+		self._keyPresses.cancel()
+		self.chartCatalog.terminate()
+		self._renderPipeline.terminate()
+		shutdownSparklineExecutor()
+		self.curScene = None
+		self.terminateDotPad()
+		super().terminate()
+
+	@property
+	def curChart(self):
+		if not self.curScene:
+			return None
+		return self.curScene.chart
+
+	@property
+	def _connection(self):
+		return self._devices.primary
+
+	@property
+	def _dp(self):
+		if not self._connection:
+			return None
+		return self._connection.dp
+
 	def terminateDotPad(self):
-		""" Turminates the DotPad connection if it exists."""
-		self._dp = None
+		""" Turminates all DotPad connections if they exist."""
+		self._devices.terminate()
 
-	def initDotPad(self, port: str, wait: bool=False):
+	def initDotPad(self, port: str, wait: bool=False, mirrorPorts=None):
 		"""
-		Initialises the connection to the DotPad, replacing any previous connection.
+		Initialises the connection to the DotPad, replacing any previous connections.
+		Failing to connect to a mirror is reported but does not stop the primary DotPad from being used.
 		@param wait: when true, blocks the caller for a sufficient amount of time to allow the dotPad device to initialize.
+		@param mirrorPorts: the ports of additional DotPads that should show the same output,
+			defaulting to the configured mirror ports.
 		"""
-		portNum = int(port[3:])
-		if self._dp:
-			self.terminateDotPad()
-		self._dp = DotPad(portNum, self.dpCallback)
+		self.terminateDotPad()
+		if mirrorPorts is None:
+			mirrorPorts = config.conf[self._configName]['mirrorPorts']
+		self._devices.addDevice(port)
+		for mirrorPort in mirrorPorts:
+			try:
+				self._devices.addDevice(mirrorPort)
+			except (DotPadError, RuntimeError) as e:
+				log.error(f"Could not connect to mirror DotPad on {mirrorPort}", exc_info=True)
+				wx.CallAfter(ui.message, f"Could not connect to mirror DotPad on {mirrorPort}: {e}")
 		if wait:
-			time.sleep(3)
+			time.sleep(DotPadConnection.initDelay)
 		return self._dp
 
-	def dpCallback(self, keyCode):
-		if keyCode == 0:
-			core.callLater(0, self.scroll, back=True)
-		else:
-			core.callLater(0, self.scroll, back=False)
+	def dpStateChangeCallback(self, connection):
+		# Called from a background thread
+		if connection not in self._devices.connections.values():
+			return
+		name = "DotPad" if connection is self._connection else f"Mirror DotPad on {connection.port}"
+		if connection.state is ConnectionState.RECONNECTING:
+			wx.CallAfter(ui.message, f"{name} disconnected, reconnecting")
+		elif connection.state is ConnectionState.CONNECTED:
+			wx.CallAfter(ui.message, f"{name} reconnected")
 
-	def scroll(self, back=False):
-		if not isinstance(self.curChart, ScrollableChart):
+	def dpCallback(self, keyCode):
+		# Called from the SDK's thread
+		self._keyPresses.press(keyCode)
+
+	def _handleKeyPresses(self, keyCodes):
+		# Several quick presses become a single jump, with a single refresh of the DotPad.
+		pages = sum(-1 if keyCode == 0 else 1 for keyCode in keyCodes)
+		if pages:
+			wx.CallAfter(self.scroll, back=pages < 0, pages=abs(pages))
+
+	@profiled("scroll")
+	def scroll(self, back=False, pages=1, vertical=False):
+		element = self.curScene.scrollable if self.curScene else None
+		if not element:
 			ui.message("Nothing to scroll")
 			return
-		scrollFunc = self.curChart.scrollBack if back else self.curChart.scrollForward
-		if not scrollFunc():
+		dp = self._dp
+		if not dp:
+			return
+		scrolled = element.scroll(dp.hPixelCount, dp.vPixelCount, back=back, pages=pages, vertical=vertical)
+		if not scrolled:
 			ui.message("No more data")
 			return
-		dp = self._dp
-		dp.resetDataBuffer()
-		self.curChart.draw(dp.setDotInDataBuffer)
-		self._outputDataBuffer(dp)
+		if isinstance(element, (FrameFileElement, TextElement)):
+			ui.message(element.describeView())
+		elif pages > 1:
+			direction = "back" if back else "forward"
+			message = f"Scrolled {direction} {scrolled} pages"
+			if scrolled < pages:
+				message += ", no more data"
+			ui.message(message)
+		self._displayScene(self.curScene)
+
+	@profiled("zoom")
+	def zoom(self, zoomIn=True):
+		element = self.curScene.scrollable if self.curScene else None
+		if not element or not element.isZoomable:
+			ui.message("Nothing to zoom")
+			return
+		if not self._dp:
+			return
+		if not element.zoom(0.5 if zoomIn else 2):
+			ui.message("Cannot zoom in further" if zoomIn else "Showing all data")
+			return
+		ui.message(element.describeView())
+		self._displayScene(self.curScene)
 
 	def ensureDotPad(self):
 		"""
 		Ensures that the DotPad is initialized, displaying appropriate UI on errors.
 		"""
-		if self._dp:
-			return self._dp
+		if self._connection:
+			if self._connection.state is ConnectionState.RECONNECTING:
+				ui.message("DotPad reconnecting")
+				return None
+			if self._dp:
+				return self._dp
 		conf = config.conf[self._configName]
 		port = conf['port']
 		if not port:
@@ -228,6 +407,7 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 			return None
 		return self._dp
 
+	@profiled("capture")
 	def showNavigatorObject(self, isWhiteOnBlack=False):
 		location = api.getNavigatorObject().location
 		self.displayScreenLocation(location, isWhiteOnBlack=isWhiteOnBlack)
@@ -237,32 +417,194 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 		if not dp:
 			return
 		stretchMode = StretchMode.WHITEONBLACK if isWhiteOnBlack else StretchMode.BLACKONWHITE
-		image, (left, top, width, height) = captureImage(location.left, location.top, location.width, location.height, dp.hPixelCount, dp.vPixelCount, stretchMode=stretchMode)
-		dp.resetDataBuffer()
-		for y in range(top, top+height):
-			for x in range(left, left + width):
-				isWhite = getMonochromePixelUsingLocalBrightnessThreshold(image, x, y, blur=3)
-				isRaised = isWhite if isWhiteOnBlack else not isWhite
-				if isRaised:
-					dp.setDotInDataBuffer(x, y)
-		self._outputDataBuffer(dp)
-
-	def _outputDataBuffer(self, dp, doFullRefresh=False):
+
+		def capture(bufferWidth, bufferHeight):
+			# Captured once at the most zoomed in size, so zooming and panning never capture again
+			ratio = max(location.width / bufferWidth, location.height / bufferHeight)
+			if ratio > TiledReducer.oversample:
+				# Shrinking a large area in one go loses detail unpredictably
+				return captureImageTiled(location.left, location.top, location.width, location.height, bufferWidth, bufferHeight, stretchMode=stretchMode)
+			image, bounds = captureImage(location.left, location.top, location.width, location.height, bufferWidth, bufferHeight, stretchMode=stretchMode)
+			return imageToBrightnessRows(image), bounds
+
+		element = ZoomableImageElement(capture, isWhiteOnBlack=isWhiteOnBlack, stretchMode=stretchMode)
+		self.curScene = Scene([element], frameCache=self._frameCache)
+		self._displayScene(self.curScene)
+
+	@profiled("text")
+	def showText(self, text):
+		dp = self.ensureDotPad()
+		if not dp:
+			return
+		if not text or not text.strip():
+			ui.message("No text")
+			return
+		# Paragraphs are split up front, but only translated to braille as they are shown
+		self.curScene = Scene([TextElement(text.splitlines())])
+		self._displayScene(self.curScene)
+
+	def showNavigatorObjectText(self):
+		obj = api.getNavigatorObject()
+		try:
+			text = obj.makeTextInfo(textInfos.POSITION_ALL).text
+		except (NotImplementedError, RuntimeError):
+			text = "\n".join(part for part in (obj.name, obj.value, obj.description) if part)
+		self.showText(text)
+
+	def showReviewText(self):
+		""" Shows the text from the start of the review cursor's line to the end of the object being reviewed."""
+		info = api.getReviewPosition().copy()
+		info.expand(textInfos.UNIT_LINE)
+		info.setEndPoint(info.obj.makeTextInfo(textInfos.POSITION_LAST), "endToEnd")
+		self.showText(info.text)
+
+	def toggleProfiler(self):
+		if profiler.isArmed:
+			paths = profiler.disarm()
+			if paths:
+				self._onProfileSaved(paths)
+			else:
+				ui.message("DotPad profiler off")
+			return
+		profiler.arm(self.profiledOperationCount)
+		ui.message(f"Profiling the next {self.profiledOperationCount} DotPad operations")
+
+	def _onProfileSaved(self, paths):
+		log.info(f"DotPad profile saved to {', '.join(paths)}")
+		wx.CallAfter(ui.message, f"DotPad profile saved to {os.path.dirname(paths[0])}")
+
+	@profiled("frameFile")
+	def showFrameFile(self, path):
+		dp = self.ensureDotPad()
+		if not dp:
+			return
+		try:
+			frames = FrameFile(path)
+		except (OSError, FrameFileError) as e:
+			ui.message(f"Could not open frame file: {e}")
+			return
+		if frames.geometry != dp.geometry:
+			ui.message(f"Frames were made for a DotPad of {frames.hCellCount} by {frames.vCellCount} cells, some may not fit")
+		self.curScene = Scene([FrameFileElement(frames)])
+		self._displayScene(self.curScene)
+
+	def saveDisplayToFrameFile(self, path):
+		dp = self._dp
+		if not dp:
+			ui.message("DotPad not connected")
+			return
+		try:
+			writeFrameFile(path, dp.geometry, [dp.getDataBuffer()])
+		except OSError as e:
+			ui.message(f"Could not save frame file: {e}")
+			return
+		ui.message("Saved")
+
+	def convertImageFolder(self, sourceDir, isWhiteOnBlack=False):
+		"""
+		Converts all the PNG images in a folder to a single frame file in that folder, with a page per image,
+		on a background thread as there may be many images.
+		"""
+		connection = self._connection
+		if not connection or connection.state is not ConnectionState.CONNECTED:
+			ui.message("Connect a DotPad to choose the size of the frames")
+			return
+		geometry = connection.geometry
+		ui.message("Converting images")
+
+		def convert():
+			try:
+				paths = convertPngDirectory(sourceDir, sourceDir, geometry, isWhiteOnBlack=isWhiteOnBlack, combine=True)
+			except (OSError, PngError, FrameFileError) as e:
+				log.error("Could not convert images for DotPad", exc_info=True)
+				wx.CallAfter(ui.message, f"Could not convert images: {e}")
+				return
+			wx.CallAfter(ui.message, f"Saved {os.path.basename(paths[0])}")
+
+		threading.Thread(target=convert, name="DotPad image conversion", daemon=True).start()
+
+	def _displayScene(self, scene, doFullRefresh=False):
+		"""
+		Queues the scene to be rasterized for each connected DotPad and output on the render thread,
+		announcing the outcome for the primary DotPad once it is known.
+		Any scene still waiting to be rendered is dropped.
+		"""
 		if not doFullRefresh:
+			# Pressing a gesture again raises every pin again if the frame has not changed, in case any are stuck.
+			# A changed frame only moves the pins that differ, so that E.g. scrolling quickly is not slowed down.
 			doFullRefresh = getLastScriptRepeatCount() > 0
+		connection = self._connection
+		if not connection or connection.state is not ConnectionState.CONNECTED:
+			ui.message("DotPad not connected")
+			return
 		tones.beep(440, 60)
+		self._renderPipeline.debugPreview = config.conf[self._configName]['debugPreview']
+		# Scrolling or zooming the current scene must not affect a render already under way.
+		scene = scene.snapshot()
+		self._renderPipeline.submit(RenderJob(
+			lambda: scene,
+			fullRefresh=doFullRefresh,
+			onOutput=lambda futures: self._handleOutputFutures(connection.port, futures),
+			onError=lambda e: wx.CallAfter(self._announceRenderError, e)
+		))
+
+	def _announceRenderError(self, e):
+		tones.beep(220,50)
+		ui.message(f"Could not render for DotPad: {e}")
+
+	def _handleOutputFutures(self, primaryPort, futures):
+		# Called on the render thread
+		for port, future in futures.items():
+			if port != primaryPort:
+				future.add_done_callback(self._logMirrorOutput)
+		primaryFuture = futures.get(primaryPort)
+		if not primaryFuture:
+			wx.CallAfter(ui.message, "DotPad not connected")
+			return
+		primaryFuture.add_done_callback(lambda future: wx.CallAfter(self._announceOutput, future))
+
+	def _announceOutput(self, future):
 		try:
-			dp.outputDataBuffer(doFullRefresh)
+			confirmed = future.result()
+		except CancelledError:
+			# Superseded by a newer frame
+			return
 		except DotPadError as e:
 			if e.code == DotPadErrorCode.DISPLAY_DATA_UNCHANGED:
-				pass  # already displayed
-			if e.code == DotPadErrorCode.DISPLAY_IN_PROGRESS:
+				confirmed = True  # already displayed
+			elif e.code == DotPadErrorCode.DISPLAY_IN_PROGRESS:
 				tones.beep(220,50)
 				ui.message("Dot pad busy")
 				return
+			elif e.code in connectionLostErrorCodes:
+				tones.beep(220,50)
+				# The connection announces that it is reconnecting
+				return
+			else:
+				tones.beep(220,50)
+				ui.message(f"DotPad error: {e.code.name}")
+				return
+		except RuntimeError as e:
+			tones.beep(220,50)
+			ui.message(f"{e}")
+			return
+		if not confirmed:
+			tones.beep(220,50)
+			ui.message("DotPad did not confirm display")
+			return
 		tones.beep(880, 60)
 		ui.message("Done")
 
+	def _logMirrorOutput(self, future):
+		if future.cancelled():
+			return
+		e = future.exception()
+		if isinstance(e, CancelledError):
+			# Superseded by a newer frame after showing part of this one
+			return
+		if e and not (isinstance(e, DotPadError) and e.code == DotPadErrorCode.DISPLAY_DATA_UNCHANGED):
+			log.debugWarning(f"Output to mirror DotPad failed: {e!r}")
+
 
 
 	@script(gesture="kb:NVDA+f8")
@@ -273,22 +615,144 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 	def script_shownavigatorObject_whiteOnBlack(self, gesture):
 		self.showNavigatorObject(isWhiteOnBlack=True)
 
+	@script(gesture="kb:alt+NVDA+f8")
+	def script_showNavigatorObjectText(self, gesture):
+		self.showNavigatorObjectText()
+
+	@script(gesture="kb:shift+alt+NVDA+f8")
+	def script_showReviewText(self, gesture):
+		self.showReviewText()
+
+	@script(gesture="kb:alt+NVDA+pageUp")
+	def script_zoomIn(self, gesture):
+		self.zoom(zoomIn=True)
+
+	@script(gesture="kb:alt+NVDA+pageDown")
+	def script_zoomOut(self, gesture):
+		self.zoom(zoomIn=False)
+
+	@script(gesture="kb:alt+NVDA+leftArrow")
+	def script_scrollBack(self, gesture):
+		self.scroll(back=True)
+
+	@script(gesture="kb:alt+NVDA+rightArrow")
+	def script_scrollForward(self, gesture):
+		self.scroll(back=False)
+
+	@script(gesture="kb:alt+NVDA+upArrow")
+	def script_scrollUp(self, gesture):
+		self.scroll(back=True, vertical=True)
+
+	@script(gesture="kb:alt+NVDA+downArrow")
+	def script_scrollDown(self, gesture):
+		self.scroll(back=False, vertical=True)
+
 	@script(gesture="kb:shift+NVDA+f7")
 	def script_drawSineWave(self, gesture):
 		dp = self.ensureDotPad()
 		if not dp:
 			return
-		dp.resetDataBuffer()
-		x, y, width, height, xCount, yCount = drawViewport(dp.setDotInDataBuffer, 0, 0, dp.hPixelCount, dp.vPixelCount, -1, 1, xCount=10, lockAspect=False)
-		count = 100
-		points = [math.sin((math.pi*2)*(x/count)) for x in range(count)]
-		drawContinuousDataset(dp.setDotInDataBuffer, x, y, width, height, -1, 1.1, points)
-		self._outputDataBuffer(dp)
+
+		def render(bufferWidth, bufferHeight, func_drawDot):
+			x, y, width, height, xCount, yCount = drawViewport(func_drawDot, 0, 0, bufferWidth, bufferHeight, -1, 1, xCount=10, lockAspect=False)
+			count = 100
+			points = [math.sin((math.pi*2)*(x/count)) for x in range(count)]
+			drawContinuousDataset(func_drawDot, x, y, width, height, -1, 1.1, points)
+
+		self._displayScene(Scene([ImageElement(render)]))
+
+	@script(gesture="kb:control+shift+NVDA+f7")
+	def script_openFrameFile(self, gesture):
+		def chooseFile():
+			with wx.FileDialog(
+				gui.mainFrame, "Open DotPad frame file",
+				wildcard=f"DotPad frame files (*{frameFile.fileExtension})|*{frameFile.fileExtension}",
+				style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST
+			) as dialog:
+				if dialog.ShowModal() == wx.ID_OK:
+					self.showFrameFile(dialog.GetPath())
+		wx.CallAfter(chooseFile)
+
+	@script(gesture="kb:control+shift+NVDA+f8")
+	def script_saveFrameFile(self, gesture):
+		def chooseFile():
+			with wx.FileDialog(
+				gui.mainFrame, "Save DotPad display",
+				wildcard=f"DotPad frame files (*{frameFile.fileExtension})|*{frameFile.fileExtension}",
+				style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT
+			) as dialog:
+				if dialog.ShowModal() == wx.ID_OK:
+					self.saveDisplayToFrameFile(dialog.GetPath())
+		wx.CallAfter(chooseFile)
+
+	@script(gesture="kb:control+alt+NVDA+f7")
+	def script_convertImageFolder(self, gesture):
+		def chooseFolder():
+			with wx.DirDialog(gui.mainFrame, "Convert PNG images in folder to DotPad frames") as dialog:
+				if dialog.ShowModal() != wx.ID_OK:
+					return
+				sourceDir = dialog.GetPath()
+			res = gui.messageBox(
+				"Are the images white on black?",
+				"DotPad",
+				style=wx.YES | wx.NO | wx.ICON_QUESTION
+			)
+			self.convertImageFolder(sourceDir, isWhiteOnBlack=res == wx.YES)
+		wx.CallAfter(chooseFolder)
+
+	@profiled("heatmap")
+	def drawHeatmap(self, rows, firstRow=1, firstCol=1):
+		"""
+		Shows a grid of values, such as a range of spreadsheet cells read with Range.Value2, as a heatmap.
+		"""
+		dp = self.ensureDotPad()
+		if not dp:
+			return
+		data = HeatmapData(rows, firstRow=firstRow, firstCol=firstCol)
+		if data.minVal != data.minVal:
+			ui.message("No numbers in selection")
+			return
+		self.curScene = Scene([HeatmapElement(data)], frameCache=self._frameCache)
+		self._displayScene(self.curScene)
+		ui.message(f"Heatmap of {data.height} rows by {data.width} columns, from {data.minVal:g} to {data.maxVal:g}")
+
+	def getChartOptions(self) -> dict:
+		""" The options of the chart being shown, or the defaults, for showing other charts in the same way."""
+		chart = self.curChart
+		if not chart:
+			return dict(chartType=BarChart, showVerticalRuler=True, showHorizontalRuler=True)
+		return dict(chartType=chart.chartType, showVerticalRuler=chart.showVerticalRuler, showHorizontalRuler=chart.showHorizontalRuler)
+
+	def prefetchCatalogCharts(self, charts):
+		"""
+		Adds charts extracted from a document to the chart catalog,
+		and lays them out in the background for the connected DotPads, so that they can be switched to instantly.
+		"""
+		keys = [self.chartCatalog.add(chart).key for chart in charts]
+		self.chartCatalog.prelayout(keys, self.getChartOptions(), self._devices.geometries)
+
+	@profiled("switchChart")
+	def showCatalogChart(self, chart: CatalogChart, position: int, count: int):
+		"""
+		Shows a chart from a document with the options of the chart being shown,
+		using its layout from the chart catalog if its content has not changed since it was added.
+		"""
+		dp = self.ensureDotPad()
+		if not dp:
+			return
+		chart = self.chartCatalog.add(chart)
+		self.curScene = self.chartCatalog.getScene(chart, self.getChartOptions())
+		self._displayScene(self.curScene)
+		ui.message(f"{chart.title}, chart {position} of {count}")
 
 	def drawChart(self,minVal, maxVal, datasets, yAxisLabel, xAxisLabel):
 		gui.mainFrame._popupSettingsDialog(DotPadChartDialog,self, minVal, maxVal, datasets, xAxisLabel, yAxisLabel)
 
 
+	@script(gesture="kb:control+alt+NVDA+f8")
+	def script_toggleProfiler(self, gesture):
+		self.toggleProfiler()
+
 	@script(gesture="kb:control+NVDA+f8")
 	def script_showSettings(self, gesture):
 		wx.CallAfter(gui.mainFrame._popupSettingsDialog,DotPadConnectionDialog,self)
@@ -2,11 +2,25 @@
 # Copyright (C) 2022 NV Access Limited.
 # this code is licensed under the GNU General Public License version 2.
 
+from functools import lru_cache
+import json
 import os
+import threading
+from typing import Dict, Optional, Sequence, Tuple
 import louis
-import louisHelper
-import brailleTables
-import config
+try:
+	import louisHelper
+	import brailleTables
+	import config
+except ImportError:
+	# Running outside NVDA, E.g. in the offline renderer, where liblouis finds its tables on its own.
+	louisHelper = brailleTables = config = None
+
+defaultBrailleTable = "en-us-comp8.ctb"
+
+# liblouis is not thread safe, and the add-on uses it from NVDA's main thread, the render worker and the warm-up thread,
+# so every call to it from the add-on is made while holding this lock.
+_louisLock = threading.Lock()
 
 brailleCellWidth = 3
 
@@ -40,20 +54,149 @@ brailleDotCoords = [
 ]
 
 
+# The coordinates of the raised dots of every possible cell, so cells can be drawn without testing each dot.
+brailleCellDots = [
+	tuple(coords for dot, coords in enumerate(brailleDotCoords) if 1 << dot & cell)
+	for cell in range(256)
+]
+
+
 def drawBrailleCells(drawFunc, x, y, cells):
 	for cell in cells:
-		for dot in range(0, 8):
-			if 1 << dot & cell:
-				dotX, dotY = brailleDotCoords[dot]
-				drawFunc(x + dotX, y + dotY)
+		for dotX, dotY in brailleCellDots[cell]:
+			drawFunc(x + dotX, y + dotY)
 		x += 3
 
 
 def translateTextToBraille(text, brailleTable=None):
+	if not louisHelper:
+		with _louisLock:
+			return louis.translate(
+				[brailleTable or defaultBrailleTable, "braille-patterns.cti"],
+				text,
+				mode=louis.dotsIO
+			)[0]
 	if not brailleTable:
 		brailleTable = config.conf["braille"]["translationTable"]
-	return louisHelper.translate(
-		[os.path.join(brailleTables.TABLES_DIR, brailleTable), "braille-patterns.cti"],
-		text,
-		mode=louis.dotsIO
-	)[0]
+	with _louisLock:
+		return louisHelper.translate(
+			[os.path.join(brailleTables.TABLES_DIR, brailleTable), "braille-patterns.cti"],
+			text,
+			mode=louis.dotsIO
+		)[0]
+
+
+@lru_cache(maxsize=1024)
+def _translateTextToCells(text: str, brailleTable: Optional[str]) -> bytes:
+	braille = translateTextToBraille(text, brailleTable=brailleTable)
+	# liblouis gives dots as characters offset from 0x8000
+	return bytes(cell if isinstance(cell, int) else ord(cell) & 0xff for cell in braille)
+
+
+def translateTextToCells(text: str, brailleTable: Optional[str] = None) -> bytes:
+	"""
+	Translates text to braille cells, one byte per cell.
+	Translations are cached, as the same lines of text are translated again whenever they are shown.
+	"""
+	if not brailleTable and config:
+		brailleTable = config.conf["braille"]["translationTable"]
+	return _translateTextToCells(text, brailleTable)
+
+
+# Every character used in ruler labels: column letters, digits, the tick that replaces decimal points,
+# minus signs and the spaces that right-justify values.
+rulerAlphabet = "abcdefghijklmnopqrstuvwxyz0123456789'-. "
+rulerCellsFileVersion = 1
+# The cell for each character of rulerAlphabet, for each braille table they have been worked out for
+_rulerCells: Dict[str, Dict[str, int]] = {}
+
+
+def _getLouisVersion() -> str:
+	try:
+		with _louisLock:
+			return louis.version()
+	except AttributeError:
+		return ""
+
+
+def buildRulerCells(brailleTable: str = defaultBrailleTable) -> bool:
+	"""
+	Works out the cell for each character of rulerAlphabet, so labels in that table can be drawn without liblouis.
+	This is only possible for tables that give a single cell for each character, such as computer braille.
+	@returns: whether the table gives a cell per character.
+	"""
+	cells = translateTextToCells(rulerAlphabet, brailleTable=brailleTable)
+	if len(cells) != len(rulerAlphabet):
+		return False
+	_rulerCells[brailleTable] = dict(zip(rulerAlphabet, cells))
+	return True
+
+
+def loadRulerCells(path: str) -> bool:
+	"""
+	Loads cells saved by saveRulerCells, unless they were worked out by a different version of liblouis.
+	@returns: whether cells were loaded.
+	"""
+	try:
+		with open(path, "r", encoding="utf-8") as f:
+			saved = json.load(f)
+	except (OSError, ValueError):
+		# Missing or unreadable, so the cells will be worked out and saved again
+		return False
+	if (
+		saved.get("version") != rulerCellsFileVersion
+		or saved.get("louisVersion") != _getLouisVersion()
+		or saved.get("alphabet") != rulerAlphabet
+	):
+		return False
+	for brailleTable, cells in saved.get("tables", {}).items():
+		if len(cells) == len(rulerAlphabet):
+			_rulerCells[brailleTable] = dict(zip(rulerAlphabet, cells))
+	return bool(_rulerCells)
+
+
+def saveRulerCells(path: str):
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	saved = {
+		"version": rulerCellsFileVersion,
+		"louisVersion": _getLouisVersion(),
+		"alphabet": rulerAlphabet,
+		"tables": {
+			brailleTable: [cells[char] for char in rulerAlphabet]
+			for brailleTable, cells in _rulerCells.items()
+		},
+	}
+	tempPath = path + ".tmp"
+	with open(tempPath, "w", encoding="utf-8") as f:
+		json.dump(saved, f)
+	os.replace(tempPath, path)
+
+
+def translateLabelToCells(label: str, brailleTable: str = defaultBrailleTable) -> Tuple[int, ...]:
+	"""
+	Translates a ruler label to braille cells,
+	using the cells worked out for rulerAlphabet if possible, so that liblouis is not needed.
+	"""
+	cells = _rulerCells.get(brailleTable)
+	if cells:
+		try:
+			return tuple(cells[char] for char in label)
+		except KeyError:
+			pass
+	return tuple(translateTextToCells(label, brailleTable=brailleTable))
+
+
+def warmUpBrailleTables(rulerCellsPath: Optional[str] = None, brailleTables: Sequence[str] = ()):
+	"""
+	Translates some text with the ruler's table and each of the given tables,
+	so that liblouis compiles them now rather than when they are first needed, E.g. on a background thread when NVDA starts.
+	Like any other translation, this holds the add-on's liblouis lock, so a render needing liblouis meanwhile waits for it.
+	The ruler's cells are loaded from rulerCellsPath, or worked out and saved there if they could not be loaded.
+	"""
+	if rulerCellsPath:
+		loadRulerCells(rulerCellsPath)
+	for brailleTable in (defaultBrailleTable, *brailleTables):
+		# Compiles the table, and braille-patterns.cti with it
+		translateTextToCells(rulerAlphabet, brailleTable=brailleTable)
+	if defaultBrailleTable not in _rulerCells and buildRulerCells(defaultBrailleTable) and rulerCellsPath:
+		saveRulerCells(rulerCellsPath)
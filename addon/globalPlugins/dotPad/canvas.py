@@ -0,0 +1,85 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+
+from typing import Iterator, Tuple
+
+
+class DotCanvas:
+	"""
+	An offscreen graphics area, packed into cells in the same layout the DotPad expects for its data buffer.
+	Each cell is one byte, covering a block of cellWidth by cellHeight dots,
+	with the dots of the first column in the low bits.
+	"""
+
+	cellHeight: int = 4
+	cellWidth: int = 2
+
+	def __init__(self, hCellCount: int, vCellCount: int):
+		self.hCellCount = hCellCount
+		self.vCellCount = vCellCount
+		self.hPixelCount = hCellCount * self.cellWidth
+		self.vPixelCount = vCellCount * self.cellHeight
+		self.reset()
+
+	@classmethod
+	def fromBytes(cls, hCellCount: int, vCellCount: int, data: bytes) -> "DotCanvas":
+		""" Creates a canvas holding an existing frame of packed cells."""
+		canvas = cls(hCellCount, vCellCount)
+		if len(data) != len(canvas.data):
+			raise ValueError(f"Expected {len(canvas.data)} cells, got {len(data)}")
+		canvas.data[:] = data
+		return canvas
+
+	@property
+	def geometry(self) -> Tuple[int, int]:
+		return (self.hCellCount, self.vCellCount)
+
+	def reset(self):
+		self.data = bytearray(self.hCellCount * self.vCellCount)
+
+	def setDot(self, x: int, y: int):
+		if x < 0 or x >= self.hPixelCount or y < 0 or y >= self.vPixelCount:
+			return
+		cellIndex = ((y // self.cellHeight) * self.hCellCount) + (x // self.cellWidth)
+		bit = (y % self.cellHeight) + ((x % self.cellWidth) * self.cellHeight)
+		self.data[cellIndex] |= 1 << bit
+
+	def fillVerticalSpan(self, x: int, top: int, bottom: int):
+		""" Raises the dots in column x from top up to but not including bottom, a cell at a time."""
+		if x < 0 or x >= self.hPixelCount:
+			return
+		top = max(0, top)
+		bottom = min(self.vPixelCount, bottom)
+		cellHeight = self.cellHeight
+		colShift = (x % self.cellWidth) * cellHeight
+		cellIndex = ((top // cellHeight) * self.hCellCount) + (x // self.cellWidth)
+		y = top
+		while y < bottom:
+			cellTop = y % cellHeight
+			cellBottom = min(cellHeight, cellTop + (bottom - y))
+			self.data[cellIndex] |= (((1 << (cellBottom - cellTop)) - 1) << cellTop) << colShift
+			y += cellBottom - cellTop
+			cellIndex += self.hCellCount
+
+	def getDot(self, x: int, y: int) -> bool:
+		if x < 0 or x >= self.hPixelCount or y < 0 or y >= self.vPixelCount:
+			return False
+		cellIndex = ((y // self.cellHeight) * self.hCellCount) + (x // self.cellWidth)
+		bit = (y % self.cellHeight) + ((x % self.cellWidth) * self.cellHeight)
+		return bool(self.data[cellIndex] & (1 << bit))
+
+	def iterDots(self) -> Iterator[Tuple[int, int]]:
+		""" The coordinates of each raised dot, row of cells by row of cells."""
+		for cellIndex, cell in enumerate(self.data):
+			if not cell:
+				continue
+			cellY, cellX = divmod(cellIndex, self.hCellCount)
+			for bit in range(self.cellWidth * self.cellHeight):
+				if cell & (1 << bit):
+					dx, dy = divmod(bit, self.cellHeight)
+					yield (cellX * self.cellWidth) + dx, (cellY * self.cellHeight) + dy
+
+	def getBytes(self) -> bytes:
+		return bytes(self.data)
@@ -0,0 +1,149 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from logHandler import log
+from .dataUtils import Dataset
+from .frameCache import FrameCache
+from .scene import Scene, ChartElement
+
+
+class CatalogChart:
+	"""
+	A chart extracted from a document, such as one of the charts in an Excel workbook.
+	Its scene is made for the chart options it was last shown with, and is kept along with its laid out frames.
+	"""
+
+	def __init__(
+			self,
+			key: tuple,
+			title: str,
+			minVal: float,
+			maxVal: float,
+			datasets: Dict[str, Dataset],
+			xAxisLabel: Optional[str] = None,
+			yAxisLabel: Optional[str] = None
+	):
+		"""
+		@param key: identifies the chart within its document, E.g. (workbook, sheet, chart name).
+		"""
+		self.key = key
+		self.title = title
+		self.minVal = minVal
+		self.maxVal = maxVal
+		self.datasets = datasets
+		self.xAxisLabel = xAxisLabel
+		self.yAxisLabel = yAxisLabel
+		self._scene: Optional[Scene] = None
+		self._sceneOptions: Optional[tuple] = None
+
+	@property
+	def contentKey(self) -> tuple:
+		""" Everything extracted from the document, so that a chart extracted again can be compared with this one."""
+		return (
+			self.title, self.minVal, self.maxVal,
+			tuple((name, dataset.digest) for name, dataset in self.datasets.items()),
+			self.xAxisLabel, self.yAxisLabel,
+		)
+
+
+class ChartCatalog:
+	"""
+	The charts of a document, each with its scene laid out in advance for the connected DotPads,
+	so that switching between them only has to output a frame.
+	At most maxCharts charts are kept, dropping the least recently used.
+	"""
+
+	maxCharts = 16
+
+	def __init__(self, frameCache: Optional[FrameCache] = None):
+		self.frameCache = frameCache
+		self._charts: "OrderedDict[tuple, CatalogChart]" = OrderedDict()
+		self._lock = threading.RLock()
+		self._executor: Optional[ThreadPoolExecutor] = None
+		self._prelayouts: List[Future] = []
+
+	def __len__(self):
+		return len(self._charts)
+
+	def __contains__(self, key: tuple) -> bool:
+		return key in self._charts
+
+	def add(self, chart: CatalogChart) -> CatalogChart:
+		"""
+		Adds a chart, replacing any chart with the same key.
+		If the chart with that key has the same content (E.g. the sheet has not been recalculated since),
+		that chart is kept instead, along with its laid out frames.
+		@returns: the chart in the catalog.
+		"""
+		with self._lock:
+			existing = self._charts.get(chart.key)
+			if existing and existing.contentKey == chart.contentKey:
+				chart = existing
+			self._charts[chart.key] = chart
+			self._charts.move_to_end(chart.key)
+			while len(self._charts) > self.maxCharts:
+				self._charts.popitem(last=False)
+		return chart
+
+	def get(self, key: tuple) -> Optional[CatalogChart]:
+		with self._lock:
+			chart = self._charts.get(key)
+			if chart:
+				self._charts.move_to_end(key)
+			return chart
+
+	def getScene(self, chart: CatalogChart, options: Dict[str, Any]) -> Scene:
+		"""
+		The scene of the chart for the given chart options (as taken by L{ChartElement}, E.g. chartType),
+		made again if the options have changed since it was last made.
+		"""
+		optionsKey = tuple(sorted(options.items(), key=lambda item: item[0]))
+		with self._lock:
+			if chart._scene is None or chart._sceneOptions != optionsKey:
+				element = ChartElement(minVal=chart.minVal, maxVal=chart.maxVal, datasets=chart.datasets, **options)
+				chart._scene = Scene([element], frameCache=self.frameCache)
+				chart._sceneOptions = optionsKey
+			return chart._scene
+
+	def prelayout(self, keys: Iterable[tuple], options: Dict[str, Any], geometries: Iterable[Tuple[int, int]]):
+		"""
+		Lays out and rasterizes the given charts for each geometry on a background thread,
+		after any charts given earlier.
+		"""
+		geometries = list(geometries)
+		if not geometries:
+			return
+		with self._lock:
+			if not self._executor:
+				self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="DotPad chart prelayout")
+			charts = [self._charts[key] for key in keys if key in self._charts]
+			self._prelayouts = [future for future in self._prelayouts if not future.done()]
+			self._prelayouts.extend(
+				self._executor.submit(self._prelayoutChart, chart, options, geometries)
+				for chart in charts
+			)
+
+	def _prelayoutChart(self, chart: CatalogChart, options: Dict[str, Any], geometries: List[Tuple[int, int]]):
+		try:
+			# A snapshot of its own, so that the scene can be scrolled while it is shown.
+			# It shares the scene's layouts and frames, so the frames are ready when the scene is shown.
+			scene = self.getScene(chart, options).snapshot()
+			for geometry in geometries:
+				scene.getFrame(geometry)
+		except Exception:
+			log.error(f"Error laying out DotPad chart {chart.title}", exc_info=True)
+
+	def terminate(self):
+		with self._lock:
+			for future in self._prelayouts:
+				future.cancel()
+			executor = self._executor
+			self._executor = None
+		if executor:
+			executor.shutdown(wait=False)
@@ -0,0 +1,214 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+
+from enum import Enum
+import threading
+import time
+from typing import Optional, Callable, Tuple
+from logHandler import log
+from .pyDotPad import DotPad, DotPadError, connectionLostErrorCodes
+
+
+class ConnectionState(Enum):
+	DISCONNECTED = "disconnected"
+	CONNECTED = "connected"
+	RECONNECTING = "reconnecting"
+
+
+class DotPadConnection:
+	"""
+	Supervises the connection to a DotPad on a particular COM port.
+	If the device is lost while outputting, the connection is re-established in the background with exponential backoff,
+	and the last frame sent is replayed once the device is back.
+	"""
+
+	# Number of seconds to wait after initializing the device before it can accept data.
+	initDelay = 3
+	minReconnectDelay = 0.5
+	maxReconnectDelay = 30
+
+	state: ConnectionState = ConnectionState.DISCONNECTED
+	# A copy of the last error, without the traceback that would keep the DotPad that raised it alive
+	lastError: Optional[DotPadError] = None
+	reconnectAttempts: int = 0
+
+	def __init__(
+			self,
+			port: str,
+			keyCallback: Optional[Callable[[int], None]] = None,
+			stateChangeCallback: Optional[Callable[["DotPadConnection"], None]] = None,
+			sdkSlot: int = 0
+	):
+		"""
+		@param port: the COM port the device is connected to, E.g. "COM3".
+		@param sdkSlot: the copy of the SDK to drive the device with, see L{DotPad}.
+		@param keyCallback: called from a background thread when a key is pressed on the device.
+		@param stateChangeCallback: called whenever the state of the connection changes, never while holding the connection's lock,
+			so it can call back into the connection.
+			Changes made by L{connect} and L{terminate} are reported on the caller's thread,
+			and losing and regaining the device on the reconnect thread.
+		"""
+		self.port = port
+		self.portNum = int(port[3:])
+		self.keyCallback = keyCallback
+		self.stateChangeCallback = stateChangeCallback
+		self.sdkSlot = sdkSlot
+		self._dp: Optional[DotPad] = None
+		self._lastFrame: Optional[bytes] = None
+		self._lock = threading.RLock()
+		self._stopEvent = threading.Event()
+		self._reconnectThread: Optional[threading.Thread] = None
+		self._geometry: Optional[Tuple[int, int]] = None
+
+	@property
+	def dp(self) -> Optional[DotPad]:
+		return self._dp
+
+	@property
+	def geometry(self) -> Optional[Tuple[int, int]]:
+		""" The size of the device in cells, or None if it has never been connected."""
+		dp = self._dp
+		if dp:
+			self._geometry = dp.geometry
+		return self._geometry
+
+	def _setState(self, state: ConnectionState) -> bool:
+		"""
+		Changes the state of the connection.
+		If it changed, call L{_notifyStateChange} once the lock is no longer held.
+		@returns: whether the state changed.
+		"""
+		if state is self.state:
+			return False
+		self.state = state
+		return True
+
+	def _notifyStateChange(self):
+		if self.stateChangeCallback:
+			self.stateChangeCallback(self)
+
+	def connect(self, wait: bool = False) -> DotPad:
+		"""
+		Initializes the device, raising DotPadError or RuntimeError on failure.
+		@param wait: when true, blocks the caller for a sufficient amount of time to allow the device to initialize.
+		"""
+		with self._lock:
+			self._stopEvent.clear()
+			self._closeDevice()
+			self._dp = DotPad(self.portNum, self.keyCallback, self.sdkSlot)
+			if wait:
+				time.sleep(self.initDelay)
+			self.lastError = None
+			stateChanged = self._setState(ConnectionState.CONNECTED)
+			dp = self._dp
+		if stateChanged:
+			self._notifyStateChange()
+		return dp
+
+	def _closeDevice(self):
+		dp = self._dp
+		self._dp = None
+		if not dp:
+			return
+		try:
+			dp.terminate()
+		except DotPadError:
+			log.debugWarning("Error terminating DotPad", exc_info=True)
+
+	def terminate(self):
+		""" Closes the device and stops any reconnection in progress."""
+		self._stopEvent.set()
+		thread = self._reconnectThread
+		if thread and thread is not threading.current_thread():
+			thread.join()
+		with self._lock:
+			self._closeDevice()
+			stateChanged = self._setState(ConnectionState.DISCONNECTED)
+		if stateChanged:
+			self._notifyStateChange()
+
+	def output(self, fullRefresh: bool = False) -> bool:
+		"""
+		Sends the device's data buffer to the device, remembering it so it can be replayed after a reconnect.
+		If the device has been lost, a reconnection is started in the background and the error is re-raised.
+		@returns: True if the device confirmed the display, False if it timed out.
+		"""
+		with self._lock:
+			dp = self._dp
+			if not dp or self.state is not ConnectionState.CONNECTED:
+				raise RuntimeError(f"DotPad on {self.port} is {self.state.value}")
+			self._lastFrame = dp.getDataBuffer()
+			try:
+				return dp.outputDataBuffer(fullRefresh)
+			except DotPadError as e:
+				if e.code in connectionLostErrorCodes:
+					self.lastError = DotPadError(e.code)
+					self._startReconnect()
+				raise
+
+	def outputFrame(self, data: bytes, fullRefresh: bool = False) -> bool:
+		"""
+		Replaces the device's data buffer with the given packed cells, and outputs it as with L{output}.
+		"""
+		with self._lock:
+			dp = self._dp
+			if not dp or self.state is not ConnectionState.CONNECTED:
+				raise RuntimeError(f"DotPad on {self.port} is {self.state.value}")
+			dp.setDataBuffer(data)
+			return self.output(fullRefresh)
+
+	def _startReconnect(self):
+		# Called while holding the lock, so the reconnect thread reports the change of state
+		if self._reconnectThread and self._reconnectThread.is_alive():
+			return
+		self.reconnectAttempts = 0
+		self._setState(ConnectionState.RECONNECTING)
+		self._reconnectThread = threading.Thread(
+			target=self._reconnectLoop,
+			name=f"DotPad reconnect {self.port}",
+			daemon=True
+		)
+		self._reconnectThread.start()
+
+	def _reconnectLoop(self):
+		self._notifyStateChange()
+		delay = self.minReconnectDelay
+		while not self._stopEvent.wait(delay):
+			self.reconnectAttempts += 1
+			try:
+				with self._lock:
+					if self._stopEvent.is_set():
+						return
+					self._closeDevice()
+					self._dp = DotPad(self.portNum, self.keyCallback, self.sdkSlot)
+			except (DotPadError, RuntimeError) as e:
+				log.debug(f"Reconnect attempt {self.reconnectAttempts} to {self.port} failed: {e!r}")
+				if isinstance(e, DotPadError):
+					self.lastError = DotPadError(e.code)
+				delay = min(delay * 2, self.maxReconnectDelay)
+				continue
+			if self._stopEvent.wait(self.initDelay):
+				return
+			try:
+				self._replayLastFrame()
+			except DotPadError as e:
+				log.debug(f"Replaying frame on {self.port} failed: {e!r}")
+				self.lastError = DotPadError(e.code)
+				delay = min(delay * 2, self.maxReconnectDelay)
+				continue
+			self.lastError = None
+			with self._lock:
+				stateChanged = self._setState(ConnectionState.CONNECTED)
+			if stateChanged:
+				self._notifyStateChange()
+			return
+
+	def _replayLastFrame(self):
+		with self._lock:
+			dp = self._dp
+			if not dp or self._lastFrame is None:
+				return
+			dp.setDataBuffer(self._lastFrame)
+			dp.outputDataBuffer(fullRefresh=True)
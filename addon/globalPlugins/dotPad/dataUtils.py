@@ -4,15 +4,283 @@
 # this code is licensed under the GNU General Public License version 2.
 
 
-from typing import List, Tuple, Optional, Dict
+from typing import List, Tuple, Optional, Dict, Iterable, Sequence, Union, NamedTuple
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from functools import lru_cache
+import hashlib
 import math
+import operator
+import threading
+from .canvas import DotCanvas
 from .brailleUtils import (
 	drawBrailleCells,
-	translateTextToBraille,
+	translateLabelToCells,
 	brailleCellWidth
 )
 
 
+class BinningMode(Enum):
+	# Bins of equal width, as many as fit
+	FIXED_WIDTH = "fixedWidth"
+	# Bins holding roughly equal numbers of values
+	QUANTILE = "quantile"
+	# Bins of equal width, as many as suit the number of values (Sturges' rule), up to as many as fit
+	AUTO = "auto"
+
+
+class Histogram(NamedTuple):
+	# The edges of the bins, one more than there are bins
+	edges: Tuple[float, ...]
+	counts: Tuple[int, ...]
+
+	@property
+	def heights(self) -> List[float]:
+		"""
+		The height of each bin's bar: its count scaled by how much narrower or wider it is than an average bin,
+		so that bins of unequal width (E.g. quantile bins) still show the shape of the distribution.
+		"""
+		meanWidth = (self.edges[-1] - self.edges[0]) / len(self.counts)
+		return [
+			count * (meanWidth / (end - start)) if end > start else float(count)
+			for count, start, end in zip(self.counts, self.edges, self.edges[1:])
+		]
+
+
+class Dataset:
+	"""
+	A series of values stored compactly as an array of doubles.
+	Blank values (E.g. empty cells) are stored as NaN.
+	Summary statistics are calculated once on creation, so charts never need to scan the values to lay themselves out.
+	"""
+
+	def __init__(self, values: Iterable[Optional[float]]):
+		self.values = array('d', (math.nan if val is None else val for val in values))
+		present = [val for val in self.values if val == val]  # NaN is never equal to itself
+		self.count = len(present)
+		if present:
+			self.minVal = min(present)
+			self.maxVal = max(present)
+			self.total = math.fsum(present)
+			self.mean = self.total / self.count
+		else:
+			self.minVal = self.maxVal = self.mean = math.nan
+			self.total = 0.0
+
+	def __len__(self):
+		return len(self.values)
+
+	def __iter__(self):
+		return iter(self.values)
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return memoryview(self.values)[index]
+		return self.values[index]
+
+	def view(self, start: int, end: int) -> memoryview:
+		"""A window onto the values, without copying them."""
+		return memoryview(self.values)[start:end]
+
+	_digest = None
+
+	@property
+	def digest(self) -> str:
+		""" A hash of the values, identifying this data E.g. for caching rendered charts."""
+		if not self._digest:
+			self._digest = hashlib.sha1(self.values.tobytes()).hexdigest()
+		return self._digest
+
+	_pyramid = None
+
+	@property
+	def pyramid(self) -> "DatasetPyramid":
+		""" A summary pyramid of the values, built the first time it is needed."""
+		if not self._pyramid:
+			self._pyramid = DatasetPyramid(self.values)
+		return self._pyramid
+
+	# The resolution of the histogram that all others are made from
+	fineBinCount = 4096
+	_fineHistogram = None
+
+	@property
+	def fineHistogram(self) -> array:
+		"""
+		The number of values in each of fineBinCount equal parts of the range from minVal to maxVal,
+		counted in a single pass the first time it is needed.
+		"""
+		if self._fineHistogram is None:
+			binCount = self.fineBinCount
+			counts = array('L', [0]) * binCount
+			if self.count:
+				scale = binCount / (self.maxVal - self.minVal) if self.maxVal > self.minVal else 0.0
+				minVal = self.minVal
+				lastBin = binCount - 1
+				for val in self.values:
+					if val == val:
+						index = int((val - minVal) * scale)
+						counts[index if index < lastBin else lastBin] += 1
+			self._fineHistogram = counts
+		return self._fineHistogram
+
+	_histograms = None
+
+	def getHistogram(self, maxBins: int, mode: BinningMode = BinningMode.AUTO) -> Histogram:
+		"""
+		Divides the values into at most maxBins bins.
+		Bins are made from the fine histogram, so their edges are rounded to 1 part in fineBinCount of the range,
+		and each histogram is kept, so changing the number of bins never reads the values again.
+		"""
+		if self._histograms is None:
+			self._histograms = {}
+		key = (maxBins, mode)
+		histogram = self._histograms.get(key)
+		if histogram:
+			return histogram
+		fine = self.fineHistogram
+		fineBinCount = len(fine)
+		if not self.count or self.maxVal == self.minVal:
+			# Everything is in one bin
+			histogram = Histogram((self.minVal, self.maxVal), (self.count,))
+			self._histograms[key] = histogram
+			return histogram
+		binCount = max(1, min(maxBins, fineBinCount))
+		if mode is BinningMode.AUTO:
+			binCount = min(binCount, math.ceil(math.log2(self.count)) + 1)
+		if mode is BinningMode.QUANTILE:
+			# Close each bin once it holds its share of the values
+			bounds = [0]
+			total = 0
+			for index, count in enumerate(fine):
+				total += count
+				if total >= (len(bounds) * self.count) / binCount and index + 1 < fineBinCount:
+					bounds.append(index + 1)
+			bounds.append(fineBinCount)
+		else:
+			bounds = [(index * fineBinCount) // binCount for index in range(binCount + 1)]
+		counts = tuple(sum(fine[start:end]) for start, end in zip(bounds, bounds[1:]))
+		scale = (self.maxVal - self.minVal) / fineBinCount
+		edges = tuple(self.minVal + (bound * scale) for bound in bounds)
+		histogram = self._histograms[key] = Histogram(edges, counts)
+		return histogram
+
+	def resample(self, start: int, end: int, width: int) -> List[float]:
+		"""
+		Values suitable for drawing a continuous line of the given width in dots, for the range of values from start to end.
+		When there are more values than dots, each dot is the mean of the values it covers, calculated from the pyramid.
+		Otherwise the values are returned as is, to be stretched when drawn.
+		Blanks are filled in by linear interpolation.
+		"""
+		if end - start > width:
+			values = [mean for minVal, maxVal, mean in self.pyramid.resample(start, end, width)]
+		else:
+			values = self.values[start:end].tolist()
+		fillGapsInDataset(values)
+		return values
+
+
+class DatasetPyramid:
+	"""
+	The minimum, maximum, total and count of the values in aligned blocks of 1, 2, 4, 8... values, like a segment tree.
+	A summary of any range can be combined from O(log n) blocks,
+	so resampling a range to a given width costs O(width log n) regardless of how many values it covers.
+	Blank (NaN) values are not counted.
+	"""
+
+	def __init__(self, values: array):
+		mins = array('d', (val if val == val else math.inf for val in values))
+		maxs = array('d', (val if val == val else -math.inf for val in values))
+		totals = array('d', (val if val == val else 0.0 for val in values))
+		counts = array('L', (1 if val == val else 0 for val in values))
+		self._levels = [(mins, maxs, totals, counts)]
+		while len(mins) > 1:
+			# Each block at the next level combines a pair of blocks at this level.
+			# A trailing unpaired block is covered by the levels below.
+			mins = array('d', map(min, mins[0::2], mins[1::2]))
+			maxs = array('d', map(max, maxs[0::2], maxs[1::2]))
+			totals = array('d', map(operator.add, totals[0::2], totals[1::2]))
+			counts = array('L', map(operator.add, counts[0::2], counts[1::2]))
+			self._levels.append((mins, maxs, totals, counts))
+
+	def summarize(self, start: int, end: int) -> Tuple[float, float, float, int]:
+		"""
+		The minimum, maximum, total and count of the values from start to end.
+		The minimum and maximum are infinite if there are no values.
+		"""
+		minVal = math.inf
+		maxVal = -math.inf
+		total = 0.0
+		count = 0
+		maxLevel = len(self._levels) - 1
+		while start < end:
+			# Use the largest block that starts here and does not pass the end.
+			level = min(
+				maxLevel,
+				(end - start).bit_length() - 1,
+				((start & -start).bit_length() - 1) if start else maxLevel
+			)
+			index = start >> level
+			mins, maxs, totals, counts = self._levels[level]
+			if mins[index] < minVal:
+				minVal = mins[index]
+			if maxs[index] > maxVal:
+				maxVal = maxs[index]
+			total += totals[index]
+			count += counts[index]
+			start += 1 << level
+		return minVal, maxVal, total, count
+
+	def resample(self, start: int, end: int, width: int) -> List[Tuple[float, float, float]]:
+		"""
+		Divides the values from start to end into width even parts,
+		returning the minimum, maximum and mean of each part, which are NaN for parts with no values.
+		"""
+		length = end - start
+		parts = []
+		partStart = start
+		for index in range(width):
+			partEnd = start + ((index + 1) * length) // width
+			minVal, maxVal, total, count = self.summarize(partStart, partEnd)
+			if count:
+				parts.append((minVal, maxVal, total / count))
+			else:
+				parts.append((math.nan, math.nan, math.nan))
+			partStart = partEnd
+		return parts
+
+
+def fillGapsInDataset(values: List[float]) -> None:
+	""" Replaces blank (NaN) values in place by linear interpolation from their neighbours."""
+	lastIndex = None
+	for index, val in enumerate(values):
+		if val != val:
+			continue
+		if lastIndex is None:
+			values[:index] = [val] * index
+		elif index - lastIndex > 1:
+			lastVal = values[lastIndex]
+			step = (val - lastVal) / (index - lastIndex)
+			for gapIndex in range(lastIndex + 1, index):
+				values[gapIndex] = lastVal + (step * (gapIndex - lastIndex))
+		lastIndex = index
+	if lastIndex is None:
+		values[:] = [0.0] * len(values)
+		return
+	values[lastIndex + 1:] = [values[lastIndex]] * (len(values) - lastIndex - 1)
+
+
+def getDatasetsRange(datasets: Iterable[Dataset]) -> Tuple[float, float]:
+	""" The smallest and largest values across all the given datasets, from their precalculated statistics."""
+	datasets = [dataset for dataset in datasets if dataset.count]
+	if not datasets:
+		return 0.0, 0.0
+	return min(dataset.minVal for dataset in datasets), max(dataset.maxVal for dataset in datasets)
+
+
 def transposeValuesInDataset(values: List[float], amount: float) -> None:
 	for index in range(len(values)):
 		values[index] += amount
@@ -50,39 +318,63 @@ def resizeDataset(values: List[float], newSize: int) -> None:
 			lastNewVal = newVal
 		lastNewIndex = newIndex
 
-def drawContinuousDataset(func_drawDot, destX: int, destY: int, destWidth: int, destHeight: int, minY: float, maxY: float, values: List[float], fillBelowCurve=False):
-	if fillBelowCurve:
-		origfunc_drawDot = func_drawDot
-		func_drawDot = lambda x, y: drawLine(origfunc_drawDot,x, y, destHeight - y, vertical=True)
+def getContinuousDatasetSpans(destX: int, destY: int, destWidth: int, destHeight: int, minY: float, maxY: float, values: List[float]) -> List[Tuple[int, int, int]]:
+	"""
+	The dots of a continuous line through the values, as the top and bottom (inclusive) of the line in each column: (x, top, bottom).
+	Each column joins its value to the previous column's value, so that steep changes are still one continuous line.
+	The values are resized and scaled in place.
+	"""
 	yRange = (maxY - minY)
 	yScale = destHeight / yRange
 	resizeDataset(values, destWidth)
 	transposeValuesInDataset(values, minY * -1)
 	scaleValuesInDataset(values, yScale)
 	flipValuesInDataset(values, destHeight - 1)
+	spans = []
 	lastY = None
 	for x, y in enumerate(values):
 		x += destX
 		y += destY
 		y = int(round(y))
-		if lastY is not None:
-			for subY in range(min(lastY, y), max(lastY, y)):
-				if subY == lastY:
-					continue
-				func_drawDot(x, int(subY))
-		func_drawDot(x, int(y))
+		if lastY is None or lastY == y:
+			spans.append((x, y, y))
+		elif lastY < y:
+			spans.append((x, lastY + 1, y))
+		else:
+			spans.append((x, y, lastY - 1))
 		lastY = y
+	return spans
 
-def drawDiscreteDataset(func_drawDot, destX: int, destY: int, destWidth: int, destHeight: int, minY: float, maxY: float, values: List[float], barWidth: int, colWidth: int):
+def drawContinuousDataset(func_drawDot, destX: int, destY: int, destWidth: int, destHeight: int, minY: float, maxY: float, values: List[float], fillBelowCurve=False):
+	base = destY + destHeight
+	for x, top, bottom in getContinuousDatasetSpans(destX, destY, destWidth, destHeight, minY, maxY, values):
+		drawVerticalSpan(func_drawDot, x, top, base if fillBelowCurve else bottom + 1)
+
+def drawStackedDataset(func_drawDot, destX: int, destY: int, destWidth: int, destHeight: int, minY: float, maxY: float, values: List[float], lowerValues: Optional[List[float]] = None):
+	"""
+	Draws a continuous line through the values, filled down to a dot above the line through lowerValues,
+	or to the bottom if there are no lower values, so that each layer of a stack can be felt separately.
+	"""
+	spans = getContinuousDatasetSpans(destX, destY, destWidth, destHeight, minY, maxY, values)
+	if lowerValues is not None:
+		bases = [top - 1 for x, top, bottom in getContinuousDatasetSpans(destX, destY, destWidth, destHeight, minY, maxY, lowerValues)]
+	else:
+		bases = [destY + destHeight] * len(spans)
+	for (x, top, bottom), base in zip(spans, bases):
+		drawVerticalSpan(func_drawDot, x, top, max(bottom + 1, base))
+
+def drawDiscreteDataset(func_drawDot, destX: int, destY: int, destWidth: int, destHeight: int, minY: float, maxY: float, values: Iterable[float], barWidth: int, colWidth: int):
+	"""
+	Draws a bar for each value, leaving a gap for blank (NaN) values.
+	The values are not modified, so a view onto a L{Dataset} can be passed without copying.
+	"""
 	yRange = (maxY - minY)
 	yScale = destHeight / yRange
-	transposeValuesInDataset(values, minY * -1)
-	scaleValuesInDataset(values, yScale)
-	flipValuesInDataset(values, destHeight)
-	lastY = None
-	for index in range(len(values)):
+	for index, val in enumerate(values):
+		if val != val:
+			continue
 		x = destX + (index * colWidth)
-		y = destY + int(values[index])
+		y = destY + int(destHeight - ((val + (minY * -1)) * yScale))
 		for subY in range(y, destHeight):
 			drawLine(func_drawDot, x, subY, barWidth, vertical=False)
 
@@ -94,26 +386,101 @@ def drawHorizontalRuler(func_drawDot, x: int, y: int, colStartOffset: int, colEn
 	deltaX +=2 
 	deltaY += 2
 	for label in labels:
-		cells = translateTextToBraille(label, brailleTable='en-us-comp8.ctb')
+		cells = translateLabelToCells(label, brailleTable='en-us-comp8.ctb')
 		drawBrailleCells(func_drawDot, x + deltaX, y + deltaY, cells)
 		deltaX += spacing
 	return deltaX, deltaY + 3
 
+def drawBinEdgeRuler(func_drawDot, x: int, y: int, edges: Sequence[float], spacing: int, maxX: int, maxLabelCells: int, brailleTable: str='en-us-comp8.ctb'):
+	"""
+	Draws a horizontal ruler for bins of values, such as those of a histogram, each spacing dots wide, starting from x.
+	The bins may be of unequal width in value, so a value is placed in proportion within the bin it falls in.
+	The first and last edges are always labelled,
+	and between them, the easily read values from L{layoutValueAxis} are labelled under a tick wherever there is room.
+	@param edges: the edges of the bins, one more than there are bins.
+	@param maxX: the first dot to the right that the ruler must not reach.
+	"""
+	numBins = len(edges) - 1
+	endX = min(x + (numBins * spacing), maxX - 1)
+	drawLine(func_drawDot, x, y, (endX - x) + 1, vertical=False)
+	minVal, maxVal = edges[0], edges[-1]
+	if minVal != minVal:
+		# No values to label
+		return
+	# Enough labels to fill the ruler if each were as wide as allowed, with a cell between them
+	numLabels = max(1, ((endX - x) + 1) // ((maxLabelCells + 1) * brailleCellWidth))
+	axis = layoutValueAxis(minVal, maxVal, numLabels, maxLabelCells, brailleTable)
+	decimalPlaces = _getDecimalPlaces(axis.step)
+
+	def getCells(val):
+		label = _formatAxisLabel(val, decimalPlaces).replace(".", "'")
+		return translateLabelToCells(label, brailleTable=brailleTable)
+
+	def getX(val):
+		index = bisect_right(edges, val, 0, numBins) - 1
+		start, end = edges[index], edges[index + 1]
+		offset = ((val - start) / (end - start)) if end > start else 0
+		return min(x + int((index + offset) * spacing), endX)
+
+	# The first and last labels start and end at the ends of the ruler, the others are centred on their tick.
+	firstCells = getCells(minVal)
+	lastCells = getCells(maxVal)
+	labels = [(x, firstCells)]
+	lastStart = (endX + 1) - (len(lastCells) * brailleCellWidth)
+	if maxVal > minVal and lastStart >= x + (len(firstCells) + 1) * brailleCellWidth:
+		labels.append((lastStart, lastCells))
+	for index in range(len(axis.labels)):
+		val = round(axis.minVal + (axis.step * index), decimalPlaces)
+		if not minVal < val < maxVal:
+			continue
+		tickX = getX(val)
+		cells = getCells(val)
+		start = tickX - ((len(cells) * brailleCellWidth) // 2)
+		end = start + (len(cells) * brailleCellWidth)
+		# Keep a blank cell between labels, so that each reads as a separate value
+		if any(
+			start < otherStart + ((len(otherCells) + 1) * brailleCellWidth) and otherStart < end + brailleCellWidth
+			for otherStart, otherCells in labels
+		):
+			continue
+		func_drawDot(tickX, y + 1)
+		labels.append((start, cells))
+	for start, cells in labels:
+		drawBrailleCells(func_drawDot, start, y + 2, cells)
+
+
 def drawVerticalRuler(func_drawDot, x: int, y: int, minY: int, maxY: int, yCount: int, spacing: int=3):
 	labels = generateYValueLabels(minY, maxY, yCount)
+	labelCells = [translateLabelToCells(label, brailleTable='en-us-comp8.ctb') for label in labels]
+	return drawVerticalRulerCells(func_drawDot, x, y, labelCells, spacing)
+
+def drawVerticalRulerCells(func_drawDot, x: int, y: int, labelCells: List[List[int]], spacing: int=3):
+	"""
+	Draws a vertical ruler from already translated labels, given from the bottom of the ruler up.
+	"""
 	deltaX = 0
 	deltaY = 0 
-	labels.reverse()
-	for label in labels:
-		cells = translateTextToBraille(label, brailleTable='en-us-comp8.ctb')
+	for cells in reversed(labelCells):
 		deltaX = max(deltaX, len(cells) * brailleCellWidth)
 		drawBrailleCells(func_drawDot, x, y + deltaY + 1, cells)
 		deltaY += spacing
 		func_drawDot(x + deltaX, (y + deltaY - 1))
 	deltaX += 1
-	drawLine(func_drawDot, x + deltaX, y, (len(labels) * spacing), vertical=True)
+	drawLine(func_drawDot, x + deltaX, y, (len(labelCells) * spacing), vertical=True)
 	return deltaX + 1, deltaY - 1
 
+def drawVerticalSpan(func_drawDot, x: int, top: int, bottom: int):
+	"""
+	Raises the dots in column x from top up to but not including bottom.
+	When drawing straight onto a L{DotCanvas}, whole cells are filled at once rather than dot by dot.
+	"""
+	canvas = getattr(func_drawDot, "__self__", None)
+	if isinstance(canvas, DotCanvas) and func_drawDot == canvas.setDot:
+		canvas.fillVerticalSpan(x, top, bottom)
+		return
+	for y in range(top, bottom):
+		func_drawDot(x, y)
+
 def drawLine(func_drawDot, x: int, y: int, length: int, vertical=False):
 	for index in range(length):
 		if vertical:
@@ -139,6 +506,89 @@ def generateYValueLabels(minY: float, maxY: float, yCount: int) -> List[str]:
 	yLabels = [label.replace(".", "'") for label in yLabels]
 	return yLabels
 
+class ValueAxisLayout(NamedTuple):
+	# The values at the bottom and top of the plot
+	minVal: float
+	maxVal: float
+	# The difference in value between each label
+	step: float
+	# The labels from the bottom of the ruler up, and their braille cells
+	labels: Tuple[str, ...]
+	labelCells: Tuple[Tuple[int, ...], ...]
+
+
+# Multiples of powers of 10 that make for easily read steps between labels
+niceStepMultipliers = (1, 1.2, 1.5, 2, 2.5, 3, 4, 5, 6, 8)
+
+
+def _iterNiceSteps(minStep: float):
+	""" Yields nice steps in ascending order, starting from the smallest that is at least minStep."""
+	exponent = math.floor(math.log10(minStep))
+	while True:
+		magnitude = 10 ** exponent
+		for multiplier in niceStepMultipliers:
+			step = multiplier * magnitude
+			if step >= minStep * (1 - 1e-9):
+				yield step
+		exponent += 1
+
+
+def _formatAxisLabel(val: float, decimalPlaces: int) -> str:
+	label = format(val, f".{decimalPlaces}f")
+	if label.lstrip("-").strip("0.") == "":
+		# Avoid "-0"
+		label = label.lstrip("-")
+	return label
+
+
+def _getDecimalPlaces(step: float) -> int:
+	for decimalPlaces in range(10):
+		if abs(round(step, decimalPlaces) - step) <= step * 1e-9:
+			return decimalPlaces
+	return 10
+
+
+@lru_cache(maxsize=128)
+def layoutValueAxis(minVal: float, maxVal: float, numLabels: int, maxLabelCells: int, brailleTable: str) -> ValueAxisLayout:
+	"""
+	Chooses a range and easily read label values for a value axis with the given number of labels,
+	one per row of the ruler, that covers the range from minVal to maxVal.
+	The smallest step is used whose labels fit within maxLabelCells braille cells;
+	if no step gives labels that narrow, the smallest step covering the range is used.
+	Layouts are remembered, as charts often share the same range and size.
+	"""
+	numLabels = max(numLabels, 1)
+	if maxVal <= minVal:
+		# A single value, so centre it in a range around it
+		padding = (abs(minVal) or 1) / 2
+		minVal -= padding
+		maxVal += padding
+	fallback = None
+	for attempt, step in enumerate(_iterNiceSteps((maxVal - minVal) / numLabels)):
+		decimalPlaces = _getDecimalPlaces(step)
+		# Rounding removes floating point noise, E.g. 0.15000000000000002
+		step = round(step, decimalPlaces)
+		axisMin = round(math.floor((minVal / step) + 1e-9) * step, decimalPlaces)
+		axisMax = round(axisMin + (step * numLabels), decimalPlaces)
+		if axisMax < maxVal - (step * 1e-9):
+			continue
+		labels = [_formatAxisLabel(axisMin + (step * index), decimalPlaces) for index in range(numLabels)]
+		# Right-justify all the values
+		maxLabelLen = max(len(label) for label in labels)
+		labels = [label.rjust(maxLabelLen) for label in labels]
+		# Change the decimal point (dot) into a tick as that takes up less space in Braille 
+		labels = [label.replace(".", "'") for label in labels]
+		labelCells = [translateLabelToCells(label, brailleTable=brailleTable) for label in labels]
+		layout = ValueAxisLayout(axisMin, axisMax, step, tuple(labels), tuple(labelCells))
+		if max(len(cells) for cells in labelCells) <= maxLabelCells:
+			return layout
+		if not fallback:
+			fallback = layout
+		if attempt >= 2 * len(niceStepMultipliers):
+			# Larger steps will not make the labels any narrower
+			return fallback
+
+
 def generateAZColumnLabel(colNum: int):
 	charList = []
 	while True:
@@ -154,6 +604,24 @@ def generateAZColumnLabels(start: int, end: int) -> List[str]:
 	return [generateAZColumnLabel(x) for x in range(start, end)]
 
 
+@lru_cache(maxsize=8)
+def getStackedDatasets(datasets: Tuple[Dataset, ...]) -> Tuple[Dataset, ...]:
+	"""
+	The running totals of the given datasets, value by value, for stacking them on top of each other.
+	Blanks count as 0.
+	The totals are cached, so they are only calculated once however many times or sizes the chart is drawn at.
+	"""
+	numValues = len(datasets[0])
+	totals = [0.0] * numValues
+	stacked = []
+	for dataset in datasets:
+		totals = [
+			total + val if val == val else total
+			for total, val in zip(totals, dataset.values[:numValues])
+		] + totals[len(dataset):]
+		stacked.append(Dataset(totals))
+	return tuple(stacked)
+
 class DotBuffer:
 
 	width: int
@@ -196,7 +664,7 @@ class Chart:
 
 	@cached_property
 	def numTotalCols(self):
-		return len(list(self.datasets.values())[0])
+		return len(next(iter(self.datasets.values())))
 
 	@cached_property
 	def colEndOffset(self):
@@ -237,26 +705,37 @@ class Chart:
 	def valStep(self):
 		return self.plotHeight // self.rowHeight
 
+	labelBrailleTable = 'en-us-comp8.ctb'
+
+	@cached_property
+	def maxLabelCells(self):
+		# Keep the vertical ruler to about a quarter of the width
+		return max(3, (self.destWidth // brailleCellWidth) // 4)
+
+	@cached_property
+	def valueAxis(self) -> ValueAxisLayout:
+		return layoutValueAxis(self.minVal, self.maxVal, self.valStep, self.maxLabelCells, self.labelBrailleTable)
+
 	@cached_property
 	def normalizedMinVal(self):
-		return self.minVal
+		return self.valueAxis.minVal
 
 	@cached_property
 	def normalizedMaxVal(self):
-		# if not already, increases maxVal until the range is a multiple of valStep
-		valRange = self.maxVal - self.minVal
-		valStep = self.valStep
-		valRangeModStep = valRange % valStep
-		if valRangeModStep > 0:
-			valRange += (valStep - (valRangeModStep))
-			maxVal = self.minVal + valRange
-			return maxVal
-		return self.maxVal
-
-	def __init__(self, destWidth: int, destHeight: int, minVal: float, maxVal: float, datasets: Dict[str,List[float]], showVerticalRuler=True, showHorizontalRuler=True):
+		return self.valueAxis.maxVal
+
+	def __init__(self, destWidth: int, destHeight: int, minVal: float, maxVal: float, datasets: Dict[str, Union[Dataset, List[float]]], showVerticalRuler=True, showHorizontalRuler=True, seriesNames: Optional[Sequence[str]] = None):
+		"""
+		@param seriesNames: the names of all the series that could be shown, in order, of which datasets are the ones being shown.
+			Defaults to the names of the datasets.
+		"""
 		self.showVerticalRuler = showVerticalRuler
 		self.showHorizontalRuler = showHorizontalRuler
-		self.datasets = datasets
+		self.datasets = {
+			name: values if isinstance(values, Dataset) else Dataset(values)
+			for name, values in datasets.items()
+		}
+		self.seriesNames = tuple(self.datasets if seriesNames is None else seriesNames)
 		self.destWidth = destWidth
 		self.destHeight = destHeight
 		self.minVal = minVal
@@ -265,16 +744,19 @@ class Chart:
 	@cached_property
 	def verticalRuler(self):
 		ruler = DotBuffer()
-		ruler.width, ruler.height = drawVerticalRuler(ruler.setDot, 0, 0, self.normalizedMinVal, self.normalizedMaxVal, self.valStep, self.rowHeight)
+		ruler.width, ruler.height = drawVerticalRulerCells(ruler.setDot, 0, 0, self.valueAxis.labelCells, self.rowHeight)
 		return ruler
 
 	def draw(self, func_drawDot):
 		if self.showVerticalRuler:
 			self.verticalRuler.draw(func_drawDot)
 		if self.showHorizontalRuler:
-			drawHorizontalRuler(func_drawDot, self.plotX, (self.plotY + self.plotHeight) - 1, self.colStartOffset, self.colEndOffset, self.colWidth)
+			self.drawHorizontalRuler(func_drawDot)
 		self.drawPlot(func_drawDot)
 
+	def drawHorizontalRuler(self, func_drawDot):
+		drawHorizontalRuler(func_drawDot, self.plotX, (self.plotY + self.plotHeight) - 1, self.colStartOffset, self.colEndOffset, self.colWidth)
+
 
 class ScrollableChart(Chart):
 
@@ -295,22 +777,31 @@ class ScrollableChart(Chart):
 	def colEndOffset(self):
 		return min(self.colStartOffset + self.maxVisibleCols, self.numTotalCols)
 
+	def getScrolledColStartOffset(self, colStartOffset: int, back=False) -> Optional[int]:
+		"""
+		Calculates where a page forward or back from the given column would start, without scrolling this chart.
+		@returns: the new starting column, or None if there is no more data in that direction.
+		"""
+		if back:
+			if colStartOffset == 0:
+				return None
+			return max(0, colStartOffset - self.maxVisibleCols)
+		if colStartOffset + self.maxVisibleCols >= self.numTotalCols:
+			return None
+		return min(colStartOffset + self.maxVisibleCols, self.numTotalCols - self.maxVisibleCols)
+
 	def scrollForward(self):
-		if self.colEndOffset == self.numTotalCols:
+		colStartOffset = self.getScrolledColStartOffset(self.colStartOffset)
+		if colStartOffset is None:
 			return False
-		for x in range(self.maxVisibleCols):
-			self.colStartOffset += 1
-			if self.colEndOffset == self.numTotalCols:
-				break
+		self.colStartOffset = colStartOffset
 		return True
 
 	def scrollBack(self):
-		if self.colStartOffset == 0:
+		colStartOffset = self.getScrolledColStartOffset(self.colStartOffset, back=True)
+		if colStartOffset is None:
 			return False
-		for x in range(self.maxVisibleCols):
-			self.colStartOffset -= 1
-			if self.colStartOffset == 0:
-				break
+		self.colStartOffset = colStartOffset
 		return True
 
 
@@ -338,11 +829,315 @@ class BarChart(ScrollableChart):
 	def drawPlot(self, func_drawDot):
 		for index, dataset in enumerate(self.datasets.values()):
 			xOffset = 2 + (self.barWidth + self.barGap) * index
-			drawDiscreteDataset(func_drawDot, self.plotX + xOffset, self.plotY, self.plotWidth, self.plotHeight, self.normalizedMinVal, self.normalizedMaxVal, dataset[self.colStartOffset:self.colEndOffset], self.barWidth, self.colWidth)
+			drawDiscreteDataset(func_drawDot, self.plotX + xOffset, self.plotY, self.plotWidth, self.plotHeight, self.normalizedMinVal, self.normalizedMaxVal, dataset.view(self.colStartOffset, self.colEndOffset), self.barWidth, self.colWidth)
 
 
 class LineChart(Chart):
 
+	# The range of values shown, which can be narrowed to zoom in.
+	# None shows up to the last value.
+	viewEnd: Optional[int] = None
+
+	@property
+	def colEndOffset(self):
+		if self.viewEnd is None:
+			return self.numTotalCols
+		return self.viewEnd
+
+	@property
+	def numVisibleCols(self):
+		return self.colEndOffset - self.colStartOffset
+
+	@property
+	def colWidth(self):
+		minColWidth = self.minColWidth
+		totalPlotWidth = minColWidth * self.numVisibleCols
+		if totalPlotWidth < self.plotWidth:
+			colWidth = self.plotWidth // self.numVisibleCols
+		else:
+			colWidth = minColWidth
+		return colWidth
+
 	def drawPlot(self, func_drawDot):
 		for index, dataset in enumerate(self.datasets.values()):
-			drawContinuousDataset(func_drawDot, self.plotX, self.plotY, self.plotWidth, self.plotHeight, self.normalizedMinVal, self.normalizedMaxVal, dataset)
+			values = dataset.resample(self.colStartOffset, self.colEndOffset, self.plotWidth)
+			drawContinuousDataset(func_drawDot, self.plotX, self.plotY, self.plotWidth, self.plotHeight, self.normalizedMinVal, self.normalizedMaxVal, values)
+
+
+class StackedChart(Chart):
+	"""
+	A chart showing each dataset stacked on top of the ones before it, so the top shows the total.
+	"""
+
+	def __init__(self, destWidth: int, destHeight: int, minVal: float, maxVal: float, datasets: Dict[str, Union[Dataset, List[float]]], **kwargs):
+		super().__init__(destWidth, destHeight, minVal, maxVal, datasets, **kwargs)
+		# The scale must reach the highest total, not just the highest single value
+		present = [dataset for dataset in self.stackedDatasets if dataset.count]
+		if present:
+			self.minVal = min(minVal, min(dataset.minVal for dataset in present))
+			self.maxVal = max(maxVal, max(dataset.maxVal for dataset in present))
+
+	@cached_property
+	def stackedDatasets(self) -> Tuple[Dataset, ...]:
+		return getStackedDatasets(tuple(self.datasets.values()))
+
+
+class AreaChart(StackedChart, LineChart):
+	"""
+	A line chart with the area below each line filled, stacking the datasets.
+	"""
+
+	def drawPlot(self, func_drawDot):
+		lowerValues = None
+		for dataset in self.stackedDatasets:
+			values = dataset.resample(self.colStartOffset, self.colEndOffset, self.plotWidth)
+			drawStackedDataset(func_drawDot, self.plotX, self.plotY, self.plotWidth, self.plotHeight, self.normalizedMinVal, self.normalizedMaxVal, list(values), lowerValues)
+			lowerValues = values
+
+
+class StackedBarChart(StackedChart, ScrollableChart):
+	"""
+	A bar chart with a single bar per column, made of a segment for each dataset.
+	Each segment stops a dot below the one above it, so that the segments can be felt separately.
+	"""
+
+	barWidth = 3
+	colGap = 1
+
+	@cached_property
+	def minColWidth(self):
+		return max(super().minColWidth, self.barWidth + self.colGap)
+
+	def drawPlot(self, func_drawDot):
+		minY = self.normalizedMinVal
+		yScale = self.plotHeight / (self.normalizedMaxVal - minY)
+		base = self.plotY + self.plotHeight
+		views = [dataset.view(self.colStartOffset, self.colEndOffset) for dataset in self.stackedDatasets]
+		for index in range(self.colEndOffset - self.colStartOffset):
+			x = self.plotX + 2 + (index * self.colWidth)
+			bottom = base
+			for view in views:
+				top = self.plotY + int(self.plotHeight - ((view[index] - minY) * yScale))
+				if top >= bottom:
+					# Nothing to add to the stack
+					continue
+				for barX in range(x, x + self.barWidth):
+					drawVerticalSpan(func_drawDot, barX, top, bottom)
+				# The next segment stops a dot above this one
+				bottom = top - 1
+
+
+class HistogramChart(Chart):
+	"""
+	The distribution of the values of the first dataset, as a bar for each bin of values, all on one page.
+	"""
+
+	binningMode = BinningMode.AUTO
+
+	def __init__(self, destWidth: int, destHeight: int, minVal: float, maxVal: float, datasets: Dict[str, Union[Dataset, List[float]]], **kwargs):
+		super().__init__(destWidth, destHeight, minVal, maxVal, datasets, **kwargs)
+		self.histogram = next(iter(self.datasets.values())).getHistogram(self.maxVisibleCols, self.binningMode)
+		# The vertical axis shows how many values are in each bin
+		self.minVal = 0
+		self.maxVal = max(1, max(self.histogram.heights))
+
+	@cached_property
+	def maxVisibleCols(self):
+		# The vertical ruler's width depends on the counts, which depend on the number of bins,
+		# so allow for the widest ruler.
+		rulerWidth = (self.maxLabelCells * brailleCellWidth) + 2 if self.showVerticalRuler else 0
+		return max(1, (self.destWidth - rulerWidth) // self.minColWidth)
+
+	@cached_property
+	def numTotalCols(self):
+		return len(self.histogram.counts)
+
+	def drawHorizontalRuler(self, func_drawDot):
+		# Bins are labelled by the values at their edges, rather than by letter
+		drawBinEdgeRuler(func_drawDot, self.plotX, (self.plotY + self.plotHeight) - 1, self.histogram.edges, self.colWidth, self.destWidth, self.maxLabelCells, self.labelBrailleTable)
+
+	def drawPlot(self, func_drawDot):
+		barWidth = max(1, self.colWidth - 1)
+		drawDiscreteDataset(func_drawDot, self.plotX + 1, self.plotY, self.plotWidth, self.plotHeight, self.normalizedMinVal, self.normalizedMaxVal, self.histogram.heights, barWidth, self.colWidth)
+
+
+class DetailedHistogramChart(HistogramChart):
+	""" A histogram with as many bins of equal width as fit."""
+
+	binningMode = BinningMode.FIXED_WIDTH
+
+
+class QuantileHistogramChart(HistogramChart):
+	""" A histogram whose bins hold roughly equal numbers of values, so more detail is shown where values are dense."""
+
+	binningMode = BinningMode.QUANTILE
+
+
+# Rendered small multiples tiles, keyed by everything that changes how a tile is drawn,
+# shared by all charts so that a series shown again at the same size and scale is not drawn again.
+maxCachedSparklineTiles = 64
+_sparklineTiles: "OrderedDict[tuple, Tuple[Tuple[int, int], ...]]" = OrderedDict()
+_sparklineTilesLock = threading.Lock()
+_sparklineExecutor: Optional[ThreadPoolExecutor] = None
+
+
+class SparklineTile(NamedTuple):
+	""" What to draw in one tile of small multiples."""
+	dataset: Dataset
+	width: int
+	height: int
+	minY: float
+	maxY: float
+	labelCells: Tuple[int, ...]
+
+	@property
+	def key(self) -> tuple:
+		return (self.dataset.digest, self.width, self.height, self.minY, self.maxY, self.labelCells)
+
+
+def renderSparklineTile(tile: SparklineTile) -> Tuple[Tuple[int, int], ...]:
+	"""
+	Draws a series as a line across a tile, after its label.
+	Anything outside the range from minY to maxY is cut off, so that it does not spill into the tiles around it.
+	@returns: the raised dots, relative to the top left of the tile.
+	"""
+	buffer = DotBuffer()
+	plotX = 0
+	if tile.labelCells:
+		drawBrailleCells(buffer.setDot, 0, 0, tile.labelCells)
+		plotX = (len(tile.labelCells) * brailleCellWidth) + 1
+	plotWidth = tile.width - plotX
+	if tile.dataset.count and plotWidth > 0:
+		minY, maxY = tile.minY, tile.maxY
+		if maxY <= minY:
+			# A flat line through the middle
+			minY -= 1
+			maxY += 1
+		values = tile.dataset.resample(0, len(tile.dataset), plotWidth)
+		drawContinuousDataset(buffer.setDot, plotX, 0, plotWidth, tile.height, minY, maxY, values)
+	return tuple((x, y) for x, y in buffer.dots if 0 <= y < tile.height)
+
+
+def getSparklineTiles(tiles: Sequence[SparklineTile]) -> List[Tuple[Tuple[int, int], ...]]:
+	"""
+	The dots of each tile, from the cache where possible.
+	Tiles not in the cache are rendered in parallel, each on its own.
+	"""
+	global _sparklineExecutor
+	with _sparklineTilesLock:
+		results = [_sparklineTiles.get(tile.key) for tile in tiles]
+		for result, tile in zip(results, tiles):
+			if result is not None:
+				_sparklineTiles.move_to_end(tile.key)
+		missing = [index for index, result in enumerate(results) if result is None]
+		if len(missing) > 1 and not _sparklineExecutor:
+			_sparklineExecutor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="DotPad tiles")
+		executor = _sparklineExecutor
+	rendered = None
+	if len(missing) > 1:
+		try:
+			rendered = list(executor.map(renderSparklineTile, [tiles[index] for index in missing]))
+		except RuntimeError:
+			# Shut down by shutdownSparklineExecutor meanwhile
+			pass
+	if rendered is None:
+		rendered = [renderSparklineTile(tiles[index]) for index in missing]
+	with _sparklineTilesLock:
+		for index, dots in zip(missing, rendered):
+			results[index] = dots
+			_sparklineTiles[tiles[index].key] = dots
+		while len(_sparklineTiles) > maxCachedSparklineTiles:
+			_sparklineTiles.popitem(last=False)
+	return results
+
+
+def shutdownSparklineExecutor():
+	""" Stops the threads that render sparkline tiles, E.g. when the add-on is terminated. They are started again if needed."""
+	global _sparklineExecutor
+	with _sparklineTilesLock:
+		executor = _sparklineExecutor
+		_sparklineExecutor = None
+	if executor:
+		executor.shutdown(wait=False)
+
+
+class SmallMultiplesChart(Chart):
+	"""
+	A line for each series in a tile of its own, so that many series can be followed without their lines crossing.
+	Each series keeps its tile whichever series are shown, and is labelled with its number.
+	Tiles are drawn independently and kept, so that showing or hiding a series only draws that series' tile.
+	There are no rulers, as the tiles are too small for them.
+	"""
+
+	# Whether every tile uses the chart's scale, rather than the range of its own series
+	sharedScale = True
+	tileGap = 2
+	# The tiles cover the whole chart
+	plotX = 0
+
+	@cached_property
+	def plotHeight(self):
+		return self.destHeight
+
+	# Tiles are made as large as possible, but no more than this many times wider than they are high
+	maxTileAspect = 3
+
+	@cached_property
+	def tileGrid(self) -> Tuple[int, int]:
+		""" The number of columns and rows of tiles."""
+		count = max(1, len(self.seriesNames))
+		best = None
+		for cols in range(1, count + 1):
+			rows = math.ceil(count / cols)
+			tileWidth, tileHeight = self._getTileSize(cols, rows)
+			score = min(tileWidth, tileHeight * self.maxTileAspect)
+			if best is None or score > best[0]:
+				best = (score, cols, rows)
+		return best[1], best[2]
+
+	def _getTileSize(self, cols: int, rows: int) -> Tuple[int, int]:
+		return (
+			(self.destWidth - (self.tileGap * (cols - 1))) // cols,
+			(self.destHeight - (self.tileGap * (rows - 1))) // rows,
+		)
+
+	@cached_property
+	def tileSize(self) -> Tuple[int, int]:
+		return self._getTileSize(*self.tileGrid)
+
+	def getTilePosition(self, index: int) -> Tuple[int, int]:
+		""" The top left corner of the tile of the series with the given index in seriesNames."""
+		cols, rows = self.tileGrid
+		tileWidth, tileHeight = self.tileSize
+		return (index % cols) * (tileWidth + self.tileGap), (index // cols) * (tileHeight + self.tileGap)
+
+	@cached_property
+	def tiles(self) -> List[Tuple[Tuple[int, int], SparklineTile]]:
+		tileWidth, tileHeight = self.tileSize
+		tiles = []
+		for index, name in enumerate(self.seriesNames):
+			dataset = self.datasets.get(name)
+			if dataset is None:
+				continue
+			labelCells = translateLabelToCells(str(index + 1), self.labelBrailleTable)
+			if tileHeight < self.rowHeight or tileWidth < (len(labelCells) + 2) * brailleCellWidth:
+				# Too small for a label
+				labelCells = ()
+			if self.sharedScale:
+				minY, maxY = self.minVal, self.maxVal
+			else:
+				minY, maxY = dataset.minVal, dataset.maxVal
+			tiles.append((self.getTilePosition(index), SparklineTile(dataset, tileWidth, tileHeight, minY, maxY, labelCells)))
+		return tiles
+
+	def draw(self, func_drawDot):
+		allDots = getSparklineTiles([tile for position, tile in self.tiles])
+		for ((tileX, tileY), tile), dots in zip(self.tiles, allDots):
+			for x, y in dots:
+				func_drawDot(tileX + x, tileY + y)
+
+
+class SmallMultiplesOwnScaleChart(SmallMultiplesChart):
+	""" Small multiples with each tile scaled to the range of its own series, showing the shape of series of very different sizes."""
+
+	sharedScale = False
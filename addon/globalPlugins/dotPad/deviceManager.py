@@ -0,0 +1,217 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+
+from concurrent.futures import CancelledError, Future
+import threading
+from typing import Optional, Callable, Dict, List, Sequence, Set, Tuple
+from logHandler import log
+from .connection import DotPadConnection, ConnectionState
+from .pyDotPad import DotPadError, DotPadErrorCode
+from .profiling import profiler
+from .transitions import PinLatencyModel, planTransition
+
+
+# A function that produces the packed cells of a frame for a graphics area of the given size in cells.
+GetFrameFunc = Callable[[Tuple[int, int]], bytes]
+# A function that gives the rows of cells to show first in the frame for a graphics area of the given size, if any.
+GetPriorityRowsFunc = Callable[[Tuple[int, int]], Optional[Sequence[int]]]
+
+
+class _OutputWorker:
+	"""
+	Outputs frames to one device on its own thread, so that a slow device cannot hold up any other.
+	Only the most recent frame is kept: a frame that has not yet been sent when a newer one arrives is cancelled.
+	The frame the device is showing is remembered, so that only the pins that differ need to move,
+	and a large change can show its priority rows first (see L{planTransition}).
+	"""
+
+	latencyModel = PinLatencyModel()
+
+	def __init__(self, connection: DotPadConnection):
+		self.connection = connection
+		self._pending: Optional[Tuple[bytes, bool, Optional[Sequence[int]], Future]] = None
+		# The frame the device is showing, None if not known
+		self._shownFrame: Optional[bytes] = None
+		self._condition = threading.Condition()
+		self._stopped = False
+		self._thread = threading.Thread(target=self._run, name=f"DotPad output {connection.port}", daemon=True)
+		self._thread.start()
+
+	def submit(self, data: bytes, fullRefresh: bool, priorityRows: Optional[Sequence[int]] = None) -> Future:
+		future = Future()
+		with self._condition:
+			if self._pending:
+				self._pending[-1].cancel()
+			self._pending = (data, fullRefresh, priorityRows, future)
+			self._condition.notify()
+		return future
+
+	def stop(self):
+		with self._condition:
+			self._stopped = True
+			if self._pending:
+				self._pending[-1].cancel()
+				self._pending = None
+			self._condition.notify()
+		if self._thread is not threading.current_thread():
+			self._thread.join()
+
+	def _run(self):
+		while True:
+			with self._condition:
+				while not self._pending and not self._stopped:
+					self._condition.wait()
+				if self._stopped:
+					return
+				data, fullRefresh, priorityRows, future = self._pending
+				self._pending = None
+			if not future.set_running_or_notify_cancel():
+				continue
+			try:
+				with profiler.profile("output"):
+					result = self._output(data, fullRefresh, priorityRows)
+				future.set_result(result)
+			except Exception as e:
+				future.set_exception(e)
+
+	def _output(self, data: bytes, fullRefresh: bool, priorityRows: Optional[Sequence[int]]) -> bool:
+		"""
+		Sends the frames that take the device from what it is showing to data.
+		If a newer frame arrives after the priority rows have been sent, the rest is left for the newer frame,
+		and CancelledError is raised.
+		"""
+		hCellCount = self.connection.geometry[0]
+		steps = planTransition(self._shownFrame, data, hCellCount, priorityRows, fullRefresh, self.latencyModel)
+		if not steps:
+			return True
+		result = True
+		for index, step in enumerate(steps):
+			if index:
+				with self._condition:
+					if self._pending:
+						raise CancelledError()
+			# Until the device confirms, it is not known which pins have moved
+			self._shownFrame = None
+			try:
+				result = self.connection.outputFrame(step.frame, step.fullRefresh)
+			except DotPadError as e:
+				if e.code != DotPadErrorCode.DISPLAY_DATA_UNCHANGED:
+					raise
+				result = True
+			if result:
+				self._shownFrame = step.frame
+		log.debug(f"Output to {self.connection.port} in {len(steps)} updates, moving {sum(step.changedPins for step in steps)} pins")
+		return result
+
+
+class DeviceManager:
+	"""
+	Manages connections to one or more DotPads, E.g. a student's pad plus a mirror pad for the instructor.
+	The first device added is the primary device.
+	"""
+
+	def __init__(
+			self,
+			keyCallback: Optional[Callable[[int], None]] = None,
+			stateChangeCallback: Optional[Callable[[DotPadConnection], None]] = None
+	):
+		self.keyCallback = keyCallback
+		self.stateChangeCallback = stateChangeCallback
+		self.connections: Dict[str, DotPadConnection] = {}
+		self._workers: Dict[str, _OutputWorker] = {}
+		# The SDK slots of devices that are still connecting
+		self._connectingSlots: Set[int] = set()
+		self._lock = threading.Lock()
+
+	@property
+	def primary(self) -> Optional[DotPadConnection]:
+		for connection in self.connections.values():
+			return connection
+		return None
+
+	@property
+	def geometries(self) -> List[Tuple[int, int]]:
+		""" The distinct geometries of the connected devices."""
+		with self._lock:
+			geometries = [
+				connection.geometry for connection in self.connections.values()
+				if connection.state is ConnectionState.CONNECTED
+			]
+		return list(dict.fromkeys(geometries))
+
+	def _getFreeSdkSlot(self) -> int:
+		usedSlots = {connection.sdkSlot for connection in self.connections.values()} | self._connectingSlots
+		slot = 0
+		while slot in usedSlots:
+			slot += 1
+		return slot
+
+	def addDevice(self, port: str, wait: bool = False) -> DotPadConnection:
+		"""
+		Connects to the DotPad on the given port, replacing any existing connection on that port.
+		Raises DotPadError or RuntimeError on failure.
+		@param wait: when true, blocks the caller for a sufficient amount of time to allow the device to initialize.
+		"""
+		self.removeDevice(port)
+		with self._lock:
+			sdkSlot = self._getFreeSdkSlot()
+			self._connectingSlots.add(sdkSlot)
+		try:
+			# Connecting can take seconds, so other devices are not held up meanwhile
+			connection = DotPadConnection(port, self.keyCallback, self.stateChangeCallback, sdkSlot=sdkSlot)
+			connection.connect(wait=wait)
+			with self._lock:
+				self.connections[port] = connection
+				self._workers[port] = _OutputWorker(connection)
+		finally:
+			with self._lock:
+				self._connectingSlots.discard(sdkSlot)
+		return connection
+
+	def removeDevice(self, port: str):
+		with self._lock:
+			connection = self.connections.pop(port, None)
+			worker = self._workers.pop(port, None)
+		if worker:
+			worker.stop()
+		if connection:
+			connection.terminate()
+
+	def terminate(self):
+		for port in list(self.connections):
+			self.removeDevice(port)
+
+	def displayFrame(
+			self,
+			getFrame: GetFrameFunc,
+			fullRefresh: bool = False,
+			getPriorityRows: Optional[GetPriorityRowsFunc] = None
+	) -> Dict[str, Future]:
+		"""
+		Fetches a frame once for each distinct device geometry, and sends it to all connected devices in parallel.
+		All frames are fetched before any are sent, so if fetching fails no device is updated.
+		@param fullRefresh: whether to raise every pin again if a device is already showing the frame.
+		@param getPriorityRows: gives the rows of cells to show first if a frame changes a lot.
+		@returns: a future for each device, keyed by port, resolving to whether the device confirmed the display.
+		"""
+		with self._lock:
+			targets: List[DotPadConnection] = [
+				connection for connection in self.connections.values()
+				if connection.state is ConnectionState.CONNECTED
+			]
+			workers = dict(self._workers)
+		frames: Dict[Tuple[int, int], bytes] = {}
+		priorityRows: Dict[Tuple[int, int], Optional[Sequence[int]]] = {}
+		for connection in targets:
+			geometry = connection.geometry
+			if geometry not in frames:
+				frames[geometry] = getFrame(geometry)
+				priorityRows[geometry] = getPriorityRows(geometry) if getPriorityRows else None
+		futures: Dict[str, Future] = {}
+		for connection in targets:
+			geometry = connection.geometry
+			futures[connection.port] = workers[connection.port].submit(frames[geometry], fullRefresh, priorityRows[geometry])
+		log.debug(f"Rendered {len(frames)} geometries for {len(futures)} devices")
+		return futures
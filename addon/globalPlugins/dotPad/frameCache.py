@@ -0,0 +1,109 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+
+from collections import OrderedDict
+import hashlib
+import mmap
+import os
+import threading
+from typing import Optional
+from logHandler import log
+
+
+class FrameCache:
+	"""
+	Rendered frames (packed cells) stored on disk, one file per frame, so that frequently shown charts and screens
+	can be displayed again without laying out or thresholding anything, even after NVDA restarts.
+	Frames are identified by a hash of their source content, options and geometry.
+	The least recently used frames are removed once the cache grows beyond maxBytes.
+	"""
+
+	fileExtension = ".frame"
+
+	def __init__(self, directory: str, maxBytes: int = 4 * 1024 * 1024):
+		self.directory = directory
+		self.maxBytes = maxBytes
+		self._lock = threading.Lock()
+		# Sizes of the frames in the cache, from least to most recently used
+		self._index: "OrderedDict[str, int]" = OrderedDict()
+		self._totalBytes = 0
+		os.makedirs(directory, exist_ok=True)
+		entries = []
+		for fileName in os.listdir(directory):
+			if not fileName.endswith(self.fileExtension):
+				continue
+			try:
+				stat = os.stat(os.path.join(directory, fileName))
+			except OSError:
+				continue
+			entries.append((stat.st_mtime, fileName[:-len(self.fileExtension)], stat.st_size))
+		for mtime, key, size in sorted(entries):
+			self._index[key] = size
+			self._totalBytes += size
+
+	@staticmethod
+	def makeKey(*parts) -> str:
+		"""
+		Creates a key from the given parts, which may be bytes, or anything with a stable repr such as numbers, strings and tuples of them.
+		"""
+		digest = hashlib.sha1()
+		for part in parts:
+			if not isinstance(part, (bytes, bytearray, memoryview)):
+				part = repr(part).encode("utf-8")
+			digest.update(len(part).to_bytes(8, "little"))
+			digest.update(part)
+		return digest.hexdigest()
+
+	def _getPath(self, key: str) -> str:
+		return os.path.join(self.directory, key + self.fileExtension)
+
+	def get(self, key: str, expectedSize: Optional[int] = None) -> Optional[bytes]:
+		""" Fetches a frame, or None if it is not in the cache or is not of the expected size."""
+		with self._lock:
+			size = self._index.get(key)
+			if not size or (expectedSize is not None and size != expectedSize):
+				return None
+			path = self._getPath(key)
+			try:
+				with open(path, "rb") as f:
+					with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mappedFile:
+						data = mappedFile[:]
+				os.utime(path)
+			except (OSError, ValueError):
+				log.debugWarning(f"Could not read cached frame {key}", exc_info=True)
+				self._remove(key)
+				return None
+			self._index.move_to_end(key)
+			return data
+
+	def put(self, key: str, data: bytes):
+		with self._lock:
+			path = self._getPath(key)
+			tempPath = path + ".tmp"
+			try:
+				with open(tempPath, "wb") as f:
+					f.write(data)
+				os.replace(tempPath, path)
+			except OSError:
+				log.debugWarning(f"Could not write cached frame {key}", exc_info=True)
+				return
+			self._totalBytes -= self._index.pop(key, 0)
+			self._index[key] = len(data)
+			self._totalBytes += len(data)
+			while self._totalBytes > self.maxBytes and len(self._index) > 1:
+				oldestKey = next(iter(self._index))
+				self._remove(oldestKey)
+
+	def _remove(self, key: str):
+		self._totalBytes -= self._index.pop(key, 0)
+		try:
+			os.remove(self._getPath(key))
+		except OSError:
+			pass
+
+	def clear(self):
+		with self._lock:
+			for key in list(self._index):
+				self._remove(key)
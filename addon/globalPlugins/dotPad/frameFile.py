@@ -0,0 +1,155 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+
+import os
+import struct
+from typing import Iterable, Iterator, List, Tuple
+from .canvas import DotCanvas
+from .imageUtils import StretchMode, scaleBrightnessImage, drawMonochromeImage
+from .pngImage import readPng
+
+# DotPad frame files hold pre-rendered tactile graphics, so that they can be shown without rendering them again.
+# A file starts with a header:
+# 	magic: 4 bytes, b"DPFR"
+# 	version: 1 byte, currently 1
+# 	reserved: 1 byte, 0
+# 	hCellCount, vCellCount: 2 bytes each, the size of the graphics area the frames were rendered for
+# 	pageCount: 2 bytes
+# All numbers are unsigned little-endian.
+# The header is followed by the pages, each hCellCount * vCellCount packed cells as in the DotPad's data buffer.
+
+fileExtension = ".dpf"
+_magic = b"DPFR"
+_version = 1
+_header = struct.Struct("<4sBBHHH")
+
+
+class FrameFileError(ValueError):
+	""" Raised when a frame file is invalid or does not match the frames written to it."""
+
+
+class FrameFile:
+	"""
+	An open frame file, whose pages are read from disk one at a time as they are needed.
+	"""
+
+	def __init__(self, path: str):
+		self.path = path
+		with open(path, "rb") as f:
+			header = f.read(_header.size)
+			fileSize = os.fstat(f.fileno()).st_size
+		if len(header) < _header.size:
+			raise FrameFileError(f"{path} is too short to be a frame file")
+		magic, version, reserved, self.hCellCount, self.vCellCount, self.pageCount = _header.unpack(header)
+		if magic != _magic:
+			raise FrameFileError(f"{path} is not a frame file")
+		if version > _version:
+			raise FrameFileError(f"{path} was written by a newer version of the DotPad add-on")
+		if fileSize < _header.size + self.pageSize * self.pageCount:
+			raise FrameFileError(f"{path} is truncated")
+
+	@property
+	def geometry(self) -> Tuple[int, int]:
+		return (self.hCellCount, self.vCellCount)
+
+	@property
+	def pageSize(self) -> int:
+		return self.hCellCount * self.vCellCount
+
+	def readPage(self, index: int) -> bytes:
+		if not 0 <= index < self.pageCount:
+			raise IndexError(f"Page {index} out of range")
+		with open(self.path, "rb") as f:
+			f.seek(_header.size + index * self.pageSize)
+			return f.read(self.pageSize)
+
+	def __len__(self):
+		return self.pageCount
+
+	def __iter__(self) -> Iterator[bytes]:
+		with open(self.path, "rb") as f:
+			f.seek(_header.size)
+			for index in range(self.pageCount):
+				yield f.read(self.pageSize)
+
+
+def writeFrameFile(path: str, geometry: Tuple[int, int], pages: Iterable[bytes]) -> int:
+	"""
+	Writes frames (E.g. from DotPad.getDataBuffer or Scene.getFrame) to a frame file,
+	replacing the file only once all the pages have been written.
+	@returns: the number of pages written.
+	"""
+	hCellCount, vCellCount = geometry
+	pageSize = hCellCount * vCellCount
+	tempPath = path + ".tmp"
+	pageCount = 0
+	try:
+		with open(tempPath, "wb") as f:
+			f.write(_header.pack(_magic, _version, 0, hCellCount, vCellCount, 0))
+			for page in pages:
+				if len(page) != pageSize:
+					raise FrameFileError(f"Page {pageCount} has {len(page)} cells, expected {pageSize}")
+				f.write(page)
+				pageCount += 1
+			if pageCount > 0xffff:
+				raise FrameFileError(f"Too many pages: {pageCount}")
+			f.seek(0)
+			f.write(_header.pack(_magic, _version, 0, hCellCount, vCellCount, pageCount))
+		os.replace(tempPath, path)
+	except BaseException:
+		try:
+			os.remove(tempPath)
+		except OSError:
+			pass
+		raise
+	return pageCount
+
+
+def convertPngToFrame(path: str, geometry: Tuple[int, int], isWhiteOnBlack: bool = False) -> bytes:
+	"""
+	Renders a PNG image for a graphics area of the given size in cells,
+	in the same way as a part of the screen is rendered.
+	"""
+	image = readPng(path)
+	canvas = DotCanvas(*geometry)
+	stretchMode = StretchMode.WHITEONBLACK if isWhiteOnBlack else StretchMode.BLACKONWHITE
+	rows, bounds = scaleBrightnessImage(
+		image.rows, image.width, image.height, canvas.hPixelCount, canvas.vPixelCount, stretchMode=stretchMode
+	)
+	drawMonochromeImage(rows, bounds, canvas.setDot, isWhiteOnBlack=isWhiteOnBlack)
+	return canvas.getBytes()
+
+
+def convertPngDirectory(
+		sourceDir: str,
+		destDir: str,
+		geometry: Tuple[int, int],
+		isWhiteOnBlack: bool = False,
+		combine: bool = False
+) -> List[str]:
+	"""
+	Converts every PNG image in a directory to frames, E.g. to prepare the images for a lesson in advance.
+	@param combine: when true, writes a single frame file with a page per image, in file name order,
+		named after the source directory.
+		Otherwise, writes a frame file next to each image's name in destDir.
+	@returns: the paths of the files written.
+	"""
+	pngPaths = [
+		os.path.join(sourceDir, fileName)
+		for fileName in sorted(os.listdir(sourceDir), key=str.lower)
+		if fileName.lower().endswith(".png")
+	]
+	os.makedirs(destDir, exist_ok=True)
+	if combine:
+		name = os.path.basename(os.path.normpath(sourceDir)) or "frames"
+		destPath = os.path.join(destDir, name + fileExtension)
+		writeFrameFile(destPath, geometry, (convertPngToFrame(path, geometry, isWhiteOnBlack) for path in pngPaths))
+		return [destPath]
+	written = []
+	for path in pngPaths:
+		destPath = os.path.join(destDir, os.path.splitext(os.path.basename(path))[0] + fileExtension)
+		writeFrameFile(destPath, geometry, [convertPngToFrame(path, geometry, isWhiteOnBlack)])
+		written.append(destPath)
+	return written
@@ -0,0 +1,196 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+
+from array import array
+import hashlib
+import math
+from typing import Any, List, Sequence, Tuple
+from .brailleUtils import brailleCellWidth, drawBrailleCells, translateLabelToCells
+from .dataUtils import cached_property, generateAZColumnLabel
+
+# The thresholds of a 4 by 4 Bayer matrix, as fractions, for ordered dithering.
+# Any level of grey becomes an even pattern of raised dots, so blocks of similar values feel alike.
+_bayerMatrix = (
+	(0, 8, 2, 10),
+	(12, 4, 14, 6),
+	(3, 11, 1, 9),
+	(15, 7, 13, 5),
+)
+bayerThresholds = tuple(
+	tuple((level + 0.5) / 16 for level in row)
+	for row in _bayerMatrix
+)
+
+
+class HeatmapData:
+	"""
+	A grid of values, such as a range of spreadsheet cells, stored as rows of doubles.
+	Anything that is not a number (E.g. text or a blank cell) is stored as NaN, and is shown without any dots.
+	"""
+
+	def __init__(self, rows: Sequence[Sequence[Any]], firstRow: int = 1, firstCol: int = 1):
+		"""
+		@param rows: the values a row at a time, E.g. from Range.Value2, where every number is a float.
+		@param firstRow: the number of the first row, for labels.
+		@param firstCol: the number of the first column, for labels (1 being column a).
+		"""
+		nan = math.nan
+		self.rows = [
+			array('d', [val if val.__class__ is float or val.__class__ is int else nan for val in row])
+			for row in rows
+		]
+		self.height = len(self.rows)
+		self.width = max((len(row) for row in self.rows), default=0)
+		for row in self.rows:
+			if len(row) < self.width:
+				row.extend([nan] * (self.width - len(row)))
+		self.firstRow = firstRow
+		self.firstCol = firstCol
+		self.minVal = self.maxVal = nan
+		for row in self.rows:
+			present = [val for val in row if val == val]
+			if not present:
+				continue
+			rowMin = min(present)
+			rowMax = max(present)
+			if not self.minVal <= rowMin:
+				self.minVal = rowMin
+			if not self.maxVal >= rowMax:
+				self.maxVal = rowMax
+
+	@cached_property
+	def digest(self) -> str:
+		""" A hash of the values, identifying this data E.g. for caching rendered heatmaps."""
+		sha = hashlib.sha1(f"{self.width},{self.height},{self.firstRow},{self.firstCol}".encode())
+		for row in self.rows:
+			sha.update(row.tobytes())
+		return sha.hexdigest()
+
+	def downsample(self, maxWidth: int, maxHeight: int) -> List[List[float]]:
+		"""
+		Shrinks the grid to at most maxWidth by maxHeight by averaging blocks of values, ignoring anything that is not a number.
+		A grid that already fits is returned as it is.
+		Each block is summed a slice of a row at a time, so the cost is mostly in C however large the grid is.
+		"""
+		width = min(self.width, maxWidth)
+		height = min(self.height, maxHeight)
+		if width == self.width and height == self.height:
+			return [row.tolist() for row in self.rows]
+		colStarts = [(index * self.width) // width for index in range(width + 1)]
+		colSpans = list(zip(colStarts, colStarts[1:]))
+		blocks = []
+		for blockIndex in range(height):
+			start = (blockIndex * self.height) // height
+			end = ((blockIndex + 1) * self.height) // height
+			totals = [0.0] * width
+			counts = [0] * width
+			for row in self.rows[start:end]:
+				present = [val == val for val in row]
+				values = [val if isPresent else 0.0 for val, isPresent in zip(row, present)]
+				for index, (colStart, colEnd) in enumerate(colSpans):
+					totals[index] += sum(values[colStart:colEnd])
+					counts[index] += sum(present[colStart:colEnd])
+			blocks.append([total / count if count else math.nan for total, count in zip(totals, counts)])
+		return blocks
+
+
+def normalizeGrid(grid: List[List[float]]) -> List[List[float]]:
+	""" Scales the values to between 0 and 1, leaving NaN as is. A grid of a single value becomes all 0.5."""
+	present = [val for row in grid for val in row if val == val]
+	if not present:
+		return grid
+	minVal = min(present)
+	valRange = max(present) - minVal
+	if not valRange:
+		return [[0.5 if val == val else val for val in row] for row in grid]
+	scale = 1 / valRange
+	return [[(val - minVal) * scale for val in row] for row in grid]
+
+
+def drawDitheredGrid(func_drawDot, destX: int, destY: int, destWidth: int, destHeight: int, grid: List[List[float]]):
+	"""
+	Stretches a grid of values between 0 and 1 over the destination, raising dots by ordered dithering,
+	so that each value becomes an even density of raised dots.
+	Each row of dots is compared against the dithering thresholds in one pass.
+	"""
+	gridHeight = len(grid)
+	gridWidth = len(grid[0]) if grid else 0
+	if not gridWidth or not gridHeight:
+		return
+	colMap = [(x * gridWidth) // destWidth for x in range(destWidth)]
+	thresholdRows = [
+		[thresholds[x % 4] for x in range(destWidth)]
+		for thresholds in bayerThresholds
+	]
+	for y in range(destHeight):
+		gridRow = grid[(y * gridHeight) // destHeight]
+		values = [gridRow[col] for col in colMap]
+		# NaN is never greater than a threshold, so cells without a number stay lowered
+		for x, (val, threshold) in enumerate(zip(values, thresholdRows[y % 4])):
+			if val > threshold:
+				func_drawDot(destX + x, destY + y)
+
+
+class Heatmap:
+	"""
+	A heatmap laid out for a given size in dots, with the grid's first and last row numbers on the left
+	and its first and last column letters below.
+	"""
+
+	rowHeight = 4
+
+	def __init__(self, destWidth: int, destHeight: int, data: HeatmapData, labelBrailleTable: str = "en-us-comp8.ctb"):
+		self.destWidth = destWidth
+		self.destHeight = destHeight
+		self.data = data
+		self.labelBrailleTable = labelBrailleTable
+
+	@cached_property
+	def rowLabelCells(self) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+		firstRow = self.data.firstRow
+		lastRow = firstRow + self.data.height - 1
+		labels = [str(firstRow), str(lastRow)]
+		width = max(len(label) for label in labels)
+		return tuple(translateLabelToCells(label.rjust(width), self.labelBrailleTable) for label in labels)
+
+	@cached_property
+	def colLabelCells(self) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+		firstCol = self.data.firstCol - 1
+		lastCol = firstCol + self.data.width - 1
+		return tuple(
+			translateLabelToCells(generateAZColumnLabel(col), self.labelBrailleTable)
+			for col in (firstCol, lastCol)
+		)
+
+	@cached_property
+	def plotX(self) -> int:
+		return max(len(cells) for cells in self.rowLabelCells) * brailleCellWidth + 1
+
+	plotY = 0
+
+	@cached_property
+	def plotWidth(self) -> int:
+		return self.destWidth - self.plotX
+
+	@cached_property
+	def plotHeight(self) -> int:
+		# Leave room for the column labels, plus a row between them and the plot
+		return self.destHeight - self.rowHeight - 1
+
+	@cached_property
+	def grid(self) -> List[List[float]]:
+		return normalizeGrid(self.data.downsample(self.plotWidth, self.plotHeight))
+
+	def draw(self, func_drawDot):
+		firstRowCells, lastRowCells = self.rowLabelCells
+		drawBrailleCells(func_drawDot, 0, self.plotY, firstRowCells)
+		drawBrailleCells(func_drawDot, 0, self.plotY + self.plotHeight - self.rowHeight, lastRowCells)
+		firstColCells, lastColCells = self.colLabelCells
+		labelY = self.plotY + self.plotHeight + 1
+		drawBrailleCells(func_drawDot, self.plotX, labelY, firstColCells)
+		if self.data.width > 1:
+			lastColX = self.plotX + self.plotWidth - (len(lastColCells) * brailleCellWidth) + 1
+			drawBrailleCells(func_drawDot, max(lastColX, self.plotX + (len(firstColCells) + 1) * brailleCellWidth), labelY, lastColCells)
+		drawDitheredGrid(func_drawDot, self.plotX, self.plotY, self.plotWidth, self.plotHeight, self.grid)
@@ -5,11 +5,14 @@
 
 from enum import IntEnum
 import ctypes
-import winGDI
-
-
-user32 = ctypes.windll.user32
-gdi32 = ctypes.windll.gdi32
+try:
+	import winGDI
+	user32 = ctypes.windll.user32
+	gdi32 = ctypes.windll.gdi32
+except (ImportError, AttributeError):
+	# Not running in NVDA on Windows, E.g. in the offline renderer.
+	# Screen capture is unavailable, but images loaded from files can still be processed.
+	winGDI = user32 = gdi32 = None
 
 
 class StretchMode(IntEnum):
@@ -21,6 +24,8 @@ def captureImage(srcX: int, srcY: int, srcWidth: int, srcHeight: int, bufferWidt
 	"""
 	Captures an image from a part of the screen, resizing to fit the required size, while still maintaining the original aspect ratio.
 	"""
+	if not gdi32:
+		raise RuntimeError("Screen capture is only available in NVDA")
 	# Get a device context for the screen
 	screenDC = user32.GetDC(0)
 	# Create a memory device context and load a new bitmap for drawing on
@@ -91,3 +96,128 @@ def getMonochromePixelUsingLocalBrightnessThreshold(image, x, y, blur=4):
 	threshold = findMeanBrightnessThreshold(image, x, y, blur)
 	px = rgbPixelBrightness(image[y][x])
 	return px >= threshold
+
+
+def scaleBrightnessImage(rows, srcWidth: int, srcHeight: int, bufferWidth: int, bufferHeight: int, stretchMode: StretchMode=StretchMode.HALFTONE):
+	"""
+	Resizes a grey-scale image (rows of brightness values) to fit the required size, while still maintaining the original aspect ratio,
+	in the same way as captureImage does for the screen.
+	When shrinking, BLACKONWHITE keeps the darkest pixel of each block, WHITEONBLACK the brightest, and HALFTONE the average.
+	@returns: the resized rows, plus the bounds of the image within.
+	"""
+	ratio = max(srcWidth / bufferWidth, srcHeight / bufferHeight)
+	destWidth = max(1, int(srcWidth / ratio))
+	destHeight = max(1, int(srcHeight / ratio))
+	destX = int((bufferWidth - destWidth) / 2)
+	destY = int((bufferHeight - destHeight) / 2)
+	# Areas outside the image are black, as they are in a new bitmap.
+	buffer = [bytearray(bufferWidth) for y in range(bufferHeight)]
+	colStarts = [int(x * srcWidth / destWidth) for x in range(destWidth + 1)]
+	rowStarts = [int(y * srcHeight / destHeight) for y in range(destHeight + 1)]
+	for y in range(destHeight):
+		top = rowStarts[y]
+		bottom = max(top + 1, rowStarts[y + 1])
+		srcRows = rows[top:bottom]
+		destRow = buffer[destY + y]
+		for x in range(destWidth):
+			left = colStarts[x]
+			right = max(left + 1, colStarts[x + 1])
+			block = [value for srcRow in srcRows for value in srcRow[left:right]]
+			if stretchMode == StretchMode.BLACKONWHITE:
+				value = min(block)
+			elif stretchMode == StretchMode.WHITEONBLACK:
+				value = max(block)
+			else:
+				value = sum(block) // len(block)
+			destRow[destX + x] = value
+	return buffer, (destX, destY, destWidth, destHeight)
+
+
+def getIntegralImage(rows):
+	"""
+	Builds a summed-area table for a grey-scale image (rows of brightness values),
+	where sums[y][x] is the total brightness of the pixels above and to the left of (x, y).
+	The total of any rectangle can then be found from just its four corners.
+	"""
+	imageWidth = len(rows[0]) if rows else 0
+	sums = [[0] * (imageWidth + 1)]
+	for row in rows:
+		prevSums = sums[-1]
+		rowSums = [0]
+		total = 0
+		for j, value in enumerate(row):
+			total += value
+			rowSums.append(prevSums[j + 1] + total)
+		sums.append(rowSums)
+	return sums
+
+
+def getMonochromeRegionUsingIntegralImage(rows, sums, regionLeft, regionTop, regionWidth, regionHeight, blur=4):
+	"""
+	Converts part of a grey-scale image to monochrome, as getMonochromeImageUsingLocalBrightnessThreshold does,
+	using an integral image of the whole image from getIntegralImage,
+	so that the thresholds near the edges of the region take account of the pixels beyond them.
+	@returns: rows of booleans for the region, true for white.
+	"""
+	imageHeight = len(rows)
+	imageWidth = len(rows[0]) if rows else 0
+	# Pixels beyond the edges of the image count as black
+	count = (blur * 2 + 1) ** 2
+	monochrome = []
+	for y in range(regionTop, regionTop + regionHeight):
+		row = rows[y]
+		top = max(0, y - blur)
+		bottom = min(imageHeight, y + blur + 1)
+		topSums = sums[top]
+		bottomSums = sums[bottom]
+		monochromeRow = []
+		for x in range(regionLeft, regionLeft + regionWidth):
+			left = max(0, x - blur)
+			right = min(imageWidth, x + blur + 1)
+			total = bottomSums[right] - bottomSums[left] - topSums[right] + topSums[left]
+			monochromeRow.append(row[x] >= total / count)
+		monochrome.append(monochromeRow)
+	return monochrome
+
+
+def getMonochromeImageUsingLocalBrightnessThreshold(rows, blur=4):
+	"""
+	Converts a grey-scale image (rows of brightness values) to monochrome,
+	using the local mean brightness to calculate a suitable brightness threshold for each pixel,
+	as getMonochromePixelUsingLocalBrightnessThreshold does for a single pixel of an RGB image.
+	The means come from an integral image, so the cost does not grow with the blur.
+	@returns: rows of booleans, true for white.
+	"""
+	imageWidth = len(rows[0]) if rows else 0
+	return getMonochromeRegionUsingIntegralImage(rows, getIntegralImage(rows), 0, 0, imageWidth, len(rows), blur=blur)
+
+
+def imageToBrightnessRows(image: ctypes.Array):
+	"""
+	Converts an RGB image (E.g. from captureImage) to rows of grey-scale brightness values, as rgbPixelBrightness would.
+	"""
+	rows = []
+	for row in image:
+		raw = bytes(row)
+		rows.append(bytes(
+			int((0.3 * blue) + (0.59 * green) + (0.11 * red))
+			for blue, green, red in zip(raw[0::4], raw[1::4], raw[2::4])
+		))
+	return rows
+
+
+def drawMonochromeImage(rows, bounds, func_drawDot, isWhiteOnBlack=False, blur=3):
+	"""
+	Draws a dot for each pixel of a grey-scale image that should be raised,
+	I.e. the white pixels of a white on black image, or the black pixels of a black on white image.
+	@param bounds: the part of the image to draw, as (left, top, width, height).
+	"""
+	left, top, width, height = bounds
+	monochrome = getMonochromeImageUsingLocalBrightnessThreshold(rows, blur=blur)
+	for y in range(top, top + height):
+		monochromeRow = monochrome[y]
+		for x in range(left, left + width):
+			isWhite = monochromeRow[x]
+			isRaised = isWhite if isWhiteOnBlack else not isWhite
+			if isRaised:
+				func_drawDot(x, y)
@@ -0,0 +1,56 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+
+import threading
+import time
+from typing import Callable, List, Optional
+
+
+class KeyPressCoalescer:
+	"""
+	Collects DotPad key presses, which may arrive on any thread, and delivers them in batches.
+	A batch is delivered once no key has been pressed for debounceInterval seconds,
+	or maxBatchDelay seconds after its first key press if keys keep arriving.
+	"""
+
+	debounceInterval = 0.1
+	maxBatchDelay = 0.5
+
+	def __init__(self, callback: Callable[[List[int]], None]):
+		"""
+		@param callback: called on a background thread with the key codes pressed, in order.
+		"""
+		self._callback = callback
+		self._keyCodes: List[int] = []
+		self._firstPressTime = 0.0
+		self._timer: Optional[threading.Timer] = None
+		self._lock = threading.Lock()
+
+	def press(self, keyCode: int):
+		with self._lock:
+			now = time.monotonic()
+			if not self._keyCodes:
+				self._firstPressTime = now
+			self._keyCodes.append(keyCode)
+			if self._timer:
+				self._timer.cancel()
+			delay = min(self.debounceInterval, max(0, (self._firstPressTime + self.maxBatchDelay) - now))
+			self._timer = threading.Timer(delay, self._flush)
+			self._timer.daemon = True
+			self._timer.start()
+
+	def cancel(self):
+		with self._lock:
+			if self._timer:
+				self._timer.cancel()
+			self._timer = None
+			self._keyCodes = []
+
+	def _flush(self):
+		with self._lock:
+			keyCodes = self._keyCodes
+			self._keyCodes = []
+		if keyCodes:
+			self._callback(keyCodes)
@@ -0,0 +1,174 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+
+import struct
+from typing import List, NamedTuple
+import zlib
+
+
+class PngError(ValueError):
+	""" Raised when a file is not a PNG image this module can read."""
+
+
+class PngImage(NamedTuple):
+	width: int
+	height: int
+	# Grey-scale brightness (0 to 255) of each pixel, one bytes object per row.
+	# Transparent pixels are blended over white.
+	rows: List[bytes]
+
+
+pngSignature = b"\x89PNG\r\n\x1a\n"
+
+# Channels per pixel for each PNG colour type
+_colourTypeChannels = {
+	0: 1,  # grey
+	2: 3,  # RGB
+	3: 1,  # palette index
+	4: 2,  # grey plus alpha
+	6: 4,  # RGB plus alpha
+}
+
+
+def _paeth(a: int, b: int, c: int) -> int:
+	p = a + b - c
+	pa = abs(p - a)
+	pb = abs(p - b)
+	pc = abs(p - c)
+	if pa <= pb and pa <= pc:
+		return a
+	if pb <= pc:
+		return b
+	return c
+
+
+def _unfilter(data: bytes, height: int, stride: int, bytesPerPixel: int) -> List[bytearray]:
+	rows = []
+	prior = bytearray(stride)
+	offset = 0
+	for y in range(height):
+		filterType = data[offset]
+		row = bytearray(data[offset + 1:offset + 1 + stride])
+		offset += 1 + stride
+		if len(row) != stride:
+			raise PngError("Image data is truncated")
+		if filterType == 1:
+			for i in range(bytesPerPixel, stride):
+				row[i] = (row[i] + row[i - bytesPerPixel]) & 0xff
+		elif filterType == 2:
+			for i in range(stride):
+				row[i] = (row[i] + prior[i]) & 0xff
+		elif filterType == 3:
+			for i in range(stride):
+				left = row[i - bytesPerPixel] if i >= bytesPerPixel else 0
+				row[i] = (row[i] + ((left + prior[i]) >> 1)) & 0xff
+		elif filterType == 4:
+			for i in range(stride):
+				if i >= bytesPerPixel:
+					left = row[i - bytesPerPixel]
+					upperLeft = prior[i - bytesPerPixel]
+				else:
+					left = upperLeft = 0
+				row[i] = (row[i] + _paeth(left, prior[i], upperLeft)) & 0xff
+		elif filterType != 0:
+			raise PngError(f"Unknown filter type {filterType}")
+		rows.append(row)
+		prior = row
+	return rows
+
+
+def _brightness(red: int, green: int, blue: int) -> int:
+	# The same weighting as imageUtils.rgbPixelBrightness, so that images look the same however they are loaded.
+	return int((0.3 * blue) + (0.59 * green) + (0.11 * red))
+
+
+def readPng(path: str) -> PngImage:
+	"""
+	Reads a PNG image, converting it to grey-scale brightness.
+	All non-interlaced PNG formats are supported.
+	"""
+	with open(path, "rb") as f:
+		data = f.read()
+	if not data.startswith(pngSignature):
+		raise PngError(f"{path} is not a PNG image")
+	offset = len(pngSignature)
+	header = None
+	palette = b""
+	transparency = b""
+	compressed = []
+	while offset + 8 <= len(data):
+		length, chunkType = struct.unpack(">I4s", data[offset:offset + 8])
+		chunk = data[offset + 8:offset + 8 + length]
+		offset += 12 + length
+		if chunkType == b"IHDR":
+			header = struct.unpack(">IIBBBBB", chunk)
+		elif chunkType == b"PLTE":
+			palette = chunk
+		elif chunkType == b"tRNS":
+			transparency = chunk
+		elif chunkType == b"IDAT":
+			compressed.append(chunk)
+		elif chunkType == b"IEND":
+			break
+	if not header:
+		raise PngError(f"{path} has no image header")
+	width, height, bitDepth, colourType, compression, filterMethod, interlace = header
+	if colourType not in _colourTypeChannels or compression or filterMethod:
+		raise PngError(f"{path} uses an unknown PNG format")
+	if interlace:
+		raise PngError(f"{path} is interlaced, which is not supported")
+	channels = _colourTypeChannels[colourType]
+	bitsPerPixel = channels * bitDepth
+	stride = (width * bitsPerPixel + 7) // 8
+	try:
+		raw = zlib.decompress(b"".join(compressed))
+	except zlib.error as e:
+		raise PngError(f"{path} has corrupt image data: {e}")
+	filteredRows = _unfilter(raw, height, stride, max(1, bitsPerPixel // 8))
+	if colourType == 3:
+		# Each palette entry blended over white using its alpha
+		greyPalette = []
+		for index in range(len(palette) // 3):
+			red, green, blue = palette[index * 3:index * 3 + 3]
+			alpha = transparency[index] if index < len(transparency) else 255
+			greyPalette.append(_blendOverWhite(_brightness(red, green, blue), alpha))
+	maxSample = (1 << bitDepth) - 1
+	rows = []
+	for filteredRow in filteredRows:
+		if bitDepth == 16:
+			# Only the most significant byte of each sample matters for brightness
+			samples = filteredRow[0::2]
+		elif bitDepth == 8:
+			samples = filteredRow
+		else:
+			samplesPerByte = 8 // bitDepth
+			samples = bytearray(
+				(byte >> (8 - bitDepth * (i + 1))) & maxSample
+				for byte in filteredRow
+				for i in range(samplesPerByte)
+			)
+		row = bytearray(width)
+		for x in range(width):
+			pixel = samples[x * channels:(x + 1) * channels]
+			if colourType == 3:
+				index = pixel[0]
+				row[x] = greyPalette[index] if index < len(greyPalette) else 0
+				continue
+			if bitDepth < 8:
+				pixel = [(sample * 255) // maxSample for sample in pixel]
+			if colourType == 0:
+				row[x] = pixel[0]
+			elif colourType == 2:
+				row[x] = _brightness(*pixel)
+			elif colourType == 4:
+				row[x] = _blendOverWhite(pixel[0], pixel[1])
+			else:
+				row[x] = _blendOverWhite(_brightness(*pixel[:3]), pixel[3])
+		rows.append(bytes(row))
+	return PngImage(width, height, rows)
+
+
+def _blendOverWhite(brightness: int, alpha: int) -> int:
+	return (brightness * alpha + 255 * (255 - alpha)) // 255
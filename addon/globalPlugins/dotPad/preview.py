@@ -0,0 +1,129 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+
+from functools import lru_cache
+from typing import List, NamedTuple, Tuple
+from .canvas import DotCanvas
+
+# Text and image renderings of frames of packed cells (E.g. DotCanvas.data or DotPad.getDataBuffer()),
+# for checking what would be shown without a DotPad.
+# They are built from lookup tables of whole cells, so they are cheap enough to run on every frame.
+
+_cellWidth = DotCanvas.cellWidth
+_cellHeight = DotCanvas.cellHeight
+
+
+def _makeUnicodeBrailleTable() -> List[str]:
+	# DotPad cells store each column of 4 dots in turn, whereas Unicode braille numbers the first 3 rows of dots 1-6,
+	# and the bottom row as dots 7 and 8.
+	unicodeDotBits = [0x01, 0x02, 0x04, 0x40, 0x08, 0x10, 0x20, 0x80]
+	table = []
+	for cell in range(256):
+		pattern = 0
+		for bit, unicodeBit in enumerate(unicodeDotBits):
+			if cell & (1 << bit):
+				pattern |= unicodeBit
+		table.append(chr(0x2800 + pattern))
+	return table
+
+
+_unicodeBrailleTable = _makeUnicodeBrailleTable()
+
+
+@lru_cache(maxsize=8)
+def _getCellRowTable(raised, lowered) -> Tuple[Tuple, ...]:
+	"""
+	For each row of dots within a cell, the rendering of that row for every possible cell,
+	where raised and lowered are the renderings of a single dot.
+	"""
+	return tuple(
+		tuple(
+			(raised if cell & (1 << dotY) else lowered) + (raised if cell & (1 << (dotY + _cellHeight)) else lowered)
+			for cell in range(256)
+		)
+		for dotY in range(_cellHeight)
+	)
+
+
+def _iterCellRows(data: bytes, hCellCount: int):
+	for start in range(0, len(data), hCellCount):
+		yield data[start:start + hCellCount]
+
+
+def frameToUnicodeBraille(data: bytes, hCellCount: int) -> str:
+	"""
+	Shows a frame of packed cells as Unicode braille patterns, one character per cell and one line per row of cells.
+	"""
+	text = bytes(data).decode("latin-1").translate(_unicodeBrailleTable)
+	return "\n".join(text[start:start + hCellCount] for start in range(0, len(text), hCellCount))
+
+
+def frameToAscii(data: bytes, hCellCount: int, raised: str = "#", lowered: str = ".") -> str:
+	"""
+	Shows a frame of packed cells with one character per dot, one line per row of dots.
+	"""
+	table = _getCellRowTable(raised, lowered)
+	return "\n".join(
+		"".join(rowTable[cell] for cell in cellRow)
+		for cellRow in _iterCellRows(data, hCellCount)
+		for rowTable in table
+	)
+
+
+def frameToPgm(data: bytes, hCellCount: int, scale: int = 4) -> bytes:
+	"""
+	Converts a frame of packed cells to a binary PGM image, with raised dots in black on white,
+	and each dot scale pixels square.
+	"""
+	table = _getCellRowTable(b"\x00" * scale, b"\xff" * scale)
+	lines = []
+	for cellRow in _iterCellRows(data, hCellCount):
+		for rowTable in table:
+			line = b"".join([rowTable[cell] for cell in cellRow])
+			lines.extend([line] * scale)
+	width = hCellCount * _cellWidth * scale
+	header = f"P5\n{width} {len(lines)}\n255\n".encode("ascii")
+	return header + b"".join(lines)
+
+
+class FrameDiff(NamedTuple):
+	# The cells that differ, as (cellX, cellY, before, after)
+	changedCells: List[Tuple[int, int, int, int]]
+	dotsRaised: int
+	dotsLowered: int
+	# A frame with only the dots that changed raised
+	changedDots: bytes
+
+	@property
+	def isIdentical(self) -> bool:
+		return not self.changedCells
+
+	def __str__(self):
+		if self.isIdentical:
+			return "Frames are identical"
+		return f"{len(self.changedCells)} cells changed, {self.dotsRaised} dots raised, {self.dotsLowered} dots lowered"
+
+
+def diffFrames(before: bytes, after: bytes, hCellCount: int) -> FrameDiff:
+	"""
+	Compares two frames of packed cells of the same size, E.g. the output before and after an optimization.
+	"""
+	if len(before) != len(after):
+		raise ValueError(f"Frames differ in size: {len(before)} and {len(after)} cells")
+	beforeBits = int.from_bytes(before, "big")
+	afterBits = int.from_bytes(after, "big")
+	changedBits = beforeBits ^ afterBits
+	changedDots = changedBits.to_bytes(len(before), "big")
+	changedCells = [
+		(index % hCellCount, index // hCellCount, before[index], after[index])
+		for index, cell in enumerate(changedDots)
+		if cell
+	] if changedBits else []
+	return FrameDiff(
+		changedCells,
+		bin(afterBits & changedBits).count("1"),
+		bin(beforeBits & changedBits).count("1"),
+		changedDots
+	)
@@ -0,0 +1,186 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+
+from collections import Counter
+from contextlib import contextmanager
+import cProfile
+import functools
+import os
+import pstats
+import sys
+import threading
+import time
+from typing import Callable, Iterator, List, Optional
+
+
+class OperationProfiler:
+	"""
+	Profiles the next few DotPad operations (E.g. capturing the screen, drawing a chart, scrolling or outputting a frame)
+	once armed, for finding out why something is slow on a user's machine.
+	Each operation is profiled with cProfile on the thread it runs on,
+	while a sampling thread records its call stacks for flame graphs.
+	When the operations are done, the combined cProfile stats and the collapsed stacks are written to outputDir.
+	While not armed, the only cost of an operation is checking whether the profiler is armed.
+	"""
+
+	# The most operations that can be profiled in one go, and the longest time to sample each one for,
+	# so that a forgotten profiler cannot slow NVDA down for long.
+	maxOperations = 50
+	maxSampleTime = 10.0
+	sampleInterval = 0.002
+
+	def __init__(self):
+		self.outputDir: Optional[str] = None
+		# Called with the paths of the files written, on whichever thread finished the last operation
+		self.onSaved: Optional[Callable[[List[str]], None]] = None
+		self._remaining = 0
+		self._lock = threading.Lock()
+		self._local = threading.local()
+		self._stats: Optional[pstats.Stats] = None
+		self._stacks: Counter = Counter()
+		self._operations: List[str] = []
+		self._running = 0
+
+	@property
+	def isArmed(self) -> bool:
+		return self._remaining > 0
+
+	def arm(self, operationCount: int = 10):
+		with self._lock:
+			self._remaining = min(operationCount, self.maxOperations)
+			self._stats = None
+			self._stacks = Counter()
+			self._operations = []
+
+	def disarm(self) -> List[str]:
+		"""
+		Stops profiling, saving whatever has been profiled so far.
+		If operations are still being profiled, they are saved together once the last one finishes, and passed to L{onSaved}.
+		@returns: the paths of the files written, if anything had been profiled and no operation is still running.
+		"""
+		with self._lock:
+			self._remaining = 0
+			if self._running:
+				return []
+			return self._save()
+
+	@contextmanager
+	def profile(self, name: str) -> Iterator[None]:
+		"""
+		Profiles the code run within this context as an operation, if the profiler is armed.
+		Operations within operations on the same thread are part of the outer operation.
+		"""
+		if not self._remaining or getattr(self._local, "isProfiling", False):
+			yield
+			return
+		with self._lock:
+			if not self._remaining:
+				isProfiling = False
+			else:
+				self._remaining -= 1
+				self._running += 1
+				isProfiling = True
+		if not isProfiling:
+			yield
+			return
+		self._local.isProfiling = True
+		profile = cProfile.Profile()
+		sampler = _StackSampler(threading.get_ident(), self.sampleInterval, self.maxSampleTime)
+		sampler.start()
+		startTime = time.perf_counter()
+		profile.enable()
+		try:
+			yield
+		finally:
+			profile.disable()
+			duration = time.perf_counter() - startTime
+			sampler.stop()
+			self._local.isProfiling = False
+			self._addOperation(name, duration, profile, sampler.stacks)
+
+	def _addOperation(self, name: str, duration: float, profile: cProfile.Profile, stacks: Counter):
+		paths = None
+		with self._lock:
+			self._running -= 1
+			if self._stats is None:
+				self._stats = pstats.Stats(profile)
+			else:
+				self._stats.add(profile)
+			self._stacks.update(stacks)
+			self._operations.append(f"{name}: {duration * 1000:.1f} ms")
+			if not self._remaining and not self._running:
+				paths = self._save()
+		if paths and self.onSaved:
+			self.onSaved(paths)
+
+	def _save(self) -> List[str]:
+		if self._stats is None or not self.outputDir:
+			return []
+		os.makedirs(self.outputDir, exist_ok=True)
+		basePath = os.path.join(self.outputDir, time.strftime("dotPad-%Y%m%d-%H%M%S"))
+		statsPath = basePath + ".prof"
+		self._stats.dump_stats(statsPath)
+		stacksPath = basePath + ".collapsed.txt"
+		with open(stacksPath, "w", encoding="utf-8") as f:
+			for stack, count in sorted(self._stacks.items()):
+				f.write(f"{stack} {count}\n")
+		summaryPath = basePath + ".txt"
+		with open(summaryPath, "w", encoding="utf-8") as f:
+			f.write("\n".join(self._operations))
+			f.write("\n\n")
+			self._stats.stream = f
+			self._stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(40)
+		self._stats = None
+		self._stacks = Counter()
+		self._operations = []
+		return [statsPath, stacksPath, summaryPath]
+
+
+class _StackSampler:
+	"""
+	Records the call stack of one thread at regular intervals, as collapsed stacks (outermost call first, separated by ;).
+	"""
+
+	def __init__(self, threadId: int, interval: float, maxTime: float):
+		self.threadId = threadId
+		self.interval = interval
+		self.maxTime = maxTime
+		self.stacks: Counter = Counter()
+		self._stopped = threading.Event()
+		self._thread = threading.Thread(target=self._run, name="DotPad profiler sampler", daemon=True)
+
+	def start(self):
+		self._thread.start()
+
+	def stop(self):
+		self._stopped.set()
+		self._thread.join()
+
+	def _run(self):
+		endTime = time.perf_counter() + self.maxTime
+		while not self._stopped.wait(self.interval) and time.perf_counter() < endTime:
+			frame = sys._current_frames().get(self.threadId)
+			names = []
+			while frame:
+				code = frame.f_code
+				names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+				frame = frame.f_back
+			if names:
+				self.stacks[";".join(reversed(names))] += 1
+
+
+# The profiler for all DotPad operations
+profiler = OperationProfiler()
+
+
+def profiled(name: str):
+	""" Profiles each call of the decorated function as an operation named name."""
+	def decorator(func):
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			with profiler.profile(name):
+				return func(*args, **kwargs)
+		return wrapper
+	return decorator
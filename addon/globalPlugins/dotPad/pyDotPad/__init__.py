@@ -17,27 +17,23 @@ from . import dotPadSdk
 DotPadErrorCode = dotPadSdk.DotPadErrorCode
 DotPadError = dotPadSdk.DotPadError
 
-class Singleton:
-
-	_instanceRef  = None
-
-	@classmethod
-	def _getInstance(cls):
-		if not cls._instanceRef:
-			return None
-		return cls._instanceRef()
-
-	def _registerInstance(self):
-		cls = type(self)
-		if cls._getInstance():
-			raise RuntimeError(f"Only one instance of {type(self).__name__} can exist at a time")
-		cls._instanceRef = weakref.ref(self)
-
-	def __init__(self):
-		self._registerInstance()
-
-
-class DotPad(Singleton):
+# Error codes indicating that the link to the device has been lost,
+# and that the connection must be re-established before the device can be used again.
+connectionLostErrorCodes = frozenset({
+	DotPadErrorCode.COM_PORT_ERROR,
+	DotPadErrorCode.COM_PORT_DISCONNECTED,
+	DotPadErrorCode.COM_WRITE_ERROR,
+	DotPadErrorCode.COM_NOT_RESPONSE,
+	DotPadErrorCode.COM_RESPONSE_TIMEOUT,
+	DotPadErrorCode.RESPONSE_TIMEOUT,
+})
+
+class DotPad:
+	"""
+	A connection to one DotPad device.
+	Only one DotPad can use a copy of the SDK at a time, so to drive several devices at once,
+	give each DotPad a different SDK slot.
+	"""
 
 	cellHeight: int = 4
 	cellWidth: int = 2
@@ -47,35 +43,54 @@ class DotPad(Singleton):
 	bCellCount: int
 	_initialized = False
 
-	@classmethod
-	def _displayCallback(cls):
-		instance = cls._getInstance()
-		if instance:
-			instance._displayDoneEvent.set()
-
-	def __init__(self, portNum: int, keyCallback: Optional[Callable[[int],None]]=None):
-		super().__init__()
+	def __init__(self, portNum: int, keyCallback: Optional[Callable[[int],None]]=None, sdkSlot: int=0):
+		sdk = self._sdk = dotPadSdk.getSdk(sdkSlot)
+		if sdk.owner:
+			raise RuntimeError(f"SDK slot {sdkSlot} is already in use by another {type(self).__name__}")
+		sdk.ownerRef = weakref.ref(self)
+		self.portNum = portNum
+		self.sdkSlot = sdkSlot
 		self.keyCallback = keyCallback
-		self._cDisplayCallback = dotPadSdk.DisplayCallbackType(self._displayCallback)
-		dotPadSdk.registerDisplayCallback(self._cDisplayCallback)
 		self._displayDoneEvent = threading.Event()
 		self._displayDoneEvent.clear()
-		oldCwd = os.getcwd()
-		os.chdir(os.path.dirname(__file__))
+		# The SDK keeps callbacks alive for as long as it is loaded,
+		# so they must not hold a strong reference to this instance.
+		displayDoneEvent = self._displayDoneEvent
+		self._cDisplayCallback = dotPadSdk.DisplayCallbackType(displayDoneEvent.set)
 		try:
-			dotPadSdk.init(portNum)
-		finally:
-			os.chdir(oldCwd)
-		self._initialized = True
-		self.hCellCount, self.vCellCount, self.bCellCount = dotPadSdk.getDisplayInfo()
+			sdk.registerDisplayCallback(self._cDisplayCallback)
+			oldCwd = os.getcwd()
+			os.chdir(sdk.dllDir)
+			try:
+				sdk.init(portNum)
+			finally:
+				os.chdir(oldCwd)
+			self._initialized = True
+			self.hCellCount, self.vCellCount, self.bCellCount = sdk.getDisplayInfo()
+		except BaseException:
+			# Free the slot for the next attempt,
+			# as a traceback kept by the caller may keep this instance alive.
+			try:
+				self.terminate()
+			except DotPadError:
+				# The error that stopped initialization is the one to report
+				pass
+			if sdk.owner is self:
+				sdk.ownerRef = None
+			raise
 		self.hPixelCount = self.hCellCount * self.cellWidth
 		self.vPixelCount = self.vCellCount * self.cellHeight
 		self.resetDataBuffer()
 		if keyCallback is not None:
 			self._cKeyCallback = dotPadSdk.KeyCallbackType(keyCallback)
-			dotPadSdk.registerKeyCallback(self._cKeyCallback)
+			sdk.registerKeyCallback(self._cKeyCallback)
 		print(f"Initialized DotPad device with display  {self.hCellCount} cells by {self.vCellCount} cells, and {self.bCellCount} braille cells.") 
 
+	@property
+	def geometry(self):
+		""" The size of the graphics area in cells, as a tuple of (hCellCount, vCellCount)."""
+		return (self.hCellCount, self.vCellCount)
+
 	def resetDataBuffer(self):
 		self._data = ctypes.c_buffer(self.hCellCount * self.vCellCount)
 
@@ -88,20 +103,44 @@ class DotPad(Singleton):
 		bit = (y % self.cellHeight) + ((x % self.cellWidth) * self.cellHeight)
 		self._data[cellIndex] = ord(self._data[cellIndex]) | 2**bit
 
+	def getDataBuffer(self) -> bytes:
+		return self._data.raw
+
+	def setDataBuffer(self, data: bytes):
+		self.resetDataBuffer()
+		self._data.raw = data[:len(self._data)]
+
 	def outputDataBuffer(self, fullRefresh=False) -> bool:
+		"""
+		Sends the data buffer to the device.
+		@returns: True if the device confirmed the display within the timeout, False otherwise.
+		"""
 		self._displayDoneEvent.clear()
-		dotPadSdk.displayData(self._data, self.hCellCount * self.vCellCount, fullRefresh)
-		self._displayDoneEvent.wait(3)
+		self._sdk.displayData(self._data, self.hCellCount * self.vCellCount, fullRefresh)
+		return self._displayDoneEvent.wait(3)
+
+	def terminate(self):
+		"""
+		Deinitializes the device, allowing a new DotPad instance to be created.
+		Safe to call more than once.
+		"""
+		if not self._initialized:
+			return
+		self._initialized = False
+		sdk = self._sdk
+		if sdk.owner is self:
+			sdk.ownerRef = None
+		for count in range(5):
+			try:
+				sdk.deinit()
+			except DotPadError as e:
+				if e.code is DotPadErrorCode.DISPLAY_IN_PROGRESS:
+					time.sleep(1)
+					continue
+				elif e.code is DotPadErrorCode.DOT_PAD_COULD_NOT_INIT:
+					return  # Now deinitialized or was never initialized
+				raise
+			return
 
 	def __del__(self):
-		if self._initialized:
-			for count in range(5):
-				try:
-					dotPadSdk.deinit()
-				except DotPadError as e:
-					if e.code is DotPadErrorCode.DISPLAY_IN_PROGRESS:
-						time.sleep(1)
-						continue
-					elif e.code is DotPadErrorCode.DOT_PAD_COULD_NOT_INIT:
-						return  # Now deinitialized or was never initialized
-					raise
+		self.terminate()
@@ -1,11 +1,15 @@
 from enum import Enum
 import os
+import shutil
+import tempfile
+import threading
 import ctypes
+from typing import Dict, Optional
 from .ctypesUtils import StringBuffer, ParamFlag, declareCFunction
 
 
-_dllPath = os.path.join(os.path.dirname(__file__), 'DotPadSDK.dll')
-_dll = ctypes.cdll.LoadLibrary(_dllPath)
+_dllDir = os.path.dirname(__file__)
+_dllPath = os.path.join(_dllDir, 'DotPadSDK.dll')
 
 class DotPadErrorCode(Enum):
 	NONE = 0x00
@@ -69,52 +73,111 @@ class DotPadError(Exception):
 		return f"DotPadException({self.code.name})"
 
 
-init = declareCFunction(
-	_dll, DOT_PAD_ERROR, 'DOT_PAD_INIT', (
-		(ctypes.c_int, ParamFlag.IN, 'portNum'),
-	)
-)
-
-
-getDisplayInfo = declareCFunction(
-	_dll, DOT_PAD_ERROR, 'DOT_PAD_GET_DISPLAY_INFO', (
-		(ctypes.POINTER(ctypes.c_int), ParamFlag.OUT, 'displayWidth'),
-		(ctypes.POINTER(ctypes.c_int), ParamFlag.OUT, 'displayHeight'),
-		(ctypes.POINTER(ctypes.c_int), ParamFlag.OUT, 'brailleLength'),
-	)
-)
-
-
-getDeviceName = declareCFunction(
-	_dll, DOT_PAD_ERROR, 'DOT_PAD_GET_DEVICE_NAME', (
-		(StringBuffer(DEVICE_NAME_LEN), ParamFlag.OUT, 'deviceName'),
-	)
-)
-
-
-displayData = declareCFunction(
-	_dll, DOT_PAD_ERROR, 'DOT_PAD_DISPLAY_DATA', (
-		(ctypes.POINTER(ctypes.c_char), ParamFlag.IN, 'data'),
-		(ctypes.c_int, ParamFlag.IN, 'length'),
-		(ctypes.c_bool, ParamFlag.IN, 'refresh'),
-	)
-)
-
-
-registerDisplayCallback = declareCFunction(
-	_dll, DOT_PAD_ERROR, 'DOT_PAD_REGISTER_DISPLAY_CALLBACK', (
-		(DisplayCallbackType, ParamFlag.IN, 'callback'),
-	)
-)
-
-
-registerKeyCallback = declareCFunction(
-	_dll, DOT_PAD_ERROR, 'DOT_PAD_REGISTER_KEY_CALLBACK', (
-		(KeyCallbackType, ParamFlag.IN, 'callback'),
-	)
-)
-
-
-deinit = declareCFunction(
-	_dll, DOT_PAD_ERROR, 'DOT_PAD_DEINIT', ()
-)
+class DotPadSdk:
+	"""
+	The functions of one loaded copy of the DotPad SDK.
+	The SDK keeps its device state globally, so each loaded copy can drive only one device at a time.
+	"""
+
+	def __init__(self, dllPath: str, dllDir: Optional[str] = None):
+		"""
+		@param dllDir: the directory to load the SDK from, which holds the DLLs it depends on.
+			Defaults to the directory of dllPath.
+		"""
+		self.dllPath = dllPath
+		self.dllDir = dllDir or os.path.dirname(dllPath)
+		# The DotPad instance currently using this copy of the SDK, if any.
+		self.ownerRef = None
+		dll = self._dll = ctypes.cdll.LoadLibrary(dllPath)
+		self.init = declareCFunction(
+			dll, DOT_PAD_ERROR, 'DOT_PAD_INIT', (
+				(ctypes.c_int, ParamFlag.IN, 'portNum'),
+			)
+		)
+		self.getDisplayInfo = declareCFunction(
+			dll, DOT_PAD_ERROR, 'DOT_PAD_GET_DISPLAY_INFO', (
+				(ctypes.POINTER(ctypes.c_int), ParamFlag.OUT, 'displayWidth'),
+				(ctypes.POINTER(ctypes.c_int), ParamFlag.OUT, 'displayHeight'),
+				(ctypes.POINTER(ctypes.c_int), ParamFlag.OUT, 'brailleLength'),
+			)
+		)
+		self.getDeviceName = declareCFunction(
+			dll, DOT_PAD_ERROR, 'DOT_PAD_GET_DEVICE_NAME', (
+				(StringBuffer(DEVICE_NAME_LEN), ParamFlag.OUT, 'deviceName'),
+			)
+		)
+		self.displayData = declareCFunction(
+			dll, DOT_PAD_ERROR, 'DOT_PAD_DISPLAY_DATA', (
+				(ctypes.POINTER(ctypes.c_char), ParamFlag.IN, 'data'),
+				(ctypes.c_int, ParamFlag.IN, 'length'),
+				(ctypes.c_bool, ParamFlag.IN, 'refresh'),
+			)
+		)
+		self.registerDisplayCallback = declareCFunction(
+			dll, DOT_PAD_ERROR, 'DOT_PAD_REGISTER_DISPLAY_CALLBACK', (
+				(DisplayCallbackType, ParamFlag.IN, 'callback'),
+			)
+		)
+		self.registerKeyCallback = declareCFunction(
+			dll, DOT_PAD_ERROR, 'DOT_PAD_REGISTER_KEY_CALLBACK', (
+				(KeyCallbackType, ParamFlag.IN, 'callback'),
+			)
+		)
+		self.deinit = declareCFunction(
+			dll, DOT_PAD_ERROR, 'DOT_PAD_DEINIT', ()
+		)
+
+	@property
+	def owner(self):
+		if not self.ownerRef:
+			return None
+		return self.ownerRef()
+
+
+_sdks: Dict[int, DotPadSdk] = {}
+_sdksLock = threading.Lock()
+
+
+def getSdk(slot: int = 0) -> DotPadSdk:
+	"""
+	Fetches the copy of the SDK for the given slot, loading it if necessary.
+	Windows only loads a DLL once per path, so slots other than 0 use a private copy of the DLL,
+	giving each slot its own independent device state.
+	"""
+	with _sdksLock:
+		sdk = _sdks.get(slot)
+		if sdk:
+			return sdk
+		dllPath = _dllPath if slot == 0 else _copyDll(slot)
+		sdk = _sdks[slot] = DotPadSdk(dllPath, dllDir=_dllDir)
+		return sdk
+
+
+# Copies of the SDK are kept out of the add-on's directory, which may not be writable
+_copiesDir = os.path.join(tempfile.gettempdir(), "nvda-dotPad-sdk")
+
+
+def _copyDll(slot: int) -> str:
+	"""
+	Copies the SDK for the given slot, unless it has been copied already.
+	Each copy is named after the size and modification time of the SDK it was copied from,
+	so that an updated SDK is always copied again, without overwriting a copy that may still be loaded by another copy of NVDA.
+	@returns: the path of the copy.
+	"""
+	source = os.stat(_dllPath)
+	name = f'DotPadSDK_{slot}_{source.st_size}_{source.st_mtime_ns}.dll'
+	dllPath = os.path.join(_copiesDir, name)
+	if os.path.isfile(dllPath):
+		return dllPath
+	os.makedirs(_copiesDir, exist_ok=True)
+	tempPath = f"{dllPath}.{os.getpid()}.tmp"
+	shutil.copyfile(_dllPath, tempPath)
+	os.replace(tempPath, dllPath)
+	# Copies of older SDKs for this slot are no longer needed, but may be in use by another copy of NVDA
+	for oldName in os.listdir(_copiesDir):
+		if oldName.startswith(f'DotPadSDK_{slot}_') and oldName != name:
+			try:
+				os.remove(os.path.join(_copiesDir, oldName))
+			except OSError:
+				pass
+	return dllPath
@@ -0,0 +1,156 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+
+from concurrent.futures import Future
+import threading
+from typing import Callable, Dict, Optional, Tuple
+from logHandler import log
+from .deviceManager import DeviceManager
+from .scene import Scene
+from .preview import frameToUnicodeBraille, diffFrames
+from .profiling import profiler
+
+
+class RenderCancelled(Exception):
+	""" Raised within a render job when a newer job has superseded it."""
+
+
+class RenderJob:
+	"""
+	A request to show a scene on the connected DotPads.
+	The job runs in stages: acquiring the scene (E.g. extracting data), laying it out and rasterizing it for each geometry,
+	and handing the frames to the devices for output.
+	"""
+
+	def __init__(
+			self,
+			acquire: Callable[[], Optional[Scene]],
+			fullRefresh: bool = False,
+			onOutput: Optional[Callable[[Dict[str, Future]], None]] = None,
+			onError: Optional[Callable[[Exception], None]] = None
+	):
+		"""
+		@param acquire: produces the scene to show, or None if there is nothing to show.
+			Runs on the render thread, so it must not access NVDA objects.
+		@param fullRefresh: whether to raise every pin again on devices that are already showing the frame.
+		@param onOutput: called on the render thread with a future for the output to each device, keyed by port.
+		@param onError: called on the render thread if a stage of the job fails.
+		"""
+		self.acquire = acquire
+		self.fullRefresh = fullRefresh
+		self.onOutput = onOutput
+		self.onError = onError
+		self._cancelled = threading.Event()
+
+	def cancel(self):
+		self._cancelled.set()
+
+	@property
+	def cancelled(self) -> bool:
+		return self._cancelled.is_set()
+
+	def checkCancelled(self):
+		if self._cancelled.is_set():
+			raise RenderCancelled()
+
+
+class RenderPipeline:
+	"""
+	Runs render jobs one at a time on a worker thread, keeping all rendering off NVDA's main thread.
+	Submitting a job cancels any job that has not yet reached the output stage,
+	so that E.g. rapid scrolling only renders the final position.
+	"""
+
+	# When true, each frame is logged as Unicode braille, along with how it differs from the previous frame.
+	debugPreview = False
+
+	def __init__(self, devices: DeviceManager):
+		self._devices = devices
+		self._pending: Optional[RenderJob] = None
+		self._current: Optional[RenderJob] = None
+		self._condition = threading.Condition()
+		self._stopped = False
+		self._lastFrames: Dict[Tuple[int, int], bytes] = {}
+		self._thread = threading.Thread(target=self._run, name="DotPad render", daemon=True)
+		self._thread.start()
+
+	def submit(self, job: RenderJob) -> RenderJob:
+		with self._condition:
+			if self._pending:
+				self._pending.cancel()
+			if self._current:
+				self._current.cancel()
+			self._pending = job
+			self._condition.notify()
+		return job
+
+	def terminate(self):
+		with self._condition:
+			self._stopped = True
+			for job in (self._pending, self._current):
+				if job:
+					job.cancel()
+			self._pending = None
+			self._condition.notify()
+		self._thread.join()
+
+	def _run(self):
+		while True:
+			with self._condition:
+				while not self._pending and not self._stopped:
+					self._condition.wait()
+				if self._stopped:
+					return
+				job = self._current = self._pending
+				self._pending = None
+			try:
+				with profiler.profile("render"):
+					self._runJob(job)
+			except RenderCancelled:
+				log.debug("Render job superseded")
+			except Exception as e:
+				log.error("Error rendering for DotPad", exc_info=True)
+				if job.onError:
+					job.onError(e)
+			finally:
+				with self._condition:
+					self._current = None
+
+	def _runJob(self, job: RenderJob):
+		job.checkCancelled()
+		scene = job.acquire()
+		if not scene:
+			return
+		frames = {}
+		for geometry in self._devices.geometries:
+			job.checkCancelled()
+			frames[geometry] = scene.getFrame(geometry)
+		job.checkCancelled()
+		if self.debugPreview:
+			self._logPreviews(frames)
+
+		def getFrame(geometry):
+			# A device may have connected since the frames were rasterized
+			if geometry not in frames:
+				frames[geometry] = scene.getFrame(geometry)
+			return frames[geometry]
+
+		futures = self._devices.displayFrame(getFrame, job.fullRefresh, getPriorityRows=scene.getPriorityRows)
+		if job.onOutput:
+			job.onOutput(futures)
+		for geometry in frames:
+			# Prepare whatever is likely to be shown next, E.g. the views next to a zoomed image
+			try:
+				scene.prefetch(geometry)
+			except Exception:
+				log.error("Error prefetching for DotPad", exc_info=True)
+
+	def _logPreviews(self, frames: Dict[Tuple[int, int], bytes]):
+		for geometry, frame in frames.items():
+			hCellCount, vCellCount = geometry
+			lastFrame = self._lastFrames.get(geometry)
+			self._lastFrames[geometry] = frame
+			change = diffFrames(lastFrame, frame, hCellCount) if lastFrame is not None else "first frame"
+			log.debug(f"DotPad frame for {hCellCount} by {vCellCount} cells, {change}:\n{frameToUnicodeBraille(frame, hCellCount)}")
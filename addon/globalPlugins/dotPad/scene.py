@@ -0,0 +1,719 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+
+from collections import OrderedDict
+import copy
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type, Union
+from .canvas import DotCanvas
+from .imageUtils import StretchMode
+from .frameCache import FrameCache
+from .frameFile import FrameFile
+from .zoomableImage import ZoomableImage
+from .heatmap import Heatmap, HeatmapData
+from .textLayout import TextLayout, brailleLineHeight, drawBrailleLines
+from .brailleUtils import brailleCellWidth
+from .dataUtils import Chart, Dataset, ScrollableChart, LineChart
+
+
+class SceneElement:
+	"""
+	A part of a scene, positioned in fractions of the graphics area so that it can be laid out for any geometry.
+	"""
+
+	def __init__(self, left: float = 0.0, top: float = 0.0, width: float = 1.0, height: float = 1.0):
+		self.left = left
+		self.top = top
+		self.width = width
+		self.height = height
+
+	def getBounds(self, destWidth: int, destHeight: int) -> Tuple[int, int, int, int]:
+		""" The position and size in dots of this element within a graphics area of the given size."""
+		x = int(self.left * destWidth)
+		y = int(self.top * destHeight)
+		width = int((self.left + self.width) * destWidth) - x
+		height = int((self.top + self.height) * destHeight) - y
+		return x, y, width, height
+
+	isScrollable = False
+	isZoomable = False
+
+	def scroll(self, width: int, height: int, back=False, pages=1, vertical=False) -> int:
+		"""
+		Scrolls by the given number of pages, for an element laid out at the given size.
+		@returns: the number of pages scrolled, which is less than pages if there was nothing more in that direction.
+		"""
+		return 0
+
+	def zoom(self, factor: float) -> bool:
+		"""
+		Changes how much of the element is shown by the given factor, E.g. 0.5 to zoom in and show half as much.
+		@returns: False if the element cannot zoom any further.
+		"""
+		return False
+
+	def describeView(self) -> Optional[str]:
+		""" A description of the part of the element being shown after zooming, if it is zoomable."""
+		return None
+
+	def prefetch(self, width: int, height: int):
+		"""
+		Called after the element is shown at the given size, to prepare whatever is likely to be shown next in the background.
+		"""
+
+	def getPriorityBounds(self, width: int, height: int) -> Optional[Tuple[int, int, int, int]]:
+		"""
+		The part of this element, laid out at the given size, that the user is most likely to read first,
+		E.g. the plot area of a chart rather than its rulers, as (x, y, width, height) in dots.
+		If showing the element moves a lot of pins, this part is shown first.
+		None if no part comes first.
+		"""
+		return None
+
+	def getCacheKey(self) -> tuple:
+		"""
+		Any state other than the geometry that changes how this element is rasterized,
+		E.g. the scroll position of a chart.
+		"""
+		return ()
+
+	def getContentKey(self, width: int, height: int) -> Optional[tuple]:
+		"""
+		Identifies everything that this element would draw at the given size, in a form that stays the same across NVDA sessions,
+		allowing its frames to be cached on disk.
+		None if the element cannot be cached.
+		"""
+		return None
+
+	def getPackedFrame(self, geometry: Tuple[int, int]) -> Optional[bytes]:
+		"""
+		The packed cells of an already rendered frame for a graphics area of the given size in cells,
+		used instead of drawing the element when it fills the whole area.
+		None if the element must be drawn.
+		"""
+		return None
+
+	def draw(self, width: int, height: int, func_drawDot: Callable[[int, int], None]):
+		raise NotImplementedError
+
+	def terminate(self):
+		""" Stops any background work, once the element will no longer be shown."""
+
+
+class ChartElement(SceneElement):
+	"""
+	A chart, holding the data extracted from its source and the chosen options.
+	The axes, series and labels are laid out separately for each size the chart is drawn at,
+	and each layout is kept so that drawing it again (E.g. after scrolling) skips the layout work.
+	"""
+
+	colStartOffset = 0
+	# The range of values shown by a zoomable chart, None meaning up to the last value.
+	viewEnd: Optional[int] = None
+	minViewSize = 4
+
+	def __init__(
+			self,
+			chartType: Type[Chart],
+			minVal: float,
+			maxVal: float,
+			datasets: Dict[str, Union[Dataset, List[float]]],
+			showVerticalRuler=True,
+			showHorizontalRuler=True,
+			seriesNames: Optional[Sequence[str]] = None,
+			**kwargs
+	):
+		"""
+		@param seriesNames: the names of all the series that could be shown, in order, E.g. so that small multiples keep each series in the same tile.
+			Defaults to the names of the datasets.
+		"""
+		super().__init__(**kwargs)
+		self.chartType = chartType
+		self.minVal = minVal
+		self.maxVal = maxVal
+		# Stored as Datasets once, so that every layout shares them, and their digests identify the chart without laying it out
+		self.datasets = {
+			name: values if isinstance(values, Dataset) else Dataset(values)
+			for name, values in datasets.items()
+		}
+		self.showVerticalRuler = showVerticalRuler
+		self.showHorizontalRuler = showHorizontalRuler
+		self.seriesNames = seriesNames
+		self._layouts: Dict[Tuple[int, int], Chart] = {}
+		# Held while a layout is positioned and drawn, as snapshots of this element share its layouts
+		self._layoutLocks: Dict[Tuple[int, int], threading.Lock] = {}
+		self._lock = threading.Lock()
+
+	@property
+	def isScrollable(self) -> bool:
+		return issubclass(self.chartType, ScrollableChart)
+
+	@property
+	def isZoomable(self) -> bool:
+		return issubclass(self.chartType, LineChart)
+
+	@property
+	def numTotalCols(self) -> int:
+		return len(next(iter(self.datasets.values())))
+
+	@property
+	def viewRange(self) -> Tuple[int, int]:
+		end = self.numTotalCols if self.viewEnd is None else self.viewEnd
+		return self.colStartOffset, end
+
+	def zoom(self, factor: float) -> bool:
+		"""
+		Changes the number of values shown by a zoomable chart by the given factor, keeping the view centred where possible.
+		E.g. a factor of 0.5 zooms in to show half as many values.
+		@returns: False if the chart cannot zoom any further.
+		"""
+		if not self.isZoomable:
+			return False
+		total = self.numTotalCols
+		start, end = self.viewRange
+		size = min(total, max(min(self.minViewSize, total), int(round((end - start) * factor))))
+		if size == end - start:
+			return False
+		centre = (start + end) // 2
+		start = max(0, min(total - size, centre - (size // 2)))
+		self.colStartOffset = start
+		self.viewEnd = start + size
+		return True
+
+	def pan(self, back=False, pages=1) -> int:
+		"""
+		Moves the view of a zoomed chart by half its width, the given number of times.
+		@returns: the number of times the view moved, which is less than pages if it reached that end of the data.
+		"""
+		if not self.isZoomable:
+			return 0
+		total = self.numTotalCols
+		start, end = self.viewRange
+		size = end - start
+		step = max(1, size // 2)
+		moved = 0
+		newStart = start
+		while moved < pages:
+			if back:
+				nextStart = max(0, newStart - step)
+			else:
+				nextStart = min(total - size, newStart + step)
+			if nextStart == newStart:
+				break
+			newStart = nextStart
+			moved += 1
+		if moved:
+			self.colStartOffset = newStart
+			self.viewEnd = newStart + size
+		return moved
+
+	def withOptions(self, **options) -> "ChartElement":
+		"""
+		Creates a copy of this chart with some options changed, sharing the already extracted data.
+		"""
+		kwargs = dict(
+			chartType=self.chartType,
+			minVal=self.minVal,
+			maxVal=self.maxVal,
+			datasets=self.datasets,
+			showVerticalRuler=self.showVerticalRuler,
+			showHorizontalRuler=self.showHorizontalRuler,
+			seriesNames=self.seriesNames,
+			left=self.left,
+			top=self.top,
+			width=self.width,
+			height=self.height,
+		)
+		kwargs.update(options)
+		return type(self)(**kwargs)
+
+	def _getLayout(self, width: int, height: int) -> Chart:
+		with self._lock:
+			chart = self._layouts.get((width, height))
+			if not chart:
+				chart = self._layouts[(width, height)] = self.chartType(
+					width, height, self.minVal, self.maxVal, self.datasets,
+					showVerticalRuler=self.showVerticalRuler,
+					showHorizontalRuler=self.showHorizontalRuler,
+					seriesNames=self.seriesNames
+				)
+				self._layoutLocks[(width, height)] = threading.Lock()
+		return chart
+
+	def scroll(self, width: int, height: int, back=False, pages=1, vertical=False) -> int:
+		"""
+		Scrolls by the given number of pages of the layout for the given size, or pans a zoomable chart.
+		@returns: the number of pages scrolled, which is less than pages if there was no more data in that direction.
+		"""
+		if vertical:
+			return 0
+		if self.isZoomable:
+			return self.pan(back, pages)
+		if not self.isScrollable:
+			return 0
+		# The layout may be in use by a render on another thread, so only read from it.
+		chart = self._getLayout(width, height)
+		colStartOffset = self.colStartOffset
+		scrolled = 0
+		while scrolled < pages:
+			nextColStartOffset = chart.getScrolledColStartOffset(colStartOffset, back=back)
+			if nextColStartOffset is None:
+				break
+			colStartOffset = nextColStartOffset
+			scrolled += 1
+		self.colStartOffset = colStartOffset
+		return scrolled
+
+	def getCacheKey(self) -> tuple:
+		return (self.colStartOffset, self.viewEnd)
+
+	def describeView(self) -> Optional[str]:
+		if not self.isZoomable:
+			return None
+		start, end = self.viewRange
+		return f"Showing {start + 1} to {end} of {self.numTotalCols}"
+
+	def getContentKey(self, width: int, height: int) -> Optional[tuple]:
+		return (
+			self.chartType.__name__,
+			self.minVal,
+			self.maxVal,
+			tuple((name, dataset.digest) for name, dataset in self.datasets.items()),
+			self.showVerticalRuler,
+			self.showHorizontalRuler,
+			self.seriesNames and tuple(self.seriesNames),
+			self.colStartOffset,
+			self.viewEnd,
+		)
+
+	def getPriorityBounds(self, width: int, height: int) -> Optional[Tuple[int, int, int, int]]:
+		chart = self._getLayout(width, height)
+		return (chart.plotX, chart.plotY, chart.plotWidth, chart.plotHeight)
+
+	def draw(self, width: int, height: int, func_drawDot: Callable[[int, int], None]):
+		chart = self._getLayout(width, height)
+		# Another snapshot may be drawing the same layout at a different scroll or zoom state
+		with self._layoutLocks[(width, height)]:
+			chart.colStartOffset = self.colStartOffset
+			if self.isZoomable:
+				chart.viewEnd = self.viewEnd
+			chart.draw(func_drawDot)
+
+
+class ImageElement(SceneElement):
+	"""
+	An image region, such as part of the screen, produced by a function that renders it for a given size in dots.
+	"""
+
+	def __init__(self, render: Callable[[int, int, Callable[[int, int], None]], None], **kwargs):
+		super().__init__(**kwargs)
+		self.render = render
+
+	def draw(self, width: int, height: int, func_drawDot: Callable[[int, int], None]):
+		self.render(width, height, func_drawDot)
+
+
+class FrameFileElement(SceneElement):
+	"""
+	The pages of a frame file, shown one at a time.
+	Pages are sent as they are if the file was rendered for the DotPad's geometry,
+	otherwise their dots are copied, cropping any that do not fit.
+	"""
+
+	page = 0
+
+	def __init__(self, frameFile: FrameFile, **kwargs):
+		super().__init__(**kwargs)
+		self.frameFile = frameFile
+
+	@property
+	def isScrollable(self) -> bool:
+		return len(self.frameFile) > 1
+
+	def scroll(self, width: int, height: int, back=False, pages=1, vertical=False) -> int:
+		if vertical:
+			return 0
+		if back:
+			newPage = max(0, self.page - pages)
+		else:
+			newPage = min(len(self.frameFile) - 1, self.page + pages)
+		scrolled = abs(newPage - self.page)
+		self.page = newPage
+		return scrolled
+
+	def getCacheKey(self) -> tuple:
+		return (self.page,)
+
+	def describeView(self) -> Optional[str]:
+		return f"Page {self.page + 1} of {len(self.frameFile)}"
+
+	def getPackedFrame(self, geometry: Tuple[int, int]) -> Optional[bytes]:
+		if geometry != self.frameFile.geometry or not len(self.frameFile):
+			return None
+		return self.frameFile.readPage(self.page)
+
+	def draw(self, width: int, height: int, func_drawDot: Callable[[int, int], None]):
+		if not len(self.frameFile):
+			return
+		canvas = DotCanvas.fromBytes(*self.frameFile.geometry, self.frameFile.readPage(self.page))
+		for x, y in canvas.iterDots():
+			if x < width and y < height:
+				func_drawDot(x, y)
+
+
+class TextElement(SceneElement):
+	"""
+	Text shown as braille across the graphics area, word wrapped and a page at a time.
+	The text is laid out separately for each size it is shown at, but the page being shown is the same for all sizes.
+	"""
+
+	page = 0
+	isScrollable = True
+
+	def __init__(self, paragraphs: Iterable[str], brailleTable: Optional[str] = None, **kwargs):
+		"""
+		@param paragraphs: the text, a paragraph at a time, which is only read as far as the pages shown.
+		"""
+		super().__init__(**kwargs)
+		self._paragraphs = iter(paragraphs)
+		self.brailleTable = brailleTable
+		self._readParagraphs: List[str] = []
+		self._layouts: Dict[int, TextLayout] = {}
+		self._lock = threading.Lock()
+
+	def _iterParagraphs(self) -> Iterator[str]:
+		# Every layout reads the same paragraphs, but the source is only read once
+		index = 0
+		while True:
+			with self._lock:
+				if index == len(self._readParagraphs):
+					paragraph = next(self._paragraphs, None)
+					if paragraph is None:
+						return
+					self._readParagraphs.append(paragraph)
+				paragraph = self._readParagraphs[index]
+			yield paragraph
+			index += 1
+
+	def _getLayout(self, width: int, height: int) -> TextLayout:
+		lineLength = max(1, (width + 1) // brailleCellWidth)
+		linesPerPage = max(1, (height + 1) // brailleLineHeight)
+		with self._lock:
+			layout = self._layouts.get((lineLength, linesPerPage))
+			if not layout:
+				layout = self._layouts[(lineLength, linesPerPage)] = TextLayout(
+					self._iterParagraphs(), lineLength, linesPerPage, brailleTable=self.brailleTable
+				)
+		return layout
+
+	def scroll(self, width: int, height: int, back=False, pages=1, vertical=False) -> int:
+		if back:
+			newPage = max(0, self.page - pages)
+		else:
+			# Only lay out as far as the page being scrolled to
+			pageCount = self._getLayout(width, height).ensurePages(self.page + pages + 1)
+			newPage = min(self.page + pages, pageCount - 1)
+		scrolled = abs(newPage - self.page)
+		self.page = newPage
+		return scrolled
+
+	def getCacheKey(self) -> tuple:
+		return (self.page,)
+
+	def describeView(self) -> Optional[str]:
+		pageCounts = {layout.pageCount for layout in self._layouts.values()}
+		if len(pageCounts) == 1 and None not in pageCounts:
+			return f"Page {self.page + 1} of {pageCounts.pop()}"
+		return f"Page {self.page + 1}"
+
+	def draw(self, width: int, height: int, func_drawDot: Callable[[int, int], None]):
+		drawBrailleLines(func_drawDot, 0, 0, self._getLayout(width, height).getPage(self.page))
+
+	def prefetch(self, width: int, height: int):
+		# Translate the next page while this one is being read
+		self._getLayout(width, height).ensurePages(self.page + 2)
+
+
+class HeatmapElement(SceneElement):
+	"""
+	A grid of values, such as a range of spreadsheet cells, shown as a heatmap.
+	Each size it is drawn at has its own layout, kept so that drawing it again skips shrinking the grid.
+	"""
+
+	def __init__(self, data: HeatmapData, **kwargs):
+		super().__init__(**kwargs)
+		self.data = data
+		self._layouts: Dict[Tuple[int, int], Heatmap] = {}
+
+	def _getLayout(self, width: int, height: int) -> Heatmap:
+		heatmap = self._layouts.get((width, height))
+		if not heatmap:
+			heatmap = self._layouts[(width, height)] = Heatmap(width, height, self.data)
+		return heatmap
+
+	def getContentKey(self, width: int, height: int) -> Optional[tuple]:
+		return (self.data.digest,)
+
+	def getPriorityBounds(self, width: int, height: int) -> Optional[Tuple[int, int, int, int]]:
+		heatmap = self._getLayout(width, height)
+		return (heatmap.plotX, heatmap.plotY, heatmap.plotWidth, heatmap.plotHeight)
+
+	def draw(self, width: int, height: int, func_drawDot: Callable[[int, int], None]):
+		self._getLayout(width, height).draw(func_drawDot)
+
+
+class ZoomableImageElement(SceneElement):
+	"""
+	A part of the screen that can be zoomed into and panned around.
+	It is captured once for each size it is drawn at, at maxZoom times that size,
+	and every view is then made from that capture.
+	The view is kept as the zoom level plus the position of its top left corner in halves of the view,
+	so that it is the same for every size.
+	"""
+
+	maxZoom = 4
+	zoomLevel = 1
+	# The position of the view, in halves of the view's width and height
+	viewCol = 0
+	viewRow = 0
+
+	def __init__(
+			self,
+			capture: Callable[[int, int], Tuple[Sequence[bytes], Tuple[int, int, int, int]]],
+			isWhiteOnBlack: bool = False,
+			stretchMode: StretchMode = StretchMode.HALFTONE,
+			**kwargs
+	):
+		"""
+		@param capture: captures the image as rows of brightness values for the given width and height in pixels,
+			returning the rows plus the bounds of the image within them.
+		"""
+		super().__init__(**kwargs)
+		self.capture = capture
+		self.isWhiteOnBlack = isWhiteOnBlack
+		self.stretchMode = stretchMode
+		self._images: Dict[Tuple[int, int], Tuple[ZoomableImage, str]] = {}
+		self._lock = threading.Lock()
+
+	isZoomable = True
+
+	@property
+	def isScrollable(self) -> bool:
+		return self.zoomLevel > 1
+
+	def _getImage(self, width: int, height: int) -> Tuple[ZoomableImage, str]:
+		with self._lock:
+			image = self._images.get((width, height))
+			if not image:
+				rows, bounds = self.capture(width * self.maxZoom, height * self.maxZoom)
+				image = self._images[(width, height)] = (
+					ZoomableImage(
+						rows, bounds, width, height, self.maxZoom,
+						stretchMode=self.stretchMode, isWhiteOnBlack=self.isWhiteOnBlack
+					),
+					FrameCache.makeKey(*rows)
+				)
+			return image
+
+	@property
+	def _maxViewPos(self) -> int:
+		# The view is half of the level's size in halves of the view, less the view itself
+		return (self.zoomLevel - 1) * 2
+
+	def zoom(self, factor: float) -> bool:
+		zoomLevel = self.zoomLevel * 2 if factor < 1 else self.zoomLevel // 2
+		if not 1 <= zoomLevel <= self.maxZoom:
+			return False
+		# Keep the centre of the view where it is
+		scale = zoomLevel / self.zoomLevel
+		centreCol = self.viewCol + 1
+		centreRow = self.viewRow + 1
+		self.zoomLevel = zoomLevel
+		self.viewCol = max(0, min(self._maxViewPos, int(centreCol * scale) - 1))
+		self.viewRow = max(0, min(self._maxViewPos, int(centreRow * scale) - 1))
+		return True
+
+	def scroll(self, width: int, height: int, back=False, pages=1, vertical=False) -> int:
+		pos = self.viewRow if vertical else self.viewCol
+		newPos = max(0, pos - pages) if back else min(self._maxViewPos, pos + pages)
+		if vertical:
+			self.viewRow = newPos
+		else:
+			self.viewCol = newPos
+		return abs(newPos - pos)
+
+	def describeView(self) -> Optional[str]:
+		if self.zoomLevel == 1:
+			return "Showing all"
+		return f"Zoomed {self.zoomLevel} times"
+
+	def _getViewPos(self, width: int, height: int, zoomLevel: int, viewCol: int, viewRow: int) -> Tuple[int, int, int]:
+		return (zoomLevel, (viewCol * width) // 2, (viewRow * height) // 2)
+
+	def getCacheKey(self) -> tuple:
+		return (self.zoomLevel, self.viewCol, self.viewRow)
+
+	def getContentKey(self, width: int, height: int) -> Optional[tuple]:
+		image, digest = self._getImage(width, height)
+		return (digest, self.maxZoom, self.stretchMode, self.isWhiteOnBlack, self.zoomLevel, self.viewCol, self.viewRow)
+
+	def draw(self, width: int, height: int, func_drawDot: Callable[[int, int], None]):
+		image, digest = self._getImage(width, height)
+		for x, y in image.getView(*self._getViewPos(width, height, self.zoomLevel, self.viewCol, self.viewRow)):
+			func_drawDot(x, y)
+
+	def prefetch(self, width: int, height: int):
+		image, digest = self._getImage(width, height)
+		zoomLevel, viewCol, viewRow = self.zoomLevel, self.viewCol, self.viewRow
+		maxViewPos = self._maxViewPos
+		# Panning a page in each direction, then zooming in
+		neighbours = [
+			(viewCol - 1, viewRow), (viewCol + 1, viewRow),
+			(viewCol, viewRow - 1), (viewCol, viewRow + 1),
+		]
+		views = [
+			self._getViewPos(width, height, zoomLevel, col, row)
+			for col, row in neighbours
+			if 0 <= col <= maxViewPos and 0 <= row <= maxViewPos
+		]
+		if zoomLevel < self.maxZoom:
+			zoomed = copy.copy(self)
+			zoomed.zoom(0.5)
+			views.append(self._getViewPos(width, height, zoomed.zoomLevel, zoomed.viewCol, zoomed.viewRow))
+		image.prefetch(views)
+
+	def terminate(self):
+		with self._lock:
+			images = list(self._images.values())
+		for image, digest in images:
+			image.terminate()
+
+
+class Scene:
+	"""
+	A description of what should be shown, built once and rasterized on demand for any DotPad geometry.
+	Rasterized frames are cached per geometry,
+	and also on disk if a frame cache is given and all the elements can be cached.
+	Frames can be fetched from several threads at once, E.g. when laying out charts in advance.
+	"""
+
+	maxCachedFrames = 8
+	# Increase when rendering changes, so that frames cached on disk by older versions are not used.
+	renderVersion = 1
+
+	def __init__(self, elements: List[SceneElement], frameCache: Optional[FrameCache] = None):
+		self.elements = elements
+		self.frameCache = frameCache
+		self._frames: "OrderedDict[tuple, bytes]" = OrderedDict()
+		self._framesLock = threading.Lock()
+
+	def snapshot(self) -> "Scene":
+		"""
+		A copy of this scene whose elements will not change if this scene's elements are scrolled or zoomed,
+		so that it can be rasterized on another thread.
+		Layouts and cached frames are shared with this scene.
+		"""
+		scene = copy.copy(self)
+		scene.elements = [copy.copy(element) for element in self.elements]
+		return scene
+
+	@property
+	def chart(self) -> Optional[ChartElement]:
+		for element in self.elements:
+			if isinstance(element, ChartElement):
+				return element
+		return None
+
+	@property
+	def scrollable(self) -> Optional[SceneElement]:
+		""" The element that scrolling and zooming apply to, if any."""
+		for element in self.elements:
+			if element.isScrollable or element.isZoomable:
+				return element
+		return None
+
+	def prefetch(self, geometry: Tuple[int, int]):
+		canvas = DotCanvas(*geometry)
+		for element in self.elements:
+			x, y, width, height = element.getBounds(canvas.hPixelCount, canvas.vPixelCount)
+			element.prefetch(width, height)
+
+	def getPriorityRows(self, geometry: Tuple[int, int]) -> Optional[range]:
+		"""
+		The rows of cells to show first when the frame for a graphics area of the given size in cells moves a lot of pins,
+		covering the priority parts of all the elements.
+		None if no part comes first.
+		"""
+		hCellCount, vCellCount = geometry
+		top = bottom = None
+		for element in self.elements:
+			x, y, width, height = element.getBounds(hCellCount * DotCanvas.cellWidth, vCellCount * DotCanvas.cellHeight)
+			bounds = element.getPriorityBounds(width, height)
+			if not bounds:
+				continue
+			boundsTop = y + bounds[1]
+			boundsBottom = boundsTop + bounds[3]
+			top = boundsTop if top is None else min(top, boundsTop)
+			bottom = boundsBottom if bottom is None else max(bottom, boundsBottom)
+		if top is None:
+			return None
+		cellHeight = DotCanvas.cellHeight
+		return range(max(0, top // cellHeight), min(vCellCount, (bottom + cellHeight - 1) // cellHeight))
+
+	def terminate(self):
+		""" Stops any background work of the elements, once the scene will no longer be shown."""
+		for element in self.elements:
+			element.terminate()
+
+	def draw(self, width: int, height: int, func_drawDot: Callable[[int, int], None]):
+		for element in self.elements:
+			x, y, elementWidth, elementHeight = element.getBounds(width, height)
+			if x or y:
+				drawDot = lambda dotX, dotY: func_drawDot(x + dotX, y + dotY)  # noqa: E731
+			else:
+				drawDot = func_drawDot
+			element.draw(elementWidth, elementHeight, drawDot)
+
+	def _getContentKey(self, canvas: DotCanvas) -> Optional[str]:
+		contentKeys = []
+		for element in self.elements:
+			x, y, width, height = element.getBounds(canvas.hPixelCount, canvas.vPixelCount)
+			contentKey = element.getContentKey(width, height)
+			if contentKey is None:
+				return None
+			contentKeys.append((type(element).__name__, x, y, width, height, contentKey))
+		return FrameCache.makeKey(self.renderVersion, canvas.geometry, tuple(contentKeys))
+
+	def getFrame(self, geometry: Tuple[int, int]) -> bytes:
+		"""
+		Fetches the packed cells of this scene rasterized for a graphics area of the given size in cells.
+		"""
+		# Keyed and drawn from a snapshot, so that the frame is cached under the state it was drawn at
+		# even if this scene is scrolled or zoomed meanwhile.
+		scene = self.snapshot()
+		key = (geometry, tuple(element.getCacheKey() for element in scene.elements))
+		with self._framesLock:
+			frame = self._frames.get(key)
+			if frame is not None:
+				self._frames.move_to_end(key)
+				return frame
+		canvas = DotCanvas(*geometry)
+		if len(scene.elements) == 1 and scene.elements[0].getBounds(canvas.hPixelCount, canvas.vPixelCount) == (0, 0, canvas.hPixelCount, canvas.vPixelCount):
+			frame = scene.elements[0].getPackedFrame(geometry)
+			if frame is not None:
+				return frame
+		contentKey = scene._getContentKey(canvas) if self.frameCache else None
+		if contentKey:
+			frame = self.frameCache.get(contentKey, expectedSize=len(canvas.data))
+		if frame is None:
+			scene.draw(canvas.hPixelCount, canvas.vPixelCount, canvas.setDot)
+			frame = canvas.getBytes()
+			if contentKey:
+				self.frameCache.put(contentKey, frame)
+		with self._framesLock:
+			self._frames[key] = frame
+			if len(self._frames) > self.maxCachedFrames:
+				self._frames.popitem(last=False)
+		return frame
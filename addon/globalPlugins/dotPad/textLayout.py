@@ -0,0 +1,100 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+
+import threading
+from typing import Callable, Iterable, Iterator, List, Optional
+from .brailleUtils import brailleCellWidth, brailleCellDots, translateTextToCells
+
+# The height of a line of 8 dot braille, plus a row of dots between lines
+brailleLineHeight = 5
+
+
+def wrapCells(cells: bytes, lineLength: int) -> List[bytes]:
+	"""
+	Word wraps a paragraph of braille cells into lines of at most lineLength cells,
+	breaking at blank cells, and breaking words that are longer than a line.
+	"""
+	lines = []
+	line = bytearray()
+	for word in cells.split(b"\x00"):
+		if not word:
+			continue
+		if line and len(line) + 1 + len(word) <= lineLength:
+			line += b"\x00" + word
+			continue
+		if line:
+			lines.append(bytes(line))
+		while len(word) > lineLength:
+			lines.append(word[:lineLength])
+			word = word[lineLength:]
+		line = bytearray(word)
+	if line or not lines:
+		lines.append(bytes(line))
+	return lines
+
+
+class TextLayout:
+	"""
+	Text translated to braille, word wrapped into lines of cells and split into pages.
+	Paragraphs are only translated and wrapped when a line from them is first needed,
+	so the first page of a long document is shown without translating the rest.
+	"""
+
+	def __init__(self, paragraphs: Iterable[str], lineLength: int, linesPerPage: int, brailleTable: Optional[str] = None):
+		self.lineLength = lineLength
+		self.linesPerPage = linesPerPage
+		self.brailleTable = brailleTable
+		self.lines: List[bytes] = []
+		self.isComplete = False
+		self._paragraphs: Iterator[str] = iter(paragraphs)
+		self._lock = threading.Lock()
+
+	def ensureLines(self, count: int) -> int:
+		"""
+		Lays out paragraphs until there are at least count lines or the text ends.
+		@returns: the number of lines laid out.
+		"""
+		with self._lock:
+			while len(self.lines) < count and not self.isComplete:
+				paragraph = next(self._paragraphs, None)
+				if paragraph is None:
+					self.isComplete = True
+					break
+				cells = translateTextToCells(paragraph, brailleTable=self.brailleTable) if paragraph.strip() else b""
+				self.lines.extend(wrapCells(cells, self.lineLength))
+			return len(self.lines)
+
+	def getLines(self, start: int, count: int) -> List[bytes]:
+		self.ensureLines(start + count)
+		return self.lines[start:start + count]
+
+	def getPage(self, page: int) -> List[bytes]:
+		return self.getLines(page * self.linesPerPage, self.linesPerPage)
+
+	def ensurePages(self, count: int) -> int:
+		"""
+		Lays out paragraphs until there are at least count pages or the text ends.
+		@returns: the number of pages laid out, always at least 1.
+		"""
+		lineCount = self.ensureLines(count * self.linesPerPage)
+		return max(1, (lineCount + self.linesPerPage - 1) // self.linesPerPage)
+
+	@property
+	def pageCount(self) -> Optional[int]:
+		""" The number of pages, or None if the text has not all been laid out yet."""
+		if not self.isComplete:
+			return None
+		return max(1, (len(self.lines) + self.linesPerPage - 1) // self.linesPerPage)
+
+
+def drawBrailleLines(func_drawDot: Callable[[int, int], None], x: int, y: int, lines: Iterable[bytes]):
+	""" Draws lines of braille cells, one below the other."""
+	for line in lines:
+		cellX = x
+		for cell in line:
+			for dotX, dotY in brailleCellDots[cell]:
+				func_drawDot(cellX + dotX, y + dotY)
+			cellX += brailleCellWidth
+		y += brailleLineHeight
@@ -0,0 +1,208 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+
+from concurrent.futures import ThreadPoolExecutor
+import ctypes
+from typing import List, Sequence, Tuple
+from . import imageUtils
+from .imageUtils import StretchMode, scaleBrightnessImage, imageToBrightnessRows
+
+
+class TileSource:
+	"""
+	A large grey-scale image that can be read a part at a time.
+	"""
+
+	width: int
+	height: int
+
+	def readTile(self, left: int, top: int, width: int, height: int, maxWidth: int, maxHeight: int) -> Sequence[bytes]:
+		"""
+		Reads a part of the image as rows of brightness values.
+		The source may shrink the part to as little as maxWidth by maxHeight pixels if that is cheaper than reading all of it.
+		"""
+		raise NotImplementedError
+
+
+class ArrayTileSource(TileSource):
+	""" An image already in memory, E.g. for benchmarking without a screen."""
+
+	def __init__(self, rows: Sequence[bytes]):
+		self.rows = rows
+		self.height = len(rows)
+		self.width = len(rows[0]) if rows else 0
+
+	def readTile(self, left: int, top: int, width: int, height: int, maxWidth: int, maxHeight: int) -> Sequence[bytes]:
+		return [row[left:left + width] for row in self.rows[top:top + height]]
+
+
+class ScreenTileSource(TileSource):
+	"""
+	A part of the screen.
+	Each tile is copied from the screen already shrunk to at most a few pixels per dot,
+	so the pixels that must be processed in Python do not grow with the size of the source.
+	"""
+
+	def __init__(self, left: int, top: int, width: int, height: int, stretchMode: StretchMode = StretchMode.HALFTONE):
+		if not imageUtils.gdi32:
+			raise RuntimeError("Screen capture is only available in NVDA")
+		self.left = left
+		self.top = top
+		self.width = width
+		self.height = height
+		self.stretchMode = stretchMode
+
+	def readTile(self, left: int, top: int, width: int, height: int, maxWidth: int, maxHeight: int) -> Sequence[bytes]:
+		user32, gdi32, winGDI = imageUtils.user32, imageUtils.gdi32, imageUtils.winGDI
+		destWidth = min(width, maxWidth)
+		destHeight = min(height, maxHeight)
+		screenDC = user32.GetDC(0)
+		memDC = gdi32.CreateCompatibleDC(screenDC)
+		memBitmap = gdi32.CreateCompatibleBitmap(screenDC, destWidth, destHeight)
+		oldBitmap = gdi32.SelectObject(memDC, memBitmap)
+		try:
+			gdi32.SetStretchBltMode(memDC, self.stretchMode)
+			gdi32.StretchBlt(
+				memDC, 0, 0, destWidth, destHeight,
+				screenDC, self.left + left, self.top + top, width, height,
+				winGDI.SRCCOPY
+			)
+			bmInfo = winGDI.BITMAPINFO()
+			bmInfo.bmiHeader.biSize = ctypes.sizeof(bmInfo)
+			bmInfo.bmiHeader.biWidth = destWidth
+			bmInfo.bmiHeader.biHeight = destHeight * -1
+			bmInfo.bmiHeader.biPlanes = 1
+			bmInfo.bmiHeader.biBitCount = 32
+			bmInfo.bmiHeader.biCompression = winGDI.BI_RGB
+			buffer = ((winGDI.RGBQUAD * destWidth) * destHeight)()
+			gdi32.GetDIBits(memDC, memBitmap, 0, destHeight, buffer, ctypes.byref(bmInfo), winGDI.DIB_RGB_COLORS)
+		finally:
+			gdi32.SelectObject(memDC, oldBitmap)
+			gdi32.DeleteObject(memBitmap)
+			gdi32.DeleteDC(memDC)
+			user32.ReleaseDC(0, screenDC)
+		return imageToBrightnessRows(buffer)
+
+
+class TiledReducer:
+	"""
+	Shrinks a large image to fit a buffer, maintaining the aspect ratio, a tile at a time.
+	Tiles are aligned to the pixels of the buffer, so each buffer pixel comes from exactly one tile,
+	and only a few tiles are held in memory at once however large the source is.
+	Like scaleBrightnessImage, each buffer pixel is the darkest (BLACKONWHITE), brightest (WHITEONBLACK)
+	or average (HALFTONE) of the source pixels it covers,
+	so a source read at full resolution gives exactly the same result as scaleBrightnessImage.
+	"""
+
+	# The most source pixels read for each buffer pixel, in each direction, when the source can shrink tiles itself.
+	oversample = 4
+	# The most source pixels across or down a tile.
+	maxTileSize = 1024
+	maxWorkers = 4
+
+	def __init__(self, source: TileSource, bufferWidth: int, bufferHeight: int, stretchMode: StretchMode = StretchMode.HALFTONE):
+		self.source = source
+		self.bufferWidth = bufferWidth
+		self.bufferHeight = bufferHeight
+		self.stretchMode = stretchMode
+		ratio = max(source.width / bufferWidth, source.height / bufferHeight)
+		self.ratio = ratio
+		self.destWidth = max(1, int(source.width / ratio))
+		self.destHeight = max(1, int(source.height / ratio))
+		self.destX = int((bufferWidth - self.destWidth) / 2)
+		self.destY = int((bufferHeight - self.destHeight) / 2)
+		# Where the source pixels covered by each buffer column and row start
+		self.colStarts = [int(x * source.width / self.destWidth) for x in range(self.destWidth + 1)]
+		self.rowStarts = [int(y * source.height / self.destHeight) for y in range(self.destHeight + 1)]
+
+	@property
+	def bounds(self) -> Tuple[int, int, int, int]:
+		return (self.destX, self.destY, self.destWidth, self.destHeight)
+
+	def _getTiles(self) -> List[Tuple[int, int, int, int]]:
+		""" Each tile as the range of buffer columns and rows it covers: (x0, x1, y0, y1)."""
+		step = max(1, int(self.maxTileSize / self.ratio))
+		return [
+			(x0, min(x0 + step, self.destWidth), y0, min(y0 + step, self.destHeight))
+			for y0 in range(0, self.destHeight, step)
+			for x0 in range(0, self.destWidth, step)
+		]
+
+	def _getSpans(self, starts: List[int], first: int, last: int, size: int) -> List[Tuple[int, int]]:
+		"""
+		The range of pixels within a tile that each buffer column (or row) from first to last covers,
+		where the tile was read as size pixels.
+		"""
+		tileStart = starts[first]
+		tileSize = starts[last] - tileStart
+		if size == tileSize:
+			return [(starts[index] - tileStart, starts[index + 1] - tileStart) for index in range(first, last)]
+		# The source shrank the tile, so share its pixels out evenly.
+		count = last - first
+		return [((index * size) // count, max((index * size) // count + 1, ((index + 1) * size) // count)) for index in range(count)]
+
+	def _reduceTile(self, tile: Tuple[int, int, int, int], buffer: List[bytearray]):
+		x0, x1, y0, y1 = tile
+		left, right = self.colStarts[x0], self.colStarts[x1]
+		top, bottom = self.rowStarts[y0], self.rowStarts[y1]
+		rows = self.source.readTile(
+			left, top, right - left, bottom - top,
+			(x1 - x0) * self.oversample, (y1 - y0) * self.oversample
+		)
+		colSpans = self._getSpans(self.colStarts, x0, x1, len(rows[0]))
+		rowSpans = self._getSpans(self.rowStarts, y0, y1, len(rows))
+		stretchMode = self.stretchMode
+		for y, (rowStart, rowEnd) in enumerate(rowSpans, start=y0):
+			spanRows = rows[rowStart:rowEnd]
+			destRow = buffer[self.destY + y]
+			for x, (colStart, colEnd) in enumerate(colSpans, start=self.destX + x0):
+				if stretchMode == StretchMode.BLACKONWHITE:
+					value = min(min(row[colStart:colEnd]) for row in spanRows)
+				elif stretchMode == StretchMode.WHITEONBLACK:
+					value = max(max(row[colStart:colEnd]) for row in spanRows)
+				else:
+					value = sum(sum(row[colStart:colEnd]) for row in spanRows) // ((colEnd - colStart) * len(spanRows))
+				destRow[x] = value
+
+	def reduce(self) -> Tuple[List[bytearray], Tuple[int, int, int, int]]:
+		"""
+		@returns: the buffer as rows of brightness values, plus the bounds of the image within, as from scaleBrightnessImage.
+		"""
+		source = self.source
+		if self.ratio <= 1:
+			# The source is no larger than the buffer, so there is nothing to tile.
+			rows = source.readTile(0, 0, source.width, source.height, source.width, source.height)
+			return scaleBrightnessImage(rows, source.width, source.height, self.bufferWidth, self.bufferHeight, self.stretchMode)
+		# Areas outside the image are black, as they are in a new bitmap.
+		buffer = [bytearray(self.bufferWidth) for y in range(self.bufferHeight)]
+		tiles = self._getTiles()
+		if len(tiles) == 1 or self.maxWorkers <= 1:
+			for tile in tiles:
+				self._reduceTile(tile, buffer)
+		else:
+			# Tiles write to separate parts of the buffer, and copying from the screen releases the GIL,
+			# so tiles can be read while others are being reduced.
+			with ThreadPoolExecutor(max_workers=self.maxWorkers, thread_name_prefix="DotPad capture") as executor:
+				for future in [executor.submit(self._reduceTile, tile, buffer) for tile in tiles]:
+					future.result()
+		return buffer, self.bounds
+
+
+def captureImageTiled(
+		srcX: int,
+		srcY: int,
+		srcWidth: int,
+		srcHeight: int,
+		bufferWidth: int,
+		bufferHeight: int,
+		stretchMode: StretchMode = StretchMode.HALFTONE
+) -> Tuple[List[bytearray], Tuple[int, int, int, int]]:
+	"""
+	Captures a large part of the screen in tiles, shrinking it to fit the required size while still maintaining the aspect ratio.
+	Unlike captureImage, the result does not depend on how the screen driver shrinks very large areas in one go.
+	@returns: the image as rows of brightness values, plus the bounds of the image within.
+	"""
+	source = ScreenTileSource(srcX, srcY, srcWidth, srcHeight, stretchMode=stretchMode)
+	return TiledReducer(source, bufferWidth, bufferHeight, stretchMode=stretchMode).reduce()
@@ -0,0 +1,86 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+
+from typing import List, NamedTuple, Optional, Sequence
+
+
+class PinLatencyModel(NamedTuple):
+	"""
+	A rough model of how long a DotPad takes to show a frame: a fixed time for each update sent,
+	plus a time for each pin that has to move.
+	Used to decide when a change is large enough to be worth splitting, and to simulate a DotPad when measuring transitions.
+	"""
+
+	updateTime: float = 0.1
+	pinTime: float = 0.002
+
+	def estimate(self, changedPins: int) -> float:
+		""" The seconds taken by an update that moves the given number of pins."""
+		return self.updateTime + (self.pinTime * changedPins)
+
+
+class TransitionStep(NamedTuple):
+	""" One frame to send to the DotPad on the way to showing a new frame."""
+	frame: bytes
+	fullRefresh: bool
+	# The number of pins that move, counting a full refresh as lowering and raising every raised pin
+	changedPins: int
+
+
+def countRaisedPins(data: bytes) -> int:
+	return bin(int.from_bytes(data, "big")).count("1")
+
+
+def getChangedPinsByRow(before: bytes, after: bytes, hCellCount: int) -> List[int]:
+	""" The number of pins that differ between two frames of packed cells, for each row of cells."""
+	changed = (int.from_bytes(before, "big") ^ int.from_bytes(after, "big")).to_bytes(len(before), "big")
+	return [
+		bin(int.from_bytes(changed[start:start + hCellCount], "big")).count("1")
+		for start in range(0, len(changed), hCellCount)
+	]
+
+
+def planTransition(
+		shown: Optional[bytes],
+		target: bytes,
+		hCellCount: int,
+		priorityRows: Optional[Sequence[int]] = None,
+		fullRefresh: bool = False,
+		model: PinLatencyModel = PinLatencyModel()
+) -> List[TransitionStep]:
+	"""
+	Works out the frames to send to a DotPad showing shown, so that it shows target while moving as few pins as possible.
+	Nothing is sent if target is already shown.
+	If priorityRows are given and moving the pins outside them would take longer than an update,
+	a frame with only the priority rows changed is sent first, so that they can be read while the rest of the pins move.
+	The priority rows are then shown sooner by more than the extra update delays the rest.
+	@param shown: the frame the DotPad is showing, or None if that is not known, in which case target is sent as is.
+	@param priorityRows: the rows of cells to show first, E.g. the plot area of a chart before its rulers.
+	@param fullRefresh: when true and target is already shown (E.g. when the user asks again for the same thing),
+		every pin is lowered and raised again, in case any are stuck.
+		A frame that differs from what is shown moves the pins that need to move anyway.
+	"""
+	if shown is None or len(shown) != len(target):
+		return [TransitionStep(target, fullRefresh, countRaisedPins(target))]
+	if shown == target:
+		if fullRefresh:
+			return [TransitionStep(target, True, 2 * countRaisedPins(target))]
+		return []
+	changedPinsByRow = getChangedPinsByRow(shown, target, hCellCount)
+	changedPins = sum(changedPinsByRow)
+	if priorityRows:
+		priorityRows = [row for row in priorityRows if 0 <= row < len(changedPinsByRow)]
+		priorityPins = sum(changedPinsByRow[row] for row in priorityRows)
+		otherPins = changedPins - priorityPins
+		if priorityPins and otherPins and model.pinTime * otherPins > model.updateTime:
+			partial = bytearray(shown)
+			for row in priorityRows:
+				start = row * hCellCount
+				partial[start:start + hCellCount] = target[start:start + hCellCount]
+			return [
+				TransitionStep(bytes(partial), False, priorityPins),
+				TransitionStep(target, False, otherPins),
+			]
+	return [TransitionStep(target, False, changedPins)]
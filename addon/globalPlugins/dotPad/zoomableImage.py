@@ -0,0 +1,163 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from logHandler import log
+from .imageUtils import (
+	StretchMode,
+	scaleBrightnessImage,
+	getIntegralImage,
+	getMonochromeRegionUsingIntegralImage,
+)
+
+
+# The raised dots of a view, relative to its top left corner
+ViewDots = List[Tuple[int, int]]
+
+
+class _Level:
+	""" The captured image shrunk for one zoom level, with its integral image for thresholding."""
+
+	def __init__(self, rows: Sequence[bytes], bounds: Tuple[int, int, int, int]):
+		self.rows = rows
+		self.bounds = bounds
+		self.width = len(rows[0])
+		self.height = len(rows)
+		self.sums = getIntegralImage(rows)
+
+
+class ZoomableImage:
+	"""
+	A high resolution capture of a part of the screen, kept in memory so that it can be zoomed and panned without capturing again.
+	The capture is maxZoom times the size of the view in each direction.
+	Each zoom level is the capture shrunk by a power of 2, made when first needed from the level above it,
+	using the same darkest, brightest or average rule as the capture itself.
+	A view is thresholded from its level's integral image, so each view only costs as much as the dots it contains,
+	and recent views are kept so that returning to them is instant.
+	Views next to the current one can be prefetched on a background thread.
+	"""
+
+	maxCachedViews = 24
+
+	def __init__(
+			self,
+			rows: Sequence[bytes],
+			bounds: Tuple[int, int, int, int],
+			viewWidth: int,
+			viewHeight: int,
+			maxZoom: int,
+			stretchMode: StretchMode = StretchMode.HALFTONE,
+			isWhiteOnBlack: bool = False,
+			blur: int = 3
+	):
+		"""
+		@param rows: the capture, as rows of brightness values, viewWidth * maxZoom by viewHeight * maxZoom pixels.
+		@param bounds: where the image is within the capture, as (left, top, width, height).
+		"""
+		self.viewWidth = viewWidth
+		self.viewHeight = viewHeight
+		self.maxZoom = maxZoom
+		self.stretchMode = stretchMode
+		self.isWhiteOnBlack = isWhiteOnBlack
+		self.blur = blur
+		self._levels: Dict[int, _Level] = {maxZoom: _Level(rows, bounds)}
+		self._views: "OrderedDict[Tuple[int, int, int], ViewDots]" = OrderedDict()
+		self._lock = threading.RLock()
+		self._executor: Optional[ThreadPoolExecutor] = None
+		self._prefetches: List[Future] = []
+		self._isTerminated = False
+
+	def _getLevel(self, zoom: int) -> _Level:
+		with self._lock:
+			level = self._levels.get(zoom)
+			if not level:
+				above = self._getLevel(zoom * 2)
+				rows, imageBounds = scaleBrightnessImage(
+					above.rows, above.width, above.height, above.width // 2, above.height // 2, stretchMode=self.stretchMode
+				)
+				left, top, width, height = above.bounds
+				bounds = (left // 2, top // 2, (left + width + 1) // 2 - left // 2, (top + height + 1) // 2 - top // 2)
+				level = self._levels[zoom] = _Level(rows, bounds)
+			return level
+
+	def getLevelSize(self, zoom: int) -> Tuple[int, int]:
+		return (self.viewWidth * zoom, self.viewHeight * zoom)
+
+	def _makeView(self, zoom: int, viewLeft: int, viewTop: int) -> ViewDots:
+		level = self._getLevel(zoom)
+		imageLeft, imageTop, imageWidth, imageHeight = level.bounds
+		# Only the part of the view that shows the image is thresholded
+		left = max(viewLeft, imageLeft)
+		top = max(viewTop, imageTop)
+		right = min(viewLeft + self.viewWidth, imageLeft + imageWidth)
+		bottom = min(viewTop + self.viewHeight, imageTop + imageHeight)
+		dots = []
+		if right <= left or bottom <= top:
+			return dots
+		monochrome = getMonochromeRegionUsingIntegralImage(
+			level.rows, level.sums, left, top, right - left, bottom - top, blur=self.blur
+		)
+		isWhiteOnBlack = self.isWhiteOnBlack
+		for y, monochromeRow in enumerate(monochrome, start=top - viewTop):
+			for x, isWhite in enumerate(monochromeRow, start=left - viewLeft):
+				if isWhite == isWhiteOnBlack:
+					dots.append((x, y))
+		return dots
+
+	def getView(self, zoom: int, viewLeft: int, viewTop: int) -> ViewDots:
+		"""
+		The raised dots of the view at the given zoom level, whose top left corner is at the given position within that level.
+		"""
+		key = (zoom, viewLeft, viewTop)
+		with self._lock:
+			view = self._views.get(key)
+			if view is not None:
+				self._views.move_to_end(key)
+				return view
+		view = self._makeView(zoom, viewLeft, viewTop)
+		with self._lock:
+			self._views[key] = view
+			while len(self._views) > self.maxCachedViews:
+				self._views.popitem(last=False)
+		return view
+
+	def prefetch(self, views: Iterable[Tuple[int, int, int]]):
+		"""
+		Makes the given views (zoom, left, top) on a background thread, in order,
+		dropping any views from an earlier prefetch that have not been started yet.
+		"""
+		with self._lock:
+			if self._isTerminated:
+				# E.g. a render that was still in progress when the image stopped being shown
+				return
+			for future in self._prefetches:
+				future.cancel()
+			if not self._executor:
+				self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="DotPad prefetch")
+			self._prefetches = [
+				self._executor.submit(self._prefetchView, view)
+				for view in views
+				if view not in self._views
+			]
+
+	def _prefetchView(self, view: Tuple[int, int, int]):
+		try:
+			self.getView(*view)
+		except Exception:
+			log.error("Error prefetching DotPad view", exc_info=True)
+
+	def terminate(self):
+		""" Stops prefetching, once the image will no longer be shown. Views can still be made."""
+		with self._lock:
+			self._isTerminated = True
+			for future in self._prefetches:
+				future.cancel()
+			executor = self._executor
+			self._executor = None
+		if executor:
+			executor.shutdown(wait=False)
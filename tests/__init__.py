@@ -0,0 +1,56 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+"""
+Unit tests for the parts of the add-on that do not need NVDA, run with:
+	python -m unittest discover -s tests -t .
+
+The add-on's modules are loaded as a package named dotPad, so that the NVDA plugin itself (and wx) is never imported.
+NVDA's log is replaced by a stand-in, as is liblouis if it is not installed.
+The DotPad SDK's bindings are loaded, but the SDK itself never is: tests give DotPad a fake SDK instead.
+"""
+
+import ctypes
+import logging
+import os
+import sys
+import types
+
+
+def _installStandIns():
+	if "logHandler" not in sys.modules:
+		class Logger(logging.Logger):
+			def debugWarning(self, msg, *args, **kwargs):
+				self.debug(msg, *args, **kwargs)
+
+		logHandler = types.ModuleType("logHandler")
+		logHandler.log = Logger("dotPad")
+		sys.modules["logHandler"] = logHandler
+	try:
+		import louis  # noqa: F401
+	except ImportError:
+		louis = types.ModuleType("louis")
+		louis.dotsIO = 4
+
+		def translate(tables, text, typeform=None, cursorPos=0, mode=0):
+			# A fixed, distinct cell for each character, with spaces as blank cells
+			cells = [0 if char == " " else ((ord(char) * 37) + 11) & 0xff or 1 for char in text]
+			return cells, list(range(len(text))), list(range(len(text))), cursorPos
+
+		louis.translate = translate
+		sys.modules["louis"] = louis
+	if not hasattr(ctypes, "WINFUNCTYPE"):
+		# Only so that the SDK's bindings can be imported off Windows
+		ctypes.WINFUNCTYPE = ctypes.CFUNCTYPE
+
+
+addonDir = os.path.normpath(os.path.join(
+	os.path.dirname(os.path.abspath(__file__)), os.pardir, "addon", "globalPlugins", "dotPad"
+))
+
+_installStandIns()
+if "dotPad" not in sys.modules:
+	_package = types.ModuleType("dotPad")
+	_package.__path__ = [addonDir]
+	sys.modules["dotPad"] = _package
@@ -0,0 +1,215 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from . import addonDir  # noqa: F401
+from dotPad.pyDotPad import dotPadSdk, DotPad, DotPadError, DotPadErrorCode
+from dotPad.connection import ConnectionState, DotPadConnection
+from dotPad.deviceManager import DeviceManager
+
+
+class FakeSdk(dotPadSdk.DotPadSdk):
+	""" A copy of the SDK that drives an imaginary 30 by 10 cell DotPad, failing to initialize a given number of times."""
+
+	def __init__(self, initFailures=0):
+		self.dllPath = addonDir
+		self.dllDir = addonDir
+		self.ownerRef = None
+		self.initFailures = initFailures
+		self.initCount = 0
+		self.frames = []
+		# Set to make the next output fail as if the device was unplugged
+		self.disconnect = False
+		self._displayCallback = None
+
+	def init(self, portNum):
+		self.initCount += 1
+		if self.initFailures:
+			self.initFailures -= 1
+			raise DotPadError(DotPadErrorCode.COM_PORT_ERROR)
+
+	def getDisplayInfo(self):
+		return 30, 10, 20
+
+	def registerDisplayCallback(self, callback):
+		self._displayCallback = callback
+
+	def registerKeyCallback(self, callback):
+		pass
+
+	def displayData(self, data, length, refresh):
+		if self.disconnect:
+			self.disconnect = False
+			raise DotPadError(DotPadErrorCode.COM_PORT_DISCONNECTED)
+		self.frames.append((data.raw[:length], refresh))
+		self._displayCallback()
+
+	def deinit(self):
+		pass
+
+
+class FakeSdkTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.sdk = FakeSdk()
+		originalGetSdk = dotPadSdk.getSdk
+		dotPadSdk.getSdk = lambda slot=0: self.sdk
+		self.addCleanup(setattr, dotPadSdk, "getSdk", originalGetSdk)
+
+
+class TestDotPad(FakeSdkTestCase):
+
+	def test_failedInitFreesSlot(self):
+		self.sdk.initFailures = 1
+		try:
+			DotPad(3)
+		except DotPadError as e:
+			error = e
+		# The exception's traceback keeps the failed DotPad alive, which must not keep the slot
+		self.assertIsNotNone(error.__traceback__)
+		self.assertIsNone(self.sdk.owner)
+		dp = DotPad(3)
+		self.assertIs(self.sdk.owner, dp)
+		self.assertEqual(dp.geometry, (30, 10))
+		dp.terminate()
+		self.assertIsNone(self.sdk.owner)
+
+	def test_slotInUse(self):
+		dp = DotPad(3)
+		with self.assertRaises(RuntimeError):
+			DotPad(4)
+		dp.terminate()
+
+
+class TestReconnect(FakeSdkTestCase):
+
+	def setUp(self):
+		super().setUp()
+		self.states = []
+		self.connection = DotPadConnection("COM3", stateChangeCallback=lambda connection: self.states.append(connection.state))
+		self.connection.initDelay = 0
+		self.connection.minReconnectDelay = 0.001
+		self.addCleanup(self.connection.terminate)
+
+	def _waitForState(self, state, timeout=5.0):
+		endTime = time.monotonic() + timeout
+		while self.connection.state is not state:
+			self.assertLess(time.monotonic(), endTime, f"still {self.connection.state}")
+			time.sleep(0.001)
+
+	def _loseDevice(self, frame):
+		self.sdk.disconnect = True
+		with self.assertRaises(DotPadError):
+			self.connection.outputFrame(frame)
+		self.assertIs(self.connection.state, ConnectionState.RECONNECTING)
+
+	def test_reconnectsAfterFailedAttempt(self):
+		self.connection.connect()
+		frame = bytes(range(1, 201)) + bytes(100)
+		self._loseDevice(frame)
+		self.sdk.initFailures = 1
+		self._waitForState(ConnectionState.CONNECTED)
+		# One attempt failed and the next one succeeded
+		self.assertEqual(self.connection.reconnectAttempts, 2)
+		self.assertEqual(self.sdk.initCount, 3)
+		self.assertIsNone(self.connection.lastError)
+		# The frame that could not be shown is shown once the device is back
+		self.assertEqual(self.sdk.frames[-1], (frame, True))
+		self.assertEqual(self.states, [ConnectionState.CONNECTED, ConnectionState.RECONNECTING, ConnectionState.CONNECTED])
+
+	def test_lastErrorKeepsNoTraceback(self):
+		self.connection.connect()
+		self._loseDevice(bytes(300))
+		self.sdk.initFailures = 1000
+		endTime = time.monotonic() + 5
+		while self.sdk.initCount < 3:
+			self.assertLess(time.monotonic(), endTime, "stopped trying to reconnect")
+			time.sleep(0.001)
+		lastError = self.connection.lastError
+		self.assertEqual(lastError.code, DotPadErrorCode.COM_PORT_ERROR)
+		self.assertIsNone(lastError.__traceback__)
+		self.sdk.initFailures = 0
+		self._waitForState(ConnectionState.CONNECTED)
+
+	def test_callbackCanUseConnection(self):
+		# A callback that waits for another thread using the connection must not deadlock
+		def onStateChange(connection):
+			thread = threading.Thread(target=lambda: connection.geometry and connection._lock.acquire() and connection._lock.release())
+			thread.start()
+			thread.join(2)
+			self.assertFalse(thread.is_alive())
+		self.connection.stateChangeCallback = onStateChange
+		self.connection.connect()
+		self._loseDevice(bytes(300))
+		self._waitForState(ConnectionState.CONNECTED)
+
+
+class TestDeviceManager(unittest.TestCase):
+
+	def setUp(self):
+		sdks = {}
+		originalGetSdk = dotPadSdk.getSdk
+		dotPadSdk.getSdk = lambda slot=0: sdks.setdefault(slot, FakeSdk())
+		self.addCleanup(setattr, dotPadSdk, "getSdk", originalGetSdk)
+		self.manager = DeviceManager()
+		self.addCleanup(self.manager.terminate)
+
+	def test_connectingDoesNotBlockOtherDevices(self):
+		self.manager.addDevice("COM3")
+		connecting = threading.Event()
+		originalConnect = DotPadConnection.connect
+
+		def slowConnect(connection, wait=False):
+			connecting.set()
+			time.sleep(0.5)
+			return originalConnect(connection, wait)
+
+		DotPadConnection.connect = slowConnect
+		self.addCleanup(setattr, DotPadConnection, "connect", originalConnect)
+		thread = threading.Thread(target=self.manager.addDevice, args=("COM4",))
+		thread.start()
+		self.assertTrue(connecting.wait(2))
+		startTime = time.monotonic()
+		futures = self.manager.displayFrame(lambda size: bytes(size[0] * size[1]))
+		self.assertLess(time.monotonic() - startTime, 0.25)
+		self.assertEqual(list(futures), ["COM3"])
+		thread.join()
+		# The device that was still connecting did not get the slot already in use
+		self.assertEqual({port: c.sdkSlot for port, c in self.manager.connections.items()}, {"COM3": 0, "COM4": 1})
+
+
+class TestCopyDll(unittest.TestCase):
+
+	def setUp(self):
+		tempDir = tempfile.TemporaryDirectory()
+		self.addCleanup(tempDir.cleanup)
+		self.dllPath = os.path.join(tempDir.name, "DotPadSDK.dll")
+		with open(self.dllPath, "wb") as f:
+			f.write(b"old")
+		for name, value in (("_dllPath", self.dllPath), ("_copiesDir", os.path.join(tempDir.name, "copies"))):
+			self.addCleanup(setattr, dotPadSdk, name, getattr(dotPadSdk, name))
+			setattr(dotPadSdk, name, value)
+
+	def test_updatedSdkIsCopiedAgain(self):
+		oldCopy = dotPadSdk._copyDll(1)
+		self.assertEqual(dotPadSdk._copyDll(1), oldCopy)
+		# The same size, but modified later
+		with open(self.dllPath, "wb") as f:
+			f.write(b"new")
+		stat = os.stat(oldCopy)
+		os.utime(self.dllPath, ns=(stat.st_atime_ns, os.stat(self.dllPath).st_mtime_ns + 10 ** 9))
+		newCopy = dotPadSdk._copyDll(1)
+		self.assertNotEqual(newCopy, oldCopy)
+		with open(newCopy, "rb") as f:
+			self.assertEqual(f.read(), b"new")
+		self.assertFalse(os.path.exists(oldCopy))
+		self.assertNotEqual(os.path.dirname(newCopy), os.path.dirname(dotPadSdk.__file__))
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,59 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+import random
+import unittest
+from . import addonDir  # noqa: F401
+from dotPad.brailleUtils import brailleCellWidth, drawBrailleCells, translateLabelToCells
+from dotPad.dataUtils import HistogramChart, QuantileHistogramChart
+
+
+def drawChart(chart):
+	dots = set()
+
+	def drawDot(x, y):
+		# Rulers leave room below them for 6 dot labels only, so dots 7 and 8 of labels may fall below the chart
+		assert 0 <= x < chart.destWidth and 0 <= y <= chart.destHeight, f"({x}, {y}) is off the chart"
+		dots.add((x, y))
+
+	chart.draw(drawDot)
+	return dots
+
+
+def getLabelDots(x, y, label, brailleTable):
+	dots = set()
+	drawBrailleCells(lambda dotX, dotY: dots.add((dotX, dotY)), x, y, translateLabelToCells(label, brailleTable=brailleTable))
+	return dots
+
+
+class TestHistogramRuler(unittest.TestCase):
+
+	def setUp(self):
+		rand = random.Random(1)
+		self.values = [round(rand.uniform(10, 90), 2) for _ in range(200)]
+
+	def test_firstAndLastEdgesLabelled(self):
+		for chartType in (HistogramChart, QuantileHistogramChart):
+			chart = chartType(60, 40, 0, 1, {"a": self.values})
+			dots = drawChart(chart)
+			rulerY = (chart.plotY + chart.plotHeight) - 1
+			edges = chart.histogram.edges
+			self.assertGreater(len(edges), 2)
+			# The labels have as many decimal places as the steps between ticks, which are whole numbers here
+			first = getLabelDots(chart.plotX, rulerY + 2, format(edges[0], ".0f"), chart.labelBrailleTable)
+			self.assertLessEqual(first, dots, chartType.__name__)
+			lastLabel = format(edges[-1], ".0f")
+			rulerEnd = chart.plotX + (len(edges) - 1) * chart.colWidth
+			lastX = (rulerEnd + 1) - (len(translateLabelToCells(lastLabel, brailleTable=chart.labelBrailleTable)) * brailleCellWidth)
+			last = getLabelDots(lastX, rulerY + 2, lastLabel, chart.labelBrailleTable)
+			self.assertLessEqual(last, dots, chartType.__name__)
+
+	def test_singleValueAndBlanks(self):
+		for values in ([3.0] * 5, [None, None]):
+			chart = HistogramChart(40, 20, 0, 1, {"a": values})
+			self.assertTrue(drawChart(chart))
+
+
+if __name__ == "__main__":
+	unittest.main()
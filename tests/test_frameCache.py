@@ -0,0 +1,82 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+import os
+import tempfile
+import unittest
+from . import addonDir  # noqa: F401
+from dotPad.frameCache import FrameCache
+
+
+class TestFrameCache(unittest.TestCase):
+
+	def setUp(self):
+		tempDir = tempfile.TemporaryDirectory()
+		self.addCleanup(tempDir.cleanup)
+		self.directory = tempDir.name
+		self.cache = FrameCache(self.directory, maxBytes=300)
+
+	def _getKeysOnDisk(self):
+		return {fileName[:-len(FrameCache.fileExtension)] for fileName in os.listdir(self.directory)}
+
+	def test_makeKey(self):
+		self.assertEqual(FrameCache.makeKey(b"abc", (30, 10)), FrameCache.makeKey(b"abc", (30, 10)))
+		self.assertNotEqual(FrameCache.makeKey(b"abc", (30, 10)), FrameCache.makeKey(b"abc", (10, 30)))
+		# Parts are kept apart, so moving bytes from one part to the next gives another key
+		self.assertNotEqual(FrameCache.makeKey(b"ab", b"c"), FrameCache.makeKey(b"a", b"bc"))
+
+	def test_getAndPut(self):
+		self.assertIsNone(self.cache.get("a"))
+		self.cache.put("a", b"\x01" * 100)
+		self.assertEqual(self.cache.get("a"), b"\x01" * 100)
+		self.assertEqual(self.cache.get("a", expectedSize=100), b"\x01" * 100)
+		self.assertIsNone(self.cache.get("a", expectedSize=300))
+
+	def test_leastRecentlyUsedEvicted(self):
+		for key in "abc":
+			self.cache.put(key, bytes(100))
+		# Using a makes b the least recently used
+		self.assertIsNotNone(self.cache.get("a"))
+		self.cache.put("d", bytes(100))
+		self.assertIsNone(self.cache.get("b"))
+		self.assertEqual(self._getKeysOnDisk(), {"a", "c", "d"})
+		# Replacing a frame does not count it twice
+		self.cache.put("c", bytes(100))
+		self.assertEqual(self._getKeysOnDisk(), {"a", "c", "d"})
+
+	def test_frameLargerThanCacheKept(self):
+		self.cache.put("a", bytes(100))
+		self.cache.put("b", bytes(1000))
+		self.assertEqual(self._getKeysOnDisk(), {"b"})
+		self.assertEqual(self.cache.get("b"), bytes(1000))
+
+	def test_orderRestoredFromDisk(self):
+		for key in "abc":
+			self.cache.put(key, bytes(100))
+		# Make the order of use on disk c, a, b, without relying on the resolution of the file system's clock
+		for offset, key in enumerate("cab"):
+			os.utime(os.path.join(self.directory, key + FrameCache.fileExtension), (1000 + offset, 1000 + offset))
+		cache = FrameCache(self.directory, maxBytes=300)
+		self.assertEqual(cache.get("b"), bytes(100))
+		cache.put("d", bytes(100))
+		self.assertEqual(self._getKeysOnDisk(), {"a", "b", "d"})
+
+	def test_missingFileForgotten(self):
+		self.cache.put("a", bytes(100))
+		os.remove(os.path.join(self.directory, "a" + FrameCache.fileExtension))
+		self.assertIsNone(self.cache.get("a"))
+		for key in "bcd":
+			self.cache.put(key, bytes(100))
+		self.assertEqual(self._getKeysOnDisk(), {"b", "c", "d"})
+
+	def test_clear(self):
+		for key in "ab":
+			self.cache.put(key, bytes(100))
+		self.cache.clear()
+		self.assertEqual(self._getKeysOnDisk(), set())
+		self.assertIsNone(self.cache.get("a"))
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,99 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+from . import addonDir  # noqa: F401
+from dotPad.frameFile import FrameFile, FrameFileError, convertPngDirectory, convertPngToFrame, writeFrameFile
+
+
+def writeGreyPng(path, rows):
+	""" Writes an 8 bit grey-scale PNG image from rows of brightness values."""
+	def chunk(chunkType, data):
+		return struct.pack(">I", len(data)) + chunkType + data + struct.pack(">I", zlib.crc32(chunkType + data))
+
+	width, height = len(rows[0]), len(rows)
+	raw = b"".join(b"\x00" + bytes(row) for row in rows)
+	with open(path, "wb") as f:
+		f.write(b"\x89PNG\r\n\x1a\n")
+		f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)))
+		f.write(chunk(b"IDAT", zlib.compress(raw)))
+		f.write(chunk(b"IEND", b""))
+
+
+class TestFrameFile(unittest.TestCase):
+
+	def setUp(self):
+		tempDir = tempfile.TemporaryDirectory()
+		self.addCleanup(tempDir.cleanup)
+		self.directory = tempDir.name
+		self.path = os.path.join(self.directory, "frames.dpf")
+
+	def test_roundTrip(self):
+		pages = [bytes(range(index, index + 12)) for index in range(3)]
+		self.assertEqual(writeFrameFile(self.path, (4, 3), pages), 3)
+		frameFile = FrameFile(self.path)
+		self.assertEqual(frameFile.geometry, (4, 3))
+		self.assertEqual(len(frameFile), 3)
+		self.assertEqual(list(frameFile), pages)
+		self.assertEqual(frameFile.readPage(2), pages[2])
+		with self.assertRaises(IndexError):
+			frameFile.readPage(3)
+
+	def test_noPages(self):
+		self.assertEqual(writeFrameFile(self.path, (4, 3), []), 0)
+		self.assertEqual(list(FrameFile(self.path)), [])
+
+	def test_wrongPageSizeKeepsExistingFile(self):
+		writeFrameFile(self.path, (4, 3), [bytes(12)])
+		with self.assertRaises(FrameFileError):
+			writeFrameFile(self.path, (4, 3), [bytes(12), bytes(11)])
+		self.assertEqual(len(FrameFile(self.path)), 1)
+		self.assertEqual(os.listdir(self.directory), ["frames.dpf"])
+
+	def test_invalidFiles(self):
+		writeFrameFile(self.path, (4, 3), [bytes(12)] * 2)
+		with open(self.path, "rb") as f:
+			data = f.read()
+		for name, invalidData in (
+			("short", data[:5]),
+			("magic", b"XXXX" + data[4:]),
+			("version", data[:4] + b"\x02" + data[5:]),
+			("truncated", data[:-1]),
+		):
+			with self.subTest(name):
+				with open(self.path, "wb") as f:
+					f.write(invalidData)
+				with self.assertRaises(FrameFileError):
+					FrameFile(self.path)
+
+	def test_convertPngDirectory(self):
+		sourceDir = os.path.join(self.directory, "lesson")
+		os.mkdir(sourceDir)
+		white = [255] * 16
+		black = [0] * 16
+		# A black square in the top left of a white image, and an all white image
+		writeGreyPng(os.path.join(sourceDir, "B.png"), [white] * 16)
+		writeGreyPng(os.path.join(sourceDir, "a.png"), [black[:8] + white[:8]] * 8 + [white] * 8)
+		destDir = os.path.join(self.directory, "frames")
+		paths = convertPngDirectory(sourceDir, destDir, (4, 2), combine=True)
+		self.assertEqual(paths, [os.path.join(destDir, "lesson.dpf")])
+		frameFile = FrameFile(paths[0])
+		self.assertEqual(frameFile.geometry, (4, 2))
+		pages = list(frameFile)
+		# Pages are in file name order, ignoring case
+		self.assertEqual(pages, [
+			convertPngToFrame(os.path.join(sourceDir, name), (4, 2)) for name in ("a.png", "B.png")
+		])
+		self.assertTrue(any(pages[0]))
+		self.assertFalse(any(pages[1]))
+		paths = convertPngDirectory(sourceDir, destDir, (4, 2))
+		self.assertEqual(sorted(os.path.basename(path) for path in paths), ["B.dpf", "a.dpf"])
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,71 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+import tempfile
+import threading
+import unittest
+from . import addonDir  # noqa: F401
+from dotPad.profiling import OperationProfiler
+
+
+class TestOperationProfiler(unittest.TestCase):
+
+	def setUp(self):
+		tempDir = tempfile.TemporaryDirectory()
+		self.addCleanup(tempDir.cleanup)
+		self.profiler = OperationProfiler()
+		self.profiler.outputDir = tempDir.name
+		self.saved = []
+		self.profiler.onSaved = self.saved.append
+
+	def test_savesOnceOperationsAreDone(self):
+		self.profiler.arm(2)
+		for name in ("first", "second"):
+			with self.profiler.profile(name):
+				pass
+		self.assertFalse(self.profiler.isArmed)
+		self.assertEqual(len(self.saved), 1)
+		with open(self.saved[0][2], encoding="utf-8") as f:
+			summary = f.read()
+		self.assertIn("first: ", summary)
+		self.assertIn("second: ", summary)
+
+	def test_disarmDuringOperationSavesOnce(self):
+		self.profiler.arm(5)
+		with self.profiler.profile("done"):
+			pass
+		started = threading.Event()
+		finish = threading.Event()
+
+		def run():
+			with self.profiler.profile("running"):
+				started.set()
+				finish.wait(5)
+
+		thread = threading.Thread(target=run)
+		thread.start()
+		self.assertTrue(started.wait(5))
+		self.assertEqual(self.profiler.disarm(), [])
+		self.assertFalse(self.profiler.isArmed)
+		finish.set()
+		thread.join()
+		self.assertEqual(len(self.saved), 1)
+		with open(self.saved[0][2], encoding="utf-8") as f:
+			summary = f.read()
+		self.assertIn("done: ", summary)
+		self.assertIn("running: ", summary)
+		# Nothing is left to save
+		self.assertEqual(self.profiler.disarm(), [])
+
+	def test_disarmSavesWhenIdle(self):
+		self.profiler.arm(5)
+		with self.profiler.profile("done"):
+			pass
+		paths = self.profiler.disarm()
+		self.assertEqual(len(paths), 3)
+		self.assertEqual(self.saved, [])
+
+
+if __name__ == "__main__":
+	unittest.main()
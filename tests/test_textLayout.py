@@ -0,0 +1,59 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+import unittest
+from . import addonDir  # noqa: F401
+from dotPad.textLayout import TextLayout, wrapCells
+
+
+class TestWrapCells(unittest.TestCase):
+
+	def test_wrapsAtBlankCells(self):
+		cells = b"\x01\x02\x00\x03\x04\x05\x00\x06"
+		self.assertEqual(wrapCells(cells, 6), [b"\x01\x02\x00\x03\x04\x05", b"\x06"])
+		self.assertEqual(wrapCells(cells, 5), [b"\x01\x02", b"\x03\x04\x05\x00\x06"])
+
+	def test_fitsExactly(self):
+		self.assertEqual(wrapCells(b"\x01\x02\x00\x03", 4), [b"\x01\x02\x00\x03"])
+
+	def test_breaksLongWords(self):
+		self.assertEqual(wrapCells(b"\x01" * 7 + b"\x00\x02", 3), [b"\x01" * 3, b"\x01" * 3, b"\x01\x00\x02"])
+		self.assertEqual(wrapCells(b"\x01\x00" + b"\x02" * 6, 3), [b"\x01", b"\x02" * 3, b"\x02" * 3])
+
+	def test_collapsesRunsOfBlanks(self):
+		self.assertEqual(wrapCells(b"\x00\x00\x01\x00\x00\x00\x02\x00", 10), [b"\x01\x00\x02"])
+
+	def test_emptyParagraph(self):
+		# An empty paragraph still takes up a line
+		self.assertEqual(wrapCells(b"", 10), [b""])
+		self.assertEqual(wrapCells(b"\x00\x00", 10), [b""])
+
+
+class TestTextLayout(unittest.TestCase):
+
+	def test_paragraphsLaidOutAsNeeded(self):
+		read = []
+
+		def paragraphs():
+			for index in range(100):
+				read.append(index)
+				yield f"paragraph {index}"
+
+		layout = TextLayout(paragraphs(), lineLength=20, linesPerPage=2)
+		self.assertEqual(len(layout.getPage(0)), 2)
+		self.assertEqual(read, [0, 1])
+		self.assertIsNone(layout.pageCount)
+		self.assertEqual(layout.ensurePages(1000), 50)
+		self.assertEqual(layout.pageCount, 50)
+
+	def test_blankLinesKept(self):
+		layout = TextLayout(["a", "", "b"], lineLength=10, linesPerPage=5)
+		lines = layout.getPage(0)
+		self.assertEqual(len(lines), 3)
+		self.assertEqual(lines[1], b"")
+		self.assertEqual(layout.pageCount, 1)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,64 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+import unittest
+from . import addonDir  # noqa: F401
+from dotPad.transitions import PinLatencyModel, TransitionStep, getChangedPinsByRow, planTransition
+
+
+# A 4 by 3 cell display
+hCellCount = 4
+blank = bytes(12)
+
+
+def makeFrame(*rows):
+	return b"".join(bytes(row) for row in rows)
+
+
+class TestPlanTransition(unittest.TestCase):
+
+	def test_unknownShownFrame(self):
+		target = makeFrame([0xff, 0, 0, 0], [0, 0, 0, 0], [1, 0, 0, 0])
+		self.assertEqual(planTransition(None, target, hCellCount), [TransitionStep(target, False, 9)])
+		# A frame of another size is as good as unknown
+		self.assertEqual(planTransition(bytes(6), target, hCellCount, fullRefresh=True), [TransitionStep(target, True, 9)])
+
+	def test_alreadyShown(self):
+		frame = makeFrame([3, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0])
+		self.assertEqual(planTransition(frame, frame, hCellCount), [])
+		# Refreshing lowers and raises every raised pin
+		self.assertEqual(planTransition(frame, frame, hCellCount, fullRefresh=True), [TransitionStep(frame, True, 4)])
+
+	def test_onlyChangedPinsMove(self):
+		shown = makeFrame([0xff, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0])
+		target = makeFrame([0x0f, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 1])
+		self.assertEqual(getChangedPinsByRow(shown, target, hCellCount), [4, 0, 1])
+		# A change to a frame that is shown moves only the pins that differ, even when a full refresh is asked for
+		self.assertEqual(planTransition(shown, target, hCellCount, fullRefresh=True), [TransitionStep(target, False, 5)])
+
+	def test_priorityRowsFirst(self):
+		model = PinLatencyModel(updateTime=0.1, pinTime=0.01)
+		target = makeFrame([0xff] * 4, [0x01, 0, 0, 0], [0xff] * 4)
+		steps = planTransition(blank, target, hCellCount, priorityRows=[1], model=model)
+		self.assertEqual(steps, [
+			TransitionStep(makeFrame([0] * 4, [0x01, 0, 0, 0], [0] * 4), False, 1),
+			TransitionStep(target, False, 64),
+		])
+
+	def test_smallChangeNotSplit(self):
+		# Moving the other pins takes less time than another update
+		model = PinLatencyModel(updateTime=0.1, pinTime=0.01)
+		target = makeFrame([0x01, 0, 0, 0], [0x03, 0, 0, 0], [0, 0, 0, 0])
+		self.assertEqual(planTransition(blank, target, hCellCount, priorityRows=[1], model=model), [TransitionStep(target, False, 3)])
+
+	def test_priorityRowsUnchangedOrOutOfRange(self):
+		model = PinLatencyModel(updateTime=0.1, pinTime=0.001)
+		target = makeFrame([0xff] * 4, [0xff] * 4, [0, 0, 0, 0])
+		shown = makeFrame([0] * 4, [0] * 4, [0, 0, 0, 0])
+		# Nothing changes in the priority rows, so there is nothing to show first
+		self.assertEqual(planTransition(shown, target, hCellCount, priorityRows=[2, 5, -1], model=model), [TransitionStep(target, False, 64)])
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,541 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+"""
+Golden-frame regression harness for the add-on's rendering code.
+Renders a fixed corpus of charts, drawing primitives and images, and compares the frames against references
+recorded earlier, so that optimizations can be checked to raise exactly the same dots.
+
+Typical use:
+	python tools/goldenFrames.py record   (on the code before the change)
+	python tools/goldenFrames.py check    (on the code after the change)
+
+check fails if any frame differs, unless the case is given a tolerance, E.g. for an algorithm that was changed on purpose:
+	python tools/goldenFrames.py check --tolerance "image-*=0.02"
+allows up to 2% of the dots in each frame of the image cases to differ.
+Both commands time every case, and check reports the speed of each case relative to the reference.
+
+This runs anywhere Python does, without NVDA, liblouis or a DotPad:
+liblouis, NVDA's log and the DotPad SDK are replaced by the stand-ins below,
+and the parts of the add-on that need wx are never imported.
+Braille labels therefore come from a fixed stand-in table rather than a real braille table,
+which is fine for comparing one version of the rendering code with another.
+"""
+
+import argparse
+from fnmatch import fnmatch
+import json
+import logging
+import math
+import os
+import random
+import struct
+import sys
+import tempfile
+import threading
+import time
+import types
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import zlib
+
+
+def _installStandIns():
+	louis = types.ModuleType("louis")
+	louis.dotsIO = 4
+
+	def translate(tables, text, typeform=None, cursorPos=0, mode=0):
+		# A fixed, distinct cell for each character
+		cells = [((ord(char) * 37) + 11) & 0xff for char in text]
+		return cells, list(range(len(text))), list(range(len(text))), cursorPos
+
+	louis.translate = translate
+	sys.modules["louis"] = louis
+
+	class Logger(logging.Logger):
+		def debugWarning(self, msg, *args, **kwargs):
+			self.debug(msg, *args, **kwargs)
+
+	logHandler = types.ModuleType("logHandler")
+	logHandler.log = Logger("dotPad")
+	sys.modules["logHandler"] = logHandler
+
+
+_addonDir = os.path.normpath(os.path.join(
+	os.path.dirname(os.path.abspath(__file__)), os.pardir, "addon", "globalPlugins", "dotPad"
+))
+
+
+def _loadAddonModules():
+	# The rendering modules are loaded as a package of their own, so that the NVDA plugin itself is never imported.
+	package = types.ModuleType("dotPad")
+	package.__path__ = [_addonDir]
+	sys.modules["dotPad"] = package
+	pyDotPad = types.ModuleType("dotPad.pyDotPad")
+	pyDotPad.DotPadError = _FakeDotPadError
+	pyDotPad.DotPadErrorCode = None
+	pyDotPad.connectionLostErrorCodes = frozenset()
+	pyDotPad.DotPad = _FakeDotPad
+	sys.modules["dotPad.pyDotPad"] = pyDotPad
+
+
+class _FakeDotPadError(Exception):
+	pass
+
+
+class _FakeDotPad:
+	""" Stands in for a DotPad, keeping the last frame output."""
+
+	geometries: Dict[int, Tuple[int, int]] = {}
+	outputFrames: Dict[int, bytes] = {}
+
+	def __init__(self, portNum, keyCallback=None, sdkSlot=0):
+		self.portNum = portNum
+		self.hCellCount, self.vCellCount = self.geometries.get(portNum, (30, 10))
+		self._data = bytes(self.hCellCount * self.vCellCount)
+
+	@property
+	def geometry(self):
+		return (self.hCellCount, self.vCellCount)
+
+	def getDataBuffer(self) -> bytes:
+		return self._data
+
+	def setDataBuffer(self, data: bytes):
+		self._data = bytes(data[:self.hCellCount * self.vCellCount])
+
+	def outputDataBuffer(self, fullRefresh=False) -> bool:
+		self.outputFrames[self.portNum] = self._data
+		return True
+
+	def terminate(self):
+		pass
+
+
+_installStandIns()
+_loadAddonModules()
+
+from dotPad.canvas import DotCanvas  # noqa: E402
+from dotPad import dataUtils, brailleUtils, imageUtils, frameFile, scene, tiledCapture  # noqa: E402
+from dotPad.preview import diffFrames, frameToUnicodeBraille  # noqa: E402
+
+
+class Case(NamedTuple):
+	name: str
+	geometry: Tuple[int, int]
+	# Renders the pages of the case
+	render: Callable[[], List[bytes]]
+	# The fraction of the dots in a frame that may differ from the reference
+	tolerance: float = 0.0
+
+
+geometries = [(30, 10), (20, 5), (48, 16)]
+
+
+def _makeValues(rng: random.Random, count: int, kind: str) -> List[Optional[float]]:
+	if kind == "wave":
+		return [50 + 40 * math.sin(index / 7) + rng.uniform(-5, 5) for index in range(count)]
+	if kind == "mixed":
+		return [rng.uniform(-120, 80) for index in range(count)]
+	if kind == "small":
+		return [rng.uniform(0.001, 0.009) for index in range(count)]
+	if kind == "gaps":
+		return [None if rng.random() < 0.2 else rng.uniform(0, 1000) for index in range(count)]
+	if kind == "flat":
+		return [42.0] * count
+	raise ValueError(kind)
+
+
+def _renderChart(geometry, chartType, datasets, showVerticalRuler, showHorizontalRuler, views=((0, None),)):
+	element = scene.ChartElement(
+		chartType, *dataUtils.getDatasetsRange(datasets.values()), datasets,
+		showVerticalRuler=showVerticalRuler, showHorizontalRuler=showHorizontalRuler
+	)
+	canvas = DotCanvas(*geometry)
+	pages = []
+	if chartType is dataUtils.BarChart:
+		while True:
+			canvas.reset()
+			element.draw(canvas.hPixelCount, canvas.vPixelCount, canvas.setDot)
+			pages.append(canvas.getBytes())
+			if not element.scroll(canvas.hPixelCount, canvas.vPixelCount):
+				break
+	else:
+		for start, end in views:
+			element.colStartOffset = start
+			element.viewEnd = end
+			canvas.reset()
+			element.draw(canvas.hPixelCount, canvas.vPixelCount, canvas.setDot)
+			pages.append(canvas.getBytes())
+	return pages
+
+
+def _makeChartCases() -> List[Case]:
+	cases = []
+	rulerOptions = [(True, True), (False, False), (True, False)]
+	for geometry in geometries:
+		for chartType, lengths in ((dataUtils.BarChart, (5, 26, 120)), (dataUtils.LineChart, (5, 200, 5000))):
+			for length in lengths:
+				for kind in ("wave", "mixed", "small", "gaps", "flat"):
+					for numDatasets in (1, 3):
+						for showVerticalRuler, showHorizontalRuler in rulerOptions:
+							name = (
+								f"chart-{chartType.__name__}-{geometry[0]}x{geometry[1]}-{kind}-n{length}-d{numDatasets}"
+								f"-{'v' if showVerticalRuler else ''}{'h' if showHorizontalRuler else ''}"
+							)
+							rng = random.Random(name)
+							datasets = {
+								f"Series {index + 1}": dataUtils.Dataset(_makeValues(rng, length, kind))
+								for index in range(numDatasets)
+							}
+							views = ((0, None), (length // 4, length // 4 + max(4, length // 10)), (length - 4, length))
+							cases.append(Case(name, geometry, (
+								lambda geometry=geometry, chartType=chartType, datasets=datasets,
+								v=showVerticalRuler, h=showHorizontalRuler, views=views:
+								_renderChart(geometry, chartType, datasets, v, h, views)
+							)))
+	return cases
+
+
+def _renderPrimitives(geometry, seed) -> List[bytes]:
+	rng = random.Random(seed)
+	canvas = DotCanvas(*geometry)
+	width, height = canvas.hPixelCount, canvas.vPixelCount
+	pages = []
+	for fillBelowCurve in (False, True):
+		canvas.reset()
+		values = [rng.uniform(-1, 1) for index in range(rng.randrange(2, 300))]
+		dataUtils.drawContinuousDataset(canvas.setDot, 1, 2, width - 2, height - 3, -1, 1, values, fillBelowCurve=fillBelowCurve)
+		pages.append(canvas.getBytes())
+	canvas.reset()
+	values = [rng.uniform(0, 10) if rng.random() > 0.1 else math.nan for index in range(width // 4)]
+	dataUtils.drawDiscreteDataset(canvas.setDot, 0, 0, width, height, 0, 10, values, 2, 4)
+	pages.append(canvas.getBytes())
+	canvas.reset()
+	start = rng.randrange(0, 700)
+	dataUtils.drawHorizontalRuler(canvas.setDot, 0, height - 5, start, start + 12, rng.choice((4, 7, 10)))
+	dataUtils.drawVerticalRuler(canvas.setDot, 0, 0, rng.uniform(-100, 0), rng.uniform(1, 100), height // 4)
+	pages.append(canvas.getBytes())
+	canvas.reset()
+	cells = [rng.randrange(256) for index in range(width // brailleUtils.brailleCellWidth)]
+	for y in range(0, height - 3, 4):
+		brailleUtils.drawBrailleCells(canvas.setDot, y % 3, y, cells)
+		cells = cells[1:] + cells[:1]
+	pages.append(canvas.getBytes())
+	return pages
+
+
+def _makePrimitiveCases() -> List[Case]:
+	return [
+		Case(f"primitives-{geometry[0]}x{geometry[1]}-{seed}", geometry, (
+			lambda geometry=geometry, seed=seed: _renderPrimitives(geometry, f"primitives-{seed}")
+		))
+		for geometry in geometries
+		for seed in range(8)
+	]
+
+
+def _makeBrightnessImage(kind: str, width: int, height: int, seed: str) -> List[bytes]:
+	rng = random.Random(seed)
+	rows = []
+	for y in range(height):
+		row = bytearray(width)
+		for x in range(width):
+			if kind == "gradient":
+				value = (x * 255) // max(1, width - 1)
+			elif kind == "checker":
+				value = 255 if ((x // 6) + (y // 6)) % 2 else 0
+			elif kind == "circle":
+				value = 0 if (x - width / 2) ** 2 + (y - height / 2) ** 2 < (min(width, height) / 3) ** 2 else 230
+			elif kind == "noise":
+				value = rng.randrange(256)
+			elif kind == "text":
+				# Dark strokes on a light background, like printed text
+				value = 20 if (y // 3) % 4 == 1 and (x // 2) % 5 != 0 else 240
+			else:
+				raise ValueError(kind)
+			row[x] = value
+		rows.append(bytes(row))
+	return rows
+
+
+class _Rgbquad(NamedTuple):
+	rgbBlue: int
+	rgbGreen: int
+	rgbRed: int
+	rgbReserved: int = 0
+
+
+def _renderScreenImage(geometry, rows, isWhiteOnBlack) -> List[bytes]:
+	# The conversion done for a part of the screen, on an image as captureImage would return it.
+	canvas = DotCanvas(*geometry)
+	stretchMode = imageUtils.StretchMode.WHITEONBLACK if isWhiteOnBlack else imageUtils.StretchMode.BLACKONWHITE
+	greyRows, (left, top, width, height) = imageUtils.scaleBrightnessImage(
+		rows, len(rows[0]), len(rows), canvas.hPixelCount, canvas.vPixelCount, stretchMode=stretchMode
+	)
+	image = [[_Rgbquad(value, value, value) for value in row] for row in greyRows]
+	for y in range(top, top + height):
+		for x in range(left, left + width):
+			isWhite = imageUtils.getMonochromePixelUsingLocalBrightnessThreshold(image, x, y, blur=3)
+			isRaised = isWhite if isWhiteOnBlack else not isWhite
+			if isRaised:
+				canvas.setDot(x, y)
+	return [canvas.getBytes()]
+
+
+def _writePng(path: str, rows: List[bytes]):
+	def chunk(chunkType, data):
+		return struct.pack(">I", len(data)) + chunkType + data + struct.pack(">I", zlib.crc32(chunkType + data))
+	header = struct.pack(">IIBBBBB", len(rows[0]), len(rows), 8, 0, 0, 0, 0)
+	data = zlib.compress(b"".join(b"\x00" + row for row in rows))
+	with open(path, "wb") as f:
+		f.write(b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", data) + chunk(b"IEND", b""))
+
+
+def _renderPngImage(geometry, rows, isWhiteOnBlack, workDir) -> List[bytes]:
+	path = os.path.join(workDir, f"image-{threading.get_ident()}.png")
+	_writePng(path, rows)
+	try:
+		return [frameFile.convertPngToFrame(path, geometry, isWhiteOnBlack=isWhiteOnBlack)]
+	finally:
+		os.remove(path)
+
+
+def _makeImageCases(workDir: str) -> List[Case]:
+	cases = []
+	for geometry in geometries:
+		for kind in ("gradient", "checker", "circle", "noise", "text"):
+			for width, height in ((90, 70), (300, 120), (40, 200)):
+				for isWhiteOnBlack in (False, True):
+					name = f"image-{geometry[0]}x{geometry[1]}-{kind}-{width}x{height}-{'wob' if isWhiteOnBlack else 'bow'}"
+					rows = _makeBrightnessImage(kind, width, height, name)
+					cases.append(Case(name + "-screen", geometry, (
+						lambda geometry=geometry, rows=rows, wob=isWhiteOnBlack: _renderScreenImage(geometry, rows, wob)
+					)))
+					cases.append(Case(name + "-png", geometry, (
+						lambda geometry=geometry, rows=rows, wob=isWhiteOnBlack: _renderPngImage(geometry, rows, wob, workDir)
+					)))
+	return cases
+
+
+def _renderThroughPipeline(geometries: List[Tuple[int, int]], datasets) -> List[bytes]:
+	""" Outputs a chart to several stand-in DotPads through the render pipeline, returning what each was sent."""
+	from dotPad.deviceManager import DeviceManager
+	from dotPad.renderPipeline import RenderPipeline, RenderJob
+	from dotPad.connection import DotPadConnection
+	ports = [f"COM{index + 1}" for index in range(len(geometries))]
+	_FakeDotPad.geometries = {index + 1: geometry for index, geometry in enumerate(geometries)}
+	_FakeDotPad.outputFrames = {}
+	devices = DeviceManager()
+	pipeline = RenderPipeline(devices)
+	done = threading.Event()
+	try:
+		for port in ports:
+			devices.addDevice(port)
+		chart = scene.ChartElement(dataUtils.LineChart, *dataUtils.getDatasetsRange(datasets.values()), datasets)
+		outputs = []
+
+		def onOutput(futures):
+			outputs.extend(futures.values())
+			done.set()
+
+		def onError(e):
+			outputs.append(e)
+			done.set()
+
+		pipeline.submit(RenderJob(lambda: scene.Scene([chart]), onOutput=onOutput, onError=onError))
+		if not done.wait(60):
+			raise RuntimeError("Render pipeline did not finish")
+		for output in outputs:
+			if isinstance(output, Exception):
+				raise output
+			output.result(60)
+	finally:
+		pipeline.terminate()
+		devices.terminate()
+	return [_FakeDotPad.outputFrames[int(port[3:])] for port in ports]
+
+
+def _makePipelineCases() -> List[Case]:
+	cases = []
+	for seed in range(4):
+		name = f"pipeline-mirrored-{seed}"
+		rng = random.Random(name)
+		datasets = {"Series": dataUtils.Dataset(_makeValues(rng, 500, "wave"))}
+		# Frames of several sizes are stored as pages of the largest size, padded with blank cells.
+		cases.append(Case(name, (48, 16), (
+			lambda datasets=datasets: [
+				frame + bytes(48 * 16 - len(frame))
+				for frame in _renderThroughPipeline([(30, 10), (48, 16), (30, 10)], datasets)
+			]
+		)))
+	return cases
+
+
+def _makeLargeImage(kind: str, width: int, height: int, seed: str) -> List[bytes]:
+	""" A screen-sized image, built from a few distinct rows so that it is quick to make."""
+	rng = random.Random(seed)
+	if kind == "window":
+		# A light window with dark lines of text and a dark border
+		border = bytes(width)
+		blank = b"\x00" + b"\xf0" * (width - 2) + b"\x00"
+		textRows = [
+			b"\x00" + bytes(20 if (x // 7) % 9 and rng.random() < 0.7 else 240 for x in range(width - 2)) + b"\x00"
+			for index in range(8)
+		]
+		rows = [border]
+		for y in range(1, height - 1):
+			rows.append(textRows[(y // 3) % len(textRows)] if (y // 12) % 2 else blank)
+		rows.append(border)
+		return rows
+	if kind == "photo":
+		patterns = [bytes(rng.randrange(256) for x in range(width)) for index in range(32)]
+		return [patterns[rng.randrange(len(patterns))] for y in range(height)]
+	raise ValueError(kind)
+
+
+def _renderTiledImage(geometry, rows, stretchMode, maxTileSize) -> List[bytes]:
+	canvas = DotCanvas(*geometry)
+	reducer = tiledCapture.TiledReducer(
+		tiledCapture.ArrayTileSource(rows), canvas.hPixelCount, canvas.vPixelCount, stretchMode=stretchMode
+	)
+	reducer.maxTileSize = maxTileSize
+	greyRows, bounds = reducer.reduce()
+	imageUtils.drawMonochromeImage(greyRows, bounds, canvas.setDot, isWhiteOnBlack=stretchMode == imageUtils.StretchMode.WHITEONBLACK)
+	return [canvas.getBytes()]
+
+
+def _makeTiledCases() -> List[Case]:
+	cases = []
+	for width, height in ((3840, 2160), (1920, 1080), (800, 3000)):
+		for kind in ("window", "photo"):
+			name = f"tiled-{kind}-{width}x{height}"
+			rows = _makeLargeImage(kind, width, height, name)
+			for stretchMode in imageUtils.StretchMode:
+				for maxTileSize in (256, 1024):
+					cases.append(Case(f"{name}-{stretchMode.name.lower()}-t{maxTileSize}", (30, 10), (
+						lambda rows=rows, stretchMode=stretchMode, maxTileSize=maxTileSize:
+						_renderTiledImage((30, 10), rows, stretchMode, maxTileSize)
+					)))
+	return cases
+
+
+def makeCorpus(workDir: str) -> List[Case]:
+	return (
+		_makeChartCases() + _makePrimitiveCases() + _makeImageCases(workDir) + _makeTiledCases() + _makePipelineCases()
+	)
+
+
+def _timeCase(case: Case, repeat: int) -> Tuple[List[bytes], float]:
+	best = math.inf
+	pages = []
+	for index in range(repeat):
+		# Start each run with cold caches, as the first render of a chart would
+		dataUtils.layoutValueAxis.cache_clear()
+		start = time.perf_counter()
+		pages = case.render()
+		best = min(best, time.perf_counter() - start)
+	return pages, best
+
+
+def _manifestPath(directory: str) -> str:
+	return os.path.join(directory, "manifest.json")
+
+
+def record(cases: List[Case], directory: str, repeat: int) -> int:
+	os.makedirs(directory, exist_ok=True)
+	manifest = {}
+	totalTime = 0.0
+	for case in cases:
+		pages, seconds = _timeCase(case, repeat)
+		frameFile.writeFrameFile(os.path.join(directory, case.name + frameFile.fileExtension), case.geometry, pages)
+		manifest[case.name] = {"seconds": seconds, "pages": len(pages)}
+		totalTime += seconds
+	with open(_manifestPath(directory), "w") as f:
+		json.dump(manifest, f, indent="\t", sort_keys=True)
+	print(f"Recorded {len(cases)} cases in {directory}, rendering took {totalTime:.3f} s")
+	return 0
+
+
+def check(cases: List[Case], directory: str, repeat: int, tolerances: List[Tuple[str, float]], verbose: bool) -> int:
+	with open(_manifestPath(directory)) as f:
+		manifest = json.load(f)
+	failures = 0
+	totalRefTime = totalTime = 0.0
+	for case in cases:
+		ref = manifest.get(case.name)
+		if ref is None:
+			print(f"{case.name}: no reference, record again")
+			failures += 1
+			continue
+		tolerance = case.tolerance
+		for pattern, patternTolerance in tolerances:
+			if fnmatch(case.name, pattern):
+				tolerance = patternTolerance
+		refPages = list(frameFile.FrameFile(os.path.join(directory, case.name + frameFile.fileExtension)))
+		pages, seconds = _timeCase(case, repeat)
+		totalRefTime += ref["seconds"]
+		totalTime += seconds
+		problems = []
+		if len(pages) != len(refPages):
+			problems.append(f"{len(pages)} pages, expected {len(refPages)}")
+		for index, (refPage, page) in enumerate(zip(refPages, pages)):
+			diff = diffFrames(refPage, page, case.geometry[0])
+			if diff.isIdentical:
+				continue
+			changedFraction = (diff.dotsRaised + diff.dotsLowered) / (len(page) * 8)
+			if changedFraction <= tolerance:
+				continue
+			problems.append(f"page {index + 1}: {diff}")
+			if verbose:
+				problems.append("Changed dots:\n" + frameToUnicodeBraille(diff.changedDots, case.geometry[0]))
+		speed = ref["seconds"] / seconds if seconds else math.inf
+		if problems:
+			failures += 1
+			print(f"FAIL {case.name}:\n" + "\n".join(problems))
+		elif verbose:
+			print(f"ok   {case.name}: {ref['seconds'] * 1000:.2f} ms -> {seconds * 1000:.2f} ms ({speed:.2f}x)")
+	overallSpeed = totalRefTime / totalTime if totalTime else math.inf
+	print(
+		f"{len(cases) - failures} of {len(cases)} cases match. "
+		f"Rendering took {totalTime:.3f} s, reference {totalRefTime:.3f} s ({overallSpeed:.2f}x)"
+	)
+	return 1 if failures else 0
+
+
+def _parseTolerance(text: str) -> Tuple[str, float]:
+	pattern, sep, fraction = text.rpartition("=")
+	try:
+		return pattern, float(fraction)
+	except ValueError:
+		raise argparse.ArgumentTypeError(f"Expected PATTERN=FRACTION, got {text}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+	parser = argparse.ArgumentParser(description="Record or check golden frames for the DotPad rendering code.")
+	parser.add_argument("command", choices=("record", "check", "list"))
+	parser.add_argument(
+		"--dir", default=os.path.join(tempfile.gettempdir(), "dotPadGoldenFrames"),
+		help="where the reference frames are kept, outside the source tree by default so that they survive switching branches"
+	)
+	parser.add_argument("-k", "--filter", default="*", help="only run cases whose names match this pattern")
+	parser.add_argument("--repeat", type=int, default=3, help="times to render each case, keeping the fastest time")
+	parser.add_argument(
+		"--tolerance", type=_parseTolerance, action="append", default=[],
+		help="PATTERN=FRACTION: the fraction of dots allowed to differ in cases matching the pattern"
+	)
+	parser.add_argument("-v", "--verbose", action="store_true", help="report every case, and show the dots that changed")
+	options = parser.parse_args(argv)
+	with tempfile.TemporaryDirectory() as workDir:
+		cases = [case for case in makeCorpus(workDir) if fnmatch(case.name, options.filter)]
+		if options.command == "list":
+			for case in cases:
+				print(case.name)
+			return 0
+		if options.command == "record":
+			return record(cases, options.dir, options.repeat)
+		return check(cases, options.dir, options.repeat, options.tolerance, options.verbose)
+
+
+if __name__ == "__main__":
+	sys.exit(main())
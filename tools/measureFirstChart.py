@@ -0,0 +1,104 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+"""
+Measures how long the first chart after NVDA starts takes to draw, with and without warming up braille tables.
+Each measurement runs in a new Python process, so liblouis starts with no tables compiled, as it does when NVDA starts.
+
+The scenarios are:
+	cold: the chart is drawn straight away, so liblouis compiles its tables while drawing the labels.
+	warm: the tables are warmed up first, as the add-on does in the background when NVDA starts.
+	saved: the ruler cells saved by an earlier warm up are loaded, and liblouis is not used at all.
+
+Needs the liblouis Python bindings.
+
+Usage: python measureFirstChart.py [--runs N] [--geometry 30x10]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from typing import Dict, List, Optional
+
+_addonDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "addon", "globalPlugins", "dotPad")
+if "dotPad" not in sys.modules:
+	_package = types.ModuleType("dotPad")
+	_package.__path__ = [os.path.normpath(_addonDir)]
+	sys.modules["dotPad"] = _package
+
+scenarios = ("cold", "warm", "saved")
+
+
+def drawFirstChart(scenario: str, rulerCellsPath: str, geometry) -> Dict[str, float]:
+	"""
+	Runs one scenario in this process, which must not have drawn anything yet.
+	@returns: the seconds taken to warm up (if any) and to draw the chart.
+	"""
+	from dotPad import brailleUtils
+	from dotPad.canvas import DotCanvas
+	from dotPad.dataUtils import BarChart
+	timings = {}
+	startTime = time.perf_counter()
+	if scenario == "warm":
+		brailleUtils.warmUpBrailleTables(rulerCellsPath)
+	elif scenario == "saved":
+		if not brailleUtils.loadRulerCells(rulerCellsPath):
+			raise RuntimeError(f"No ruler cells saved in {rulerCellsPath}")
+	timings["warmUp"] = time.perf_counter() - startTime
+	canvas = DotCanvas(*geometry)
+	datasets = {"sales": [3, 7, 12, 9, 4, 15, 11, 6], "costs": [2, 5, 8, 7, 3, 9, 10, 4]}
+	startTime = time.perf_counter()
+	chart = BarChart(canvas.hPixelCount, canvas.vPixelCount, 0, 15, datasets)
+	chart.draw(canvas.setDot)
+	timings["firstChart"] = time.perf_counter() - startTime
+	return timings
+
+
+def runScenario(scenario: str, rulerCellsPath: str, geometry) -> Dict[str, float]:
+	output = subprocess.run(
+		[
+			sys.executable, os.path.abspath(__file__),
+			"--run", scenario, "--ruler-cells", rulerCellsPath,
+			"--geometry", f"{geometry[0]}x{geometry[1]}",
+		],
+		check=True,
+		stdout=subprocess.PIPE,
+		universal_newlines=True,
+	).stdout
+	return json.loads(output)
+
+
+def parseGeometry(text: str):
+	hCellCount, vCellCount = (int(part) for part in text.lower().split("x"))
+	return hCellCount, vCellCount
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+	parser = argparse.ArgumentParser(description="Measure the latency of the first chart drawn after starting.")
+	parser.add_argument("--runs", type=int, default=5, help="the number of processes to run for each scenario")
+	parser.add_argument("-g", "--geometry", type=parseGeometry, default=(30, 10))
+	parser.add_argument("--run", choices=scenarios, help=argparse.SUPPRESS)
+	parser.add_argument("--ruler-cells", dest="rulerCellsPath", help=argparse.SUPPRESS)
+	options = parser.parse_args(argv)
+	if options.run:
+		print(json.dumps(drawFirstChart(options.run, options.rulerCellsPath, options.geometry)))
+		return 0
+	with tempfile.TemporaryDirectory() as tempDir:
+		rulerCellsPath = os.path.join(tempDir, "rulerCells.json")
+		for scenario in scenarios:
+			runs = [runScenario(scenario, rulerCellsPath, options.geometry) for index in range(options.runs)]
+			warmUp = statistics.median(run["warmUp"] for run in runs)
+			firstChart = statistics.median(run["firstChart"] for run in runs)
+			print(f"{scenario}: first chart {firstChart * 1000:.1f} ms, warm up beforehand {warmUp * 1000:.1f} ms")
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
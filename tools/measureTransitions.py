@@ -0,0 +1,176 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+"""
+Measures how long a simulated DotPad takes to show a sequence of frames, such as scrolling through a chart,
+when each frame is sent whole as before, and when it is sent as a transition from what is already shown.
+The simulated DotPad takes a fixed time for each update plus a time for each pin that moves (see PinLatencyModel),
+with a full refresh lowering and raising every raised pin.
+
+The sequences are:
+	scroll: paging through a bar chart of 3 series of 120 values.
+	zoom: zooming into a line chart of 5000 values, then panning.
+	switch: showing the same data as each type of chart in turn.
+
+For each, the time until the plot area can be read, and until the whole frame is shown, are averaged over the frames.
+With --repeat-presses, every frame after the first is shown as if its gesture was pressed again quickly,
+which used to force a full refresh.
+
+Needs the liblouis Python bindings.
+
+Usage: python measureTransitions.py [--geometry 30x10] [--update-time 0.1] [--pin-time 0.002] [--repeat-presses]
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import types
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+_addonDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "addon", "globalPlugins", "dotPad")
+if "dotPad" not in sys.modules:
+	_package = types.ModuleType("dotPad")
+	_package.__path__ = [os.path.normpath(_addonDir)]
+	sys.modules["dotPad"] = _package
+
+from dotPad.canvas import DotCanvas  # noqa: E402
+from dotPad.transitions import PinLatencyModel, TransitionStep, countRaisedPins, planTransition, getChangedPinsByRow  # noqa: E402
+
+# A frame to show, with the rows of cells to show first
+Frame = Tuple[bytes, Optional[range]]
+
+
+def _drawChart(canvas: DotCanvas, chart) -> Frame:
+	canvas.reset()
+	chart.draw(canvas.setDot)
+	top = chart.plotY // canvas.cellHeight
+	bottom = (chart.plotY + chart.plotHeight + canvas.cellHeight - 1) // canvas.cellHeight
+	return canvas.getBytes(), range(top, bottom)
+
+
+def _makeDatasets(count: int, length: int) -> Dict[str, List[float]]:
+	rng = random.Random(length)
+	return {
+		f"series {index + 1}": [
+			50 + (40 * math.sin((value / (7 + (index * 3))) + index)) + rng.uniform(-5, 5)
+			for value in range(length)
+		]
+		for index in range(count)
+	}
+
+
+def scrollFrames(geometry) -> Iterator[Frame]:
+	from dotPad.dataUtils import BarChart
+	canvas = DotCanvas(*geometry)
+	chart = BarChart(canvas.hPixelCount, canvas.vPixelCount, 0, 100, _makeDatasets(3, 120))
+	yield _drawChart(canvas, chart)
+	while chart.scrollForward():
+		yield _drawChart(canvas, chart)
+
+
+def zoomFrames(geometry) -> Iterator[Frame]:
+	from dotPad.dataUtils import LineChart
+	canvas = DotCanvas(*geometry)
+	chart = LineChart(canvas.hPixelCount, canvas.vPixelCount, 0, 100, _makeDatasets(1, 5000))
+	total = chart.numTotalCols
+	views = [(0, total), (1250, 3750), (1875, 3125), (2188, 2813)]
+	# Then pan by half a view at a time
+	views += [(2188 + (index * 312), 2813 + (index * 312)) for index in range(1, 5)]
+	for start, end in views:
+		chart.colStartOffset = start
+		chart.viewEnd = end
+		yield _drawChart(canvas, chart)
+
+
+def switchFrames(geometry) -> Iterator[Frame]:
+	from dotPad import dataUtils
+	canvas = DotCanvas(*geometry)
+	datasets = {name: dataUtils.Dataset(values) for name, values in _makeDatasets(3, 12).items()}
+	for ChartType in (
+		dataUtils.BarChart, dataUtils.LineChart, dataUtils.AreaChart,
+		dataUtils.StackedBarChart, dataUtils.HistogramChart, dataUtils.SmallMultiplesChart,
+	):
+		yield _drawChart(canvas, ChartType(canvas.hPixelCount, canvas.vPixelCount, 0, 100, datasets))
+
+
+sequences = {
+	"scroll": scrollFrames,
+	"zoom": zoomFrames,
+	"switch": switchFrames,
+}
+
+
+def planWholeFrame(shown: Optional[bytes], target: bytes, fullRefresh: bool) -> List[TransitionStep]:
+	""" How frames used to be sent: always as a single update, with a full refresh whenever one was asked for."""
+	if fullRefresh or shown is None:
+		return [TransitionStep(target, fullRefresh, countRaisedPins(target) + (countRaisedPins(shown) if shown else 0))]
+	return [TransitionStep(target, False, countRaisedPins(bytes(a ^ b for a, b in zip(shown, target))))]
+
+
+def simulate(frames: Sequence[Frame], hCellCount: int, model: PinLatencyModel, useTransitions: bool, repeatPresses: bool) -> Dict[str, float]:
+	"""
+	Shows each frame in turn on a simulated DotPad.
+	@returns: the updates sent, pins moved, and mean seconds until the plot could be read and until each frame was complete.
+	"""
+	shown = None
+	updates = pins = 0
+	readTimes = []
+	completeTimes = []
+	for index, (frame, priorityRows) in enumerate(frames):
+		fullRefresh = repeatPresses and index > 0
+		if useTransitions:
+			steps = planTransition(shown, frame, hCellCount, priorityRows, fullRefresh, model)
+		else:
+			steps = planWholeFrame(shown, frame, fullRefresh)
+		elapsed = 0.0
+		readTime = None
+		for step in steps:
+			elapsed += model.estimate(step.changedPins)
+			if readTime is None and priorityRows is not None and not any(
+				getChangedPinsByRow(step.frame, frame, hCellCount)[row] for row in priorityRows
+			):
+				readTime = elapsed
+			pins += step.changedPins
+		updates += len(steps)
+		readTimes.append(elapsed if readTime is None else readTime)
+		completeTimes.append(elapsed)
+		shown = frame
+	return {
+		"updates": updates,
+		"pins": pins,
+		"read": sum(readTimes) / len(readTimes),
+		"complete": sum(completeTimes) / len(completeTimes),
+	}
+
+
+def parseGeometry(text: str):
+	hCellCount, vCellCount = (int(part) for part in text.lower().split("x"))
+	return hCellCount, vCellCount
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+	parser = argparse.ArgumentParser(description="Measure DotPad frame transitions on a simulated device.")
+	parser.add_argument("-g", "--geometry", type=parseGeometry, default=(30, 10))
+	parser.add_argument("--update-time", type=float, default=PinLatencyModel().updateTime, help="seconds taken by each update")
+	parser.add_argument("--pin-time", type=float, default=PinLatencyModel().pinTime, help="seconds taken by each pin that moves")
+	parser.add_argument("--repeat-presses", action="store_true", help="show each frame after the first as if its gesture was pressed again")
+	options = parser.parse_args(argv)
+	model = PinLatencyModel(options.update_time, options.pin_time)
+	hCellCount = options.geometry[0]
+	for name, makeFrames in sequences.items():
+		frames = list(makeFrames(options.geometry))
+		print(f"{name}: {len(frames)} frames")
+		for label, useTransitions in (("whole frames", False), ("transitions", True)):
+			result = simulate(frames, hCellCount, model, useTransitions, options.repeat_presses)
+			print(
+				f"  {label}: {result['updates']} updates, {result['pins']} pins moved, "
+				f"plot readable after {result['read'] * 1000:.0f} ms, complete after {result['complete'] * 1000:.0f} ms"
+			)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,209 @@
+# A part of the DotPad NVDA add-on.
+# Copyright (C) 2022 NV Access Limited.
+# this code is licensed under the GNU General Public License version 2.
+
+"""
+Renders charts and images to DotPad frame files without NVDA or a DotPad, E.g. to prepare course material in bulk.
+Each input is rendered in a separate process, so many inputs are rendered in parallel across all CPU cores.
+
+Inputs can be:
+	CSV files: a chart with a dataset per column, named by the first row.
+		A first column that is not numeric (E.g. dates) is ignored.
+	PNG images: converted in the same way as a part of the screen.
+
+Charts need the liblouis Python bindings for their labels.
+
+Usage: python renderFrames.py [options] input [input ...]
+Run with --help for the options.
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import csv
+import os
+import sys
+import types
+from typing import Dict, List, Optional, Tuple
+
+# Load the add-on's rendering modules as a package of their own,
+# so that the parts of the add-on that need NVDA are never imported.
+_addonDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "addon", "globalPlugins", "dotPad")
+if "dotPad" not in sys.modules:
+	_package = types.ModuleType("dotPad")
+	_package.__path__ = [os.path.normpath(_addonDir)]
+	sys.modules["dotPad"] = _package
+
+from dotPad.canvas import DotCanvas  # noqa: E402
+from dotPad import frameFile  # noqa: E402
+from dotPad.preview import frameToAscii, frameToUnicodeBraille  # noqa: E402
+
+
+def parseGeometry(text: str) -> Tuple[int, int]:
+	try:
+		hCellCount, vCellCount = (int(part) for part in text.lower().split("x"))
+	except ValueError:
+		raise argparse.ArgumentTypeError(f"Expected a size in cells such as 30x10, got {text}")
+	if hCellCount <= 0 or vCellCount <= 0:
+		raise argparse.ArgumentTypeError(f"Size must be positive, got {text}")
+	return hCellCount, vCellCount
+
+
+def readCsvDatasets(path: str) -> Dict[str, List[Optional[float]]]:
+	with open(path, newline="", encoding="utf-8-sig") as f:
+		rows = [row for row in csv.reader(f) if row]
+	if len(rows) < 2:
+		raise ValueError(f"{path} has no data")
+	names = rows[0]
+	columns: Dict[str, List[Optional[float]]] = {}
+	for index, name in enumerate(names):
+		values = []
+		isNumeric = True
+		for row in rows[1:]:
+			cell = row[index].strip() if index < len(row) else ""
+			if not cell:
+				values.append(None)
+				continue
+			try:
+				values.append(float(cell))
+			except ValueError:
+				isNumeric = False
+				break
+		if isNumeric:
+			columns[name or f"Column {index + 1}"] = values
+		elif index > 0:
+			raise ValueError(f"Column {name} of {path} is not numeric")
+	if not columns:
+		raise ValueError(f"{path} has no numeric columns")
+	return columns
+
+
+# The chart classes in dataUtils, which is only imported when there are charts to render
+chartTypes = {
+	"bar": "BarChart",
+	"line": "LineChart",
+	"area": "AreaChart",
+	"stacked-bar": "StackedBarChart",
+	"histogram": "HistogramChart",
+	"detailed-histogram": "DetailedHistogramChart",
+	"quantile-histogram": "QuantileHistogramChart",
+	"small-multiples": "SmallMultiplesChart",
+	"small-multiples-own-scale": "SmallMultiplesOwnScaleChart",
+}
+
+
+def renderChartPages(path: str, geometry: Tuple[int, int], options: argparse.Namespace) -> List[bytes]:
+	""" Renders a chart from a CSV file, with a page for each screenful of a bar chart."""
+	from dotPad import dataUtils
+	from dotPad.dataUtils import ScrollableChart, Dataset, getDatasetsRange
+	datasets = {name: Dataset(values) for name, values in readCsvDatasets(path).items()}
+	minVal, maxVal = getDatasetsRange(datasets.values())
+	if options.min is not None:
+		minVal = options.min
+	if options.max is not None:
+		maxVal = options.max
+	ChartType = getattr(dataUtils, chartTypes[options.chart])
+	canvas = DotCanvas(*geometry)
+	chart = ChartType(
+		canvas.hPixelCount, canvas.vPixelCount, minVal, maxVal, datasets,
+		showVerticalRuler=not options.noVerticalRuler,
+		showHorizontalRuler=not options.noHorizontalRuler
+	)
+	pages = []
+	while True:
+		canvas.reset()
+		chart.draw(canvas.setDot)
+		pages.append(canvas.getBytes())
+		if not issubclass(ChartType, ScrollableChart) or not chart.scrollForward():
+			break
+	return pages
+
+
+def renderInput(path: str, options: argparse.Namespace) -> List[str]:
+	"""
+	Renders one input to a frame file in the output directory, plus a preview if requested.
+	Runs in a worker process.
+	@returns: the paths of the files written.
+	"""
+	geometry = options.geometry
+	extension = os.path.splitext(path)[1].lower()
+	if extension == ".csv":
+		pages = renderChartPages(path, geometry, options)
+	elif extension == ".png":
+		pages = [frameFile.convertPngToFrame(path, geometry, isWhiteOnBlack=options.whiteOnBlack)]
+	else:
+		raise ValueError(f"Don't know how to render {path}")
+	name = os.path.splitext(os.path.basename(path))[0]
+	destPath = os.path.join(options.outputDir, name + frameFile.fileExtension)
+	frameFile.writeFrameFile(destPath, geometry, pages)
+	written = [destPath]
+	if options.preview != "none":
+		toText = frameToUnicodeBraille if options.preview == "braille" else frameToAscii
+		previewPath = os.path.join(options.outputDir, name + ".txt")
+		with open(previewPath, "w", encoding="utf-8") as f:
+			for index, page in enumerate(pages):
+				f.write(f"Page {index + 1} of {len(pages)}\n")
+				f.write(toText(page, geometry[0]))
+				f.write("\n\n")
+		written.append(previewPath)
+	return written
+
+
+def expandInputs(inputs: List[str]) -> List[str]:
+	""" Replaces any directories with the CSV and PNG files they contain."""
+	paths = []
+	for path in inputs:
+		if os.path.isdir(path):
+			paths.extend(
+				os.path.join(path, fileName)
+				for fileName in sorted(os.listdir(path))
+				if os.path.splitext(fileName)[1].lower() in (".csv", ".png")
+			)
+		else:
+			paths.append(path)
+	return paths
+
+
+def makeArgParser() -> argparse.ArgumentParser:
+	parser = argparse.ArgumentParser(description="Render charts and images to DotPad frame files.")
+	parser.add_argument("inputs", nargs="+", help="CSV files, PNG images, or directories containing them")
+	parser.add_argument("-o", "--output-dir", dest="outputDir", default=".", help="where to write the frame files")
+	parser.add_argument(
+		"-g", "--geometry", type=parseGeometry, default=(30, 10),
+		help="the size of the DotPad's graphics area in cells, such as 30x10 (the default)"
+	)
+	parser.add_argument("--chart", choices=tuple(chartTypes), default="bar", help="the type of chart to render from CSV files")
+	parser.add_argument("--min", type=float, help="the lowest value on the chart's scale, defaulting to the lowest in the data")
+	parser.add_argument("--max", type=float, help="the highest value on the chart's scale, defaulting to the highest in the data")
+	parser.add_argument("--no-vertical-ruler", dest="noVerticalRuler", action="store_true")
+	parser.add_argument("--no-horizontal-ruler", dest="noHorizontalRuler", action="store_true")
+	parser.add_argument("--white-on-black", dest="whiteOnBlack", action="store_true", help="for images that are light on a dark background")
+	parser.add_argument(
+		"--preview", choices=("none", "braille", "ascii"), default="none",
+		help="also write a text preview of each frame file, using Unicode braille or one character per dot"
+	)
+	parser.add_argument("-j", "--jobs", type=int, default=None, help="the number of processes to use, defaulting to the number of CPUs")
+	return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+	options = makeArgParser().parse_args(argv)
+	paths = expandInputs(options.inputs)
+	os.makedirs(options.outputDir, exist_ok=True)
+	failures = 0
+	with ProcessPoolExecutor(max_workers=options.jobs) as executor:
+		futures = {executor.submit(renderInput, path, options): path for path in paths}
+		for future in as_completed(futures):
+			path = futures[future]
+			try:
+				written = future.result()
+			except Exception as e:
+				failures += 1
+				print(f"{path}: {type(e).__name__}: {e}", file=sys.stderr)
+				continue
+			print(f"{path} -> {', '.join(written)}")
+	print(f"Rendered {len(paths) - failures} of {len(paths)} inputs")
+	return 1 if failures else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())